@@ -0,0 +1,513 @@
+"""
+Benchmark Suite for the Analysis Scripts
+
+Times and memory-profiles every entry point (convert_format.py, interpolate_data.py,
+extract_clear_values.py, detect_events.py, plot.py) on synthetic runs of increasing
+size. Each script runs in its own subprocess so that wall time, CPU time and peak
+memory (max RSS) are measured exactly as a user would see them.
+
+Results are written as JSON with stable key order, so that committing a result file
+and re-running the suite later shows performance regressions as plain diffs.
+
+With --protocol, the text and framed binary serial protocols (framing.py) are
+compared instead: bytes per sample and the sample rate the baud rate allows,
+host-side decoding throughput, and how many corrupted samples each protocol
+detects when random bits are flipped in the stream.
+
+With --startup, the cold-start time of every iodine.py subcommand is measured
+instead, both for '--help' and for a bare import of its module in a fresh
+interpreter. Neither may import any of iodine.HEAVY_MODULES, and each must stay
+within iodine.STARTUP_BUDGET_S; otherwise the exit status is nonzero.
+
+Suite results go to benchmarks/bench_<timestamp>.json; --startup and --protocol
+overwrite benchmarks/startup.json and benchmarks/protocol.json, so their
+changes show up as diffs. Generated datasets are cached in benchmarks/data.
+
+Dependencies:
+    numpy (for generate_data.py), plus whatever the benchmarked scripts need
+
+Usage:
+    python benchmark.py [--sizes 1e3,1e4,1e5] [--entry-points detect_events,plot]
+                        [--output results.json] [--compare old_results.json]
+    python benchmark.py --startup [--repeats 5]
+    python benchmark.py --protocol [--samples 100000] [--baud 115200]
+
+Example:
+    python benchmark.py --sizes 1e3,1e4,1e5,1e6
+    python benchmark.py --sizes 1e3,1e8 --timeout 3600 --output bench_large.json
+    python benchmark.py --startup
+    python benchmark.py --protocol --bit-error-rate 1e-4
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import generate_data
+import iodine
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SIZES = [1e3, 1e4, 1e5, 1e6]
+# Result files are meant to be committed; the generated datasets are not
+RESULTS_DIR = os.path.join(SCRIPT_DIR, "benchmarks")
+DEFAULT_DATA_DIR = os.path.join(RESULTS_DIR, "data")
+DEFAULT_TIMEOUT = 600
+
+
+def script(name):
+    return os.path.join(SCRIPT_DIR, name)
+
+
+# Each entry point maps to (input format, function building the command line).
+# The command builder receives the input CSV path and a scratch directory.
+ENTRY_POINTS = {
+    'convert_format': ('legacy', lambda csv_file, work_dir: [
+        sys.executable, script('convert_format.py'), csv_file,
+        os.path.join(work_dir, 'converted.csv')]),
+    'interpolate_data': ('new', lambda csv_file, work_dir: [
+        sys.executable, script('interpolate_data.py'), csv_file,
+        os.path.join(work_dir, 'interpolated.csv'), '1.0']),
+    'extract_clear_values': ('new', lambda csv_file, work_dir: [
+        sys.executable, script('extract_clear_values.py'), csv_file,
+        '--mode', 'median-per-second']),
+    'detect_events': ('new', lambda csv_file, work_dir: [
+        sys.executable, script('detect_events.py'), csv_file]),
+    'plot': ('new', lambda csv_file, work_dir: [
+        sys.executable, script('plot.py')]),
+}
+
+
+def parse_sizes(text):
+    """Parse a comma-separated list of sizes such as '1e3,1e4,250000'"""
+    return [int(float(s)) for s in text.split(',') if s.strip()]
+
+
+def ensure_dataset(rows, fmt, data_dir, seed=0):
+    """Return the path to a synthetic dataset, generating it if it doesn't exist yet"""
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"synthetic_{rows}_{fmt}_seed{seed}.csv")
+    if not os.path.exists(path):
+        print(f"  Generating {rows} rows ({fmt}) -> {path}")
+        tmp_path = path + ".tmp"
+        generate_data.write_run(tmp_path, rows, fmt=fmt, seed=seed)
+        os.replace(tmp_path, path)
+    return path
+
+
+def run_measured(cmd, cwd, timeout):
+    """
+    Run a command and measure its wall time, CPU time and peak memory.
+
+    Uses os.wait4 so that the resource usage belongs to this child only.
+
+    Returns:
+        Dictionary with wall_s, user_s, sys_s, max_rss_kb, returncode and status
+    """
+    env = dict(os.environ, MPLBACKEND='Agg')
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=cwd, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+
+    timed_out = threading.Event()
+
+    def kill():
+        timed_out.set()
+        proc.kill()
+
+    timer = threading.Timer(timeout, kill)
+    timer.start()
+    try:
+        # Drain stderr in a thread so a chatty child can't block on a full pipe
+        stderr_chunks = []
+        reader = threading.Thread(target=lambda: stderr_chunks.append(proc.stderr.read()))
+        reader.start()
+        _, status, rusage = os.wait4(proc.pid, 0)
+        wall_s = time.perf_counter() - start
+        reader.join()
+    finally:
+        timer.cancel()
+
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    proc.stderr.close()
+
+    if timed_out.is_set():
+        run_status = 'timeout'
+    elif proc.returncode != 0:
+        run_status = 'error'
+    else:
+        run_status = 'ok'
+
+    result = {
+        'wall_s': round(wall_s, 4),
+        'user_s': round(rusage.ru_utime, 4),
+        'sys_s': round(rusage.ru_stime, 4),
+        # ru_maxrss is reported in kilobytes on Linux and bytes on macOS
+        'max_rss_kb': rusage.ru_maxrss // 1024 if sys.platform == 'darwin' else rusage.ru_maxrss,
+        'returncode': proc.returncode,
+        'status': run_status,
+    }
+    if run_status == 'error':
+        stderr_text = b''.join(stderr_chunks).decode('utf-8', errors='ignore').strip()
+        result['error'] = stderr_text.splitlines()[-1] if stderr_text else ''
+    return result
+
+
+def benchmark_entry_point(name, rows, data_dir, timeout, seed=0):
+    """Benchmark one entry point on one dataset size"""
+    fmt, build_cmd = ENTRY_POINTS[name]
+    csv_file = ensure_dataset(rows, fmt, data_dir, seed=seed)
+
+    work_dir = tempfile.mkdtemp(prefix=f"bench_{name}_")
+    try:
+        if name == 'plot':
+            # plot.py reads its inputs from files_to_plot.txt in the working directory
+            with open(os.path.join(work_dir, 'files_to_plot.txt'), 'w') as f:
+                f.write(csv_file + "\n")
+        cmd = build_cmd(csv_file, work_dir)
+        result = run_measured(cmd, work_dir, timeout)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    result.update({
+        'entry_point': name,
+        'rows': rows,
+        'format': fmt,
+        'input_bytes': os.path.getsize(csv_file),
+    })
+    return result
+
+
+def imported_modules(cmd):
+    """Top-level names of the modules a command imports, from python -X importtime"""
+    proc = subprocess.run([cmd[0], '-X', 'importtime'] + cmd[1:], cwd=SCRIPT_DIR,
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    names = set()
+    for line in proc.stderr.splitlines():
+        if line.startswith('import time:') and line.count('|') == 2:
+            names.add(line.rsplit('|', 1)[1].strip().split('.')[0])
+    return names
+
+
+def fastest_run(cmd, repeats, timeout):
+    """Minimum wall time of several runs (the least disturbed by other activity)"""
+    runs = [run_measured(cmd, SCRIPT_DIR, timeout) for _ in range(repeats)]
+    return min(runs, key=lambda r: r['wall_s'])
+
+
+def measure_startup(repeats=5, timeout=60):
+    """
+    Cold-start time of every iodine.py subcommand.
+
+    Each subcommand is measured twice: '--help' through iodine.py, and a bare
+    import of its module, since scripts without their own argument parser
+    answer '--help' from their docstring without being imported.
+
+    Returns:
+        List of result dictionaries with both startup times, any heavy modules
+        that either imported, and the budget status
+    """
+    results = []
+    for name, (module_name, _, _) in iodine.SUBCOMMANDS.items():
+        help_cmd = [sys.executable, script('iodine.py'), name, '--help']
+        import_cmd = [sys.executable, '-c', f'import {module_name}']
+        help_run = fastest_run(help_cmd, repeats, timeout)
+        import_run = fastest_run(import_cmd, repeats, timeout)
+        heavy = sorted((imported_modules(help_cmd) | imported_modules(import_cmd)) & set(iodine.HEAVY_MODULES))
+        if help_run['status'] != 'ok':
+            status = help_run['status']
+        elif import_run['status'] != 'ok':
+            status = import_run['status']
+        elif heavy or max(help_run['wall_s'], import_run['wall_s']) > iodine.STARTUP_BUDGET_S:
+            status = 'over_budget'
+        else:
+            status = 'ok'
+        results.append({
+            'subcommand': name,
+            'wall_s': help_run['wall_s'],
+            'import_s': import_run['wall_s'],
+            'heavy_imports': heavy,
+            'max_rss_kb': max(help_run['max_rss_kb'], import_run['max_rss_kb']),
+            'status': status,
+        })
+    return results
+
+
+def compare_results(old_path, new_results, threshold=1.2):
+    """Print a comparison against a previous result file, flagging slowdowns"""
+    with open(old_path, 'r') as f:
+        old = json.load(f)
+    old_by_key = {(r['entry_point'], r['rows']): r for r in old.get('results', [])}
+
+    print("\n" + "=" * 60)
+    print(f"Comparison with: {old_path}")
+    print("=" * 60)
+    regressions = 0
+    for r in new_results:
+        prev = old_by_key.get((r['entry_point'], r['rows']))
+        if prev is None or prev['status'] != 'ok' or r['status'] != 'ok':
+            continue
+        time_ratio = r['wall_s'] / max(prev['wall_s'], 1e-9)
+        mem_ratio = r['max_rss_kb'] / max(prev['max_rss_kb'], 1)
+        flag = ""
+        if time_ratio > threshold or mem_ratio > threshold:
+            flag = "  <-- REGRESSION"
+            regressions += 1
+        print(f"{r['entry_point']:>22} {r['rows']:>11}: time x{time_ratio:.2f}, memory x{mem_ratio:.2f}{flag}")
+    print(f"\n{regressions} regression(s) above x{threshold}")
+    return regressions
+
+
+def run_startup_check(args):
+    """Print and save the cold-start report; returns the exit status"""
+    print("=" * 60)
+    print(f"Subcommand Cold Start (budget {iodine.STARTUP_BUDGET_S * 1000:.0f} ms, no heavy imports)")
+    print("=" * 60)
+    results = measure_startup(repeats=args.repeats, timeout=args.timeout)
+
+    print(f"{'subcommand':>10} {'--help':>9} {'import':>9}  {'status':<12} heavy imports")
+    for r in results:
+        heavy = ", ".join(r['heavy_imports']) or "-"
+        print(f"{r['subcommand']:>10} {r['wall_s'] * 1000:>7.0f}ms {r['import_s'] * 1000:>7.0f}ms  "
+              f"{r['status']:<12} {heavy}")
+
+    output_file = args.output or os.path.join(RESULTS_DIR, "startup.json")
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'budget_s': iodine.STARTUP_BUDGET_S,
+        'startup': results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+    with open(output_file, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write("\n")
+    print(f"\nResults saved to: {output_file}")
+
+    failures = [r['subcommand'] for r in results if r['status'] != 'ok']
+    if failures:
+        print(f"Over budget: {', '.join(failures)}")
+        return 1
+    return 0
+
+
+def protocol_streams(samples, seed=0):
+    """
+    The same synthetic samples as firmware output in both protocols.
+
+    Returns:
+        Tuple of (values array of shape (samples, 4), text bytes, binary bytes);
+        the encoder count of sample i is i, so decoded samples can be matched
+        to the originals
+    """
+    import framing
+
+    values = next(generate_data.generate_chunks(samples, seed=seed, chunk_rows=samples))[1]
+    rows = values.tolist()
+    text = "".join(f"{r} {g} {b} {c} {i}\r\n" for i, (r, g, b, c) in enumerate(rows)).encode()
+    binary = b"".join(framing.encode_sample_frame(i, r, g, b, c, i) for i, (r, g, b, c) in enumerate(rows))
+    return values, text, binary
+
+
+def decode_text_stream(stream):
+    """Decode text output the way read.py does: readline, decode, strip, parse"""
+    from read import parse_color_data
+
+    samples = []
+    reader = io.BytesIO(stream)
+    for raw in iter(reader.readline, b''):
+        line = raw.decode('utf-8', errors='ignore').strip()
+        color_data = parse_color_data(line) if line else None
+        if color_data:
+            parts = line.split()
+            encoder = int(parts[4]) if len(parts) > 4 and parts[4].isdigit() else None
+            samples.append((encoder, color_data))
+    return samples
+
+
+def decode_binary_stream(stream, chunk_size=4096):
+    """Decode framed output in serial-read-sized chunks"""
+    import framing
+
+    decoder = framing.StreamDecoder('binary')
+    samples = []
+    for start in range(0, len(stream), chunk_size):
+        for kind, value in decoder.feed(stream[start:start + chunk_size]):
+            if kind == 'sample':
+                samples.append((value.encoder, (value.r, value.g, value.b, value.c)))
+    return samples
+
+
+def flip_bits(stream, bit_error_rate, rng):
+    """Copy of the stream with each bit flipped with the given probability"""
+    import numpy as np
+
+    data = np.frombuffer(stream, dtype=np.uint8).copy()
+    n_flips = rng.binomial(len(data) * 8, bit_error_rate)
+    positions = rng.integers(0, len(data) * 8, size=n_flips)
+    np.bitwise_xor.at(data, positions // 8, (1 << (positions % 8)).astype(np.uint8))
+    return data.tobytes(), int(n_flips)
+
+
+def count_wrong(samples, values):
+    """Decoded samples whose values differ from the sample they claim to be"""
+    wrong = 0
+    for encoder, color_data in samples:
+        if encoder is None or not 0 <= encoder < len(values) or tuple(values[encoder]) != tuple(color_data):
+            wrong += 1
+    return wrong
+
+
+def run_protocol_benchmark(args):
+    """Print and save the text vs binary protocol comparison"""
+    import numpy as np
+
+    print("=" * 60)
+    print(f"Serial Protocol Comparison ({args.samples} samples, {args.baud} baud)")
+    print("=" * 60)
+    values, text, binary = protocol_streams(args.samples, seed=args.seed)
+    rng = np.random.default_rng(args.seed)
+    results = []
+    for name, stream, decode in (('text', text, decode_text_stream), ('binary', binary, decode_binary_stream)):
+        timings = []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            decoded = decode(stream)
+            timings.append(time.perf_counter() - start)
+        decode_s = min(timings)
+        bytes_per_sample = len(stream) / args.samples
+
+        corrupted, n_flips = flip_bits(stream, args.bit_error_rate, rng)
+        # read.parse_color_data prints every line it can't parse
+        with contextlib.redirect_stdout(io.StringIO()):
+            received = decode(corrupted)
+        wrong = count_wrong(received, values)
+        results.append({
+            'protocol': name,
+            'samples': args.samples,
+            'decoded': len(decoded),
+            'bytes_per_sample': round(bytes_per_sample, 2),
+            # 8N1 serial: 10 bits on the wire per byte
+            'max_rate_hz': round(args.baud / 10 / bytes_per_sample, 1),
+            'decode_s': round(decode_s, 4),
+            'decode_us_per_sample': round(decode_s / args.samples * 1e6, 3),
+            'decode_samples_per_s': round(args.samples / decode_s),
+            'bit_error_rate': args.bit_error_rate,
+            'bits_flipped': n_flips,
+            'corrupt_received': len(received),
+            'corrupt_accepted_wrong': wrong,
+            'corrupt_rejected': args.samples - (len(received) - wrong),
+        })
+
+    print(f"{'protocol':>8} {'bytes/sample':>13} {'max rate':>10} {'decode':>12} {'samples/s':>11} "
+          f"{'flipped bits':>13} {'wrong accepted':>15} {'rejected':>9}")
+    for r in results:
+        print(f"{r['protocol']:>8} {r['bytes_per_sample']:>13.1f} {r['max_rate_hz']:>8.0f}Hz "
+              f"{r['decode_us_per_sample']:>10.2f}us {r['decode_samples_per_s']:>11} "
+              f"{r['bits_flipped']:>13} {r['corrupt_accepted_wrong']:>15} {r['corrupt_rejected']:>9}")
+
+    output_file = args.output or os.path.join(RESULTS_DIR, "protocol.json")
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'baud': args.baud,
+        'seed': args.seed,
+        'protocols': results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+    with open(output_file, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write("\n")
+    print(f"\nResults saved to: {output_file}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the analysis scripts on synthetic data.")
+    parser.add_argument("--sizes", default=",".join(str(int(s)) for s in DEFAULT_SIZES),
+                        help="Comma-separated row counts (default: 1e3,1e4,1e5,1e6)")
+    parser.add_argument("--entry-points", default=",".join(ENTRY_POINTS),
+                        help="Comma-separated entry points to benchmark (default: all)")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR,
+                        help="Directory for cached synthetic datasets")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help="Per-run timeout in seconds (default: 600)")
+    parser.add_argument("--seed", type=int, default=0, help="Dataset random seed (default: 0)")
+    parser.add_argument("--output", help="Output JSON file (default: benchmarks/bench_<timestamp>.json, "
+                        "or benchmarks/startup.json and benchmarks/protocol.json)")
+    parser.add_argument("--compare", help="Previous result JSON to compare against")
+    parser.add_argument("--startup", action="store_true",
+                        help="Measure iodine.py subcommand cold-start times against the budget instead")
+    parser.add_argument("--repeats", type=int, default=5,
+                        help="Runs per subcommand for --startup; the fastest counts (default: 5)")
+    parser.add_argument("--protocol", action="store_true",
+                        help="Compare the text and binary serial protocols instead")
+    parser.add_argument("--samples", type=int, default=100_000,
+                        help="Samples per stream for --protocol (default: 100000)")
+    parser.add_argument("--baud", type=int, default=115200, help="Baud rate for --protocol (default: 115200)")
+    parser.add_argument("--bit-error-rate", type=float, default=1e-4,
+                        help="Probability of flipping each bit for --protocol (default: 1e-4)")
+    args = parser.parse_args()
+
+    if args.startup:
+        sys.exit(run_startup_check(args))
+    if args.protocol:
+        sys.exit(run_protocol_benchmark(args))
+
+    sizes = parse_sizes(args.sizes)
+    entry_points = [e.strip() for e in args.entry_points.split(',') if e.strip()]
+    unknown = [e for e in entry_points if e not in ENTRY_POINTS]
+    if unknown:
+        print(f"Error: Unknown entry point(s): {', '.join(unknown)}")
+        print(f"Available: {', '.join(ENTRY_POINTS)}")
+        sys.exit(1)
+
+    output_file = args.output or os.path.join(
+        RESULTS_DIR, f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+
+    print("=" * 60)
+    print("Analysis Script Benchmark")
+    print("=" * 60)
+
+    results = []
+    for rows in sizes:
+        for name in entry_points:
+            print(f"Running {name} on {rows} rows...")
+            result = benchmark_entry_point(name, rows, args.data_dir, args.timeout, seed=args.seed)
+            results.append(result)
+            print(f"  {result['status']}: {result['wall_s']:.2f}s wall, "
+                  f"{result['max_rss_kb'] / 1024:.1f} MB peak")
+
+    report = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'seed': args.seed,
+        'sizes': sizes,
+        'results': results,
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+    with open(output_file, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write("\n")
+    print(f"\nResults saved to: {output_file}")
+
+    if args.compare:
+        compare_results(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+"""
+Bootstrap Confidence Intervals for Detected Event Times
+
+detect_events.py gives point estimates only. This script adds confidence
+intervals for the pour-in time, the inflection point, the clock stop time and
+the reaction time:
+
+1. Clock stop / inflection: residual resampling around the fitted sigmoid.
+   Residuals get random signs in blocks (a block wild bootstrap, since they are
+   autocorrelated and much larger around the steps), are added back to the
+   fitted curve, and every resample is refitted in one batched
+   Levenberg-Marquardt solve warm-started from the original fit.
+2. Pour-in: the smoothed signal plus resampled noise is run through a
+   vectorized version of detect_pour_in that handles a whole batch at once.
+3. Reaction time: the paired difference of the two resampled event times.
+   Each resample draws one pattern of block signs and applies it to both the
+   pour-in noise and the sigmoid residuals, so both events of a resample see
+   the same perturbation of the run.
+
+Point estimates come from detect_events.detect_pour_in and detect_clock_stop,
+so they match detect_events.py for the same detector settings (--profile).
+
+Batches of resamples are spread across a process pool. Each batch draws from its
+own child of one SeedSequence, so results are reproducible for a given seed and
+batch size regardless of the number of workers. With --time-budget, no new
+batches are started once the budget is used up.
+
+Dependencies:
+    pandas, numpy, scipy
+
+Usage:
+    python bootstrap_events.py <csv_file> [--resamples 2000] [--level 95] [--seed 0]
+                               [--workers N] [--batch-size 100] [--time-budget SECONDS]
+                               [--profile detector_profile.json]
+
+Example:
+    python bootstrap_events.py color_data_20250101_120000.csv --resamples 5000 --time-budget 10
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+from detect_events import (DETECTOR_DEFAULTS, calculate_relative_time, detect_clock_stop, detect_pour_in,
+                           fill_edges, levenberg_marquardt_batch, load_profile, normalize_transition,
+                           rolling_mean_centered, rolling_std_centered, sigmoid_batch_jacobian,
+                           stop_time_from_sigmoid)
+from run_io import read_run_csv
+
+# Upper bound on resamples x points held in one batch (keeps the Jacobian small)
+MAX_BATCH_ELEMENTS = 2_000_000
+
+
+def detect_pour_in_batch(X, window_size=DETECTOR_DEFAULTS['window_size'],
+                         threshold_factor=DETECTOR_DEFAULTS['threshold_factor'],
+                         search_fraction=DETECTOR_DEFAULTS['search_fraction'], search_end=None):
+    """
+    Vectorized detect_pour_in over many series of the same length.
+
+    Args:
+        X: Array of channel values, shape (n_series, n_points)
+        window_size, threshold_factor: As in detect_events.detect_pour_in
+        search_fraction: Fraction of the data searched for the pour-in
+        search_end: Optional per-series number of points searched, overriding
+                    search_fraction (for rows that are prefixes of longer runs)
+
+    Returns:
+        Array of pour-in indices, -1 where nothing was detected
+    """
+    smoothed = fill_edges(rolling_mean_centered(X, window_size))
+    derivative = np.gradient(smoothed, axis=1)
+    threshold = (rolling_mean_centered(derivative, window_size * 2)
+                 + threshold_factor * rolling_std_centered(derivative, window_size * 2))
+
+    if search_end is None:
+        search_end = np.full(X.shape[0], int(X.shape[1] * search_fraction))
+    end = int(np.max(search_end, initial=0))
+    with np.errstate(invalid='ignore'):
+        significant = np.abs(derivative[:, :end]) > np.abs(threshold[:, :end])
+    significant &= np.arange(end)[None, :] < np.asarray(search_end)[:, None]
+    found = significant.any(axis=1)
+    return np.where(found, np.argmax(significant, axis=1), -1)
+
+
+def block_signs(n_points, n_resamples, block_length, rng):
+    """Random +1/-1 per block of block_length points, shape (n_resamples, n_points)"""
+    block_length = max(1, min(block_length, n_points))
+    n_blocks = -(-n_points // block_length)
+    signs = rng.choice([-1.0, 1.0], size=(n_resamples, n_blocks))
+    return np.repeat(signs, block_length, axis=1)[:, :n_points]
+
+
+def block_wild_resample(residuals, n_resamples, block_length, rng):
+    """
+    Block wild bootstrap of a residual series.
+
+    Each residual stays at its own position and whole blocks are multiplied by a
+    random sign, so autocorrelation within a block and the large residuals
+    around the pour-in step and the transition are kept where they belong.
+
+    Returns:
+        Array of shape (n_resamples, len(residuals))
+    """
+    return block_signs(len(residuals), n_resamples, block_length, rng) * residuals
+
+
+# Per-worker copy of the run data, set once by the pool initializer
+_SHARED = {}
+
+
+def _init_worker(shared):
+    _SHARED.clear()
+    _SHARED.update(shared)
+
+
+def _bootstrap_batch(task):
+    """Evaluate one batch of resamples; returns arrays of event times (NaN on failure)"""
+    seed_seq, batch_size = task
+    d = _SHARED
+    rng = np.random.default_rng(seed_seq)
+    time_s = d['time_s']
+
+    # One sign pattern per resample, shared by both events so their difference is paired
+    signs = block_signs(len(time_s), batch_size, d['block_length'], rng)
+
+    # Pour-in: smoothed signal plus resampled noise, detected in one vectorized pass
+    noisy = d['smoothed'] + signs * d['noise']
+    pour_idx = detect_pour_in_batch(noisy, d['window_size'], d['threshold_factor'], d['search_fraction'])
+    pour_in = np.where(pour_idx >= 0, time_s[np.maximum(pour_idx, 0)], np.nan)
+
+    # Clock stop: fitted curve plus resampled residuals, refitted as one batch
+    Y = d['fitted'] + signs * d['residuals']
+    p0 = np.repeat(d['params'][None, :], batch_size, axis=0)
+    params, _, _, converged = levenberg_marquardt_batch(
+        sigmoid_batch_jacobian, time_s, Y, p0, d['lower'], d['upper'])
+    L, k, x0 = params.T
+    stop = np.clip(stop_time_from_sigmoid(L, k, x0, d['stop_level']), time_s[0], time_s[-1])
+    stop = np.where(converged, stop, np.nan)
+    x0 = np.where(converged, x0, np.nan)
+    return pour_in, x0, stop
+
+
+def bootstrap_events(df, channel='C', n_resamples=2000, level=95.0, seed=0, workers=None,
+                     batch_size=100, time_budget=None, block_length=20, params=None):
+    """
+    Bootstrap confidence intervals for pour-in, inflection, clock stop and reaction time.
+
+    Args:
+        df: DataFrame with 'Time_s' and the channel column
+        channel: Channel to analyze
+        n_resamples: Number of bootstrap resamples
+        level: Confidence level in percent
+        seed: Seed for reproducible resampling
+        workers: Worker processes (1 runs in-process; default: CPU count)
+        batch_size: Resamples evaluated together in one vectorized batch
+        time_budget: Stop starting new batches after this many seconds (None for no limit)
+        block_length: Samples per block sharing one random sign
+        params: Detector settings (detect_events.DETECTOR_DEFAULTS or load_profile())
+
+    Returns:
+        Dictionary keyed by event name with point estimate, CI bounds, std and
+        resample count, plus 'n_resamples' and 'elapsed_s'; None if the
+        sigmoid can't be fitted
+    """
+    start = time.perf_counter()
+    params = params or DETECTOR_DEFAULTS
+    window_size = params['window_size']
+    stop_level = params['stop_level']
+    time_s = df['Time_s'].values.astype(float)
+    values = df[channel].values.astype(float)
+    n = len(time_s)
+
+    # Sigmoid fit the resamples are built around (same parametrization and bounds as detect_clock_stop)
+    normalized = normalize_transition(values)
+    lower = np.array([0.5, 0.01, time_s[0]])
+    upper = np.array([1.5, 10.0, time_s[-1]])
+    half = int(np.argmax(normalized >= 0.5))
+    fit_params, _, _, converged = levenberg_marquardt_batch(
+        sigmoid_batch_jacobian, time_s, normalized[None, :],
+        np.array([[1.0, 0.1, time_s[half]]]), lower, upper)
+    if not converged[0]:
+        print("Error: Sigmoid fit did not converge; cannot bootstrap clock stop")
+        return None
+    fit_params = fit_params[0]
+    fitted = sigmoid_batch_jacobian(time_s, fit_params[None, :])[0][0]
+
+    smoothed = fill_edges(rolling_mean_centered(values[None, :], window_size))[0]
+    shared = {
+        'time_s': time_s,
+        'smoothed': smoothed,
+        'noise': values - smoothed,
+        'fitted': fitted,
+        'residuals': normalized - fitted,
+        'params': fit_params,
+        'lower': lower,
+        'upper': upper,
+        'block_length': block_length,
+        'window_size': window_size,
+        'threshold_factor': params['threshold_factor'],
+        'search_fraction': params['search_fraction'],
+        'stop_level': stop_level,
+    }
+
+    batch_size = max(1, min(batch_size, MAX_BATCH_ELEMENTS // max(n, 1)))
+    n_batches = -(-n_resamples // batch_size)
+    children = np.random.SeedSequence(seed).spawn(n_batches)
+    sizes = [min(batch_size, n_resamples - i * batch_size) for i in range(n_batches)]
+    tasks = list(zip(children, sizes))
+
+    def over_budget():
+        return time_budget is not None and time.perf_counter() - start > time_budget
+
+    results = {}
+    if workers == 1:
+        _init_worker(shared)
+        for i, task in enumerate(tasks):
+            if over_budget():
+                break
+            results[i] = _bootstrap_batch(task)
+    else:
+        # Imported here so that startup doesn't pay for the process pool machinery
+        from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+        workers = workers or os.cpu_count()
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(shared,)) as executor:
+            in_flight = {}
+            next_task = 0
+            while next_task < len(tasks) or in_flight:
+                # Keep every worker busy with up to two batches, until the budget runs out
+                while next_task < len(tasks) and len(in_flight) < 2 * workers and not over_budget():
+                    in_flight[executor.submit(_bootstrap_batch, tasks[next_task])] = next_task
+                    next_task += 1
+                if over_budget():
+                    next_task = len(tasks)
+                if not in_flight:
+                    break
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[in_flight.pop(future)] = future.result()
+
+    # Combine in batch order so the result doesn't depend on completion order
+    ordered = [results[i] for i in sorted(results)]
+    if not ordered:
+        print("Error: Time budget too small to evaluate any resamples")
+        return None
+    pour_in = np.concatenate([r[0] for r in ordered])
+    inflection = np.concatenate([r[1] for r in ordered])
+    clock_stop = np.concatenate([r[2] for r in ordered])
+    reaction = clock_stop - pour_in
+
+    # Point estimates from the original data, with the same detectors as detect_events.py
+    pour_in_time_s, _, _ = detect_pour_in(df, channel=channel, window_size=window_size,
+                                          threshold_factor=params['threshold_factor'],
+                                          search_fraction=params['search_fraction'])
+    clock_stop_time_s, _, inflection_time_s = detect_clock_stop(df, channel=channel, stop_level=stop_level)
+    estimates = {
+        'pour_in_time_s': pour_in_time_s,
+        'inflection_time_s': None if inflection_time_s is None else float(inflection_time_s),
+        'clock_stop_time_s': None if clock_stop_time_s is None else float(clock_stop_time_s),
+        'reaction_time_s': (float(clock_stop_time_s - pour_in_time_s)
+                            if pour_in_time_s is not None and clock_stop_time_s is not None else None),
+    }
+    samples = {
+        'pour_in_time_s': pour_in,
+        'inflection_time_s': inflection,
+        'clock_stop_time_s': clock_stop,
+        'reaction_time_s': reaction,
+    }
+
+    tail = (100 - level) / 2
+    summary = {'n_resamples': int(len(clock_stop)), 'elapsed_s': time.perf_counter() - start,
+               'level': level}
+    for name, draws in samples.items():
+        valid = draws[np.isfinite(draws)]
+        entry = {'estimate': estimates[name], 'valid_resamples': int(len(valid)),
+                 'ci_low': None, 'ci_high': None, 'std': None}
+        if len(valid) > 1:
+            entry['ci_low'], entry['ci_high'] = (float(v) for v in np.percentile(valid, [tail, 100 - tail]))
+            entry['std'] = float(np.std(valid, ddof=1))
+        summary[name] = entry
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bootstrap confidence intervals for detected event times.")
+    parser.add_argument("csv_file", help="Path to CSV file or segmented run directory")
+    parser.add_argument("--channel", default="C", help="Channel to analyze (default: C)")
+    parser.add_argument("--resamples", type=int, default=2000, help="Number of resamples (default: 2000)")
+    parser.add_argument("--level", type=float, default=95.0, help="Confidence level in percent (default: 95)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=100, help="Resamples per vectorized batch (default: 100)")
+    parser.add_argument("--time-budget", type=float, default=None,
+                        help="Stop starting new batches after this many seconds")
+    parser.add_argument("--block-length", type=int, default=20,
+                        help="Block length for resampling autocorrelated residuals (default: 20)")
+    parser.add_argument("--profile", help="Detector settings tuned by tune_detectors.py")
+    args = parser.parse_args()
+
+    print(f"Reading: {args.csv_file}")
+    df = read_run_csv(args.csv_file)
+    if args.channel not in df.columns:
+        print(f"Error: Channel '{args.channel}' not found in CSV file!")
+        sys.exit(1)
+    df = calculate_relative_time(df)
+
+    summary = bootstrap_events(df, channel=args.channel, n_resamples=args.resamples, level=args.level,
+                               seed=args.seed, workers=args.workers, batch_size=args.batch_size,
+                               time_budget=args.time_budget, block_length=args.block_length,
+                               params=load_profile(args.profile) if args.profile else None)
+    if summary is None:
+        sys.exit(1)
+
+    print(f"\n{'='*60}")
+    print(f"Bootstrap Confidence Intervals ({summary['level']:g}%)")
+    print(f"{'='*60}")
+    print(f"{summary['n_resamples']} resamples in {summary['elapsed_s']:.2f} seconds\n")
+    print(f"{'Event':>18} {'Estimate':>10} {'CI low':>10} {'CI high':>10} {'Std':>8} {'Valid':>7}")
+    for name, label in [('pour_in_time_s', 'Pour-in'), ('inflection_time_s', 'Inflection'),
+                        ('clock_stop_time_s', 'Clock stop'), ('reaction_time_s', 'Reaction time')]:
+        entry = summary[name]
+        fmt = lambda v: f"{v:.2f}" if v is not None else "-"
+        print(f"{label:>18} {fmt(entry['estimate']):>10} {fmt(entry['ci_low']):>10} "
+              f"{fmt(entry['ci_high']):>10} {fmt(entry['std']):>8} {entry['valid_resamples']:>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,8 @@
 #define HALL_PIN 2
 #define SD_CARD
 #define HALL_EFFECT
+// #define HOST_CONTROL  // Let the host (read.py) decide when to stop; accepts "STOP" / "RESET" over serial
+// #define BINARY_PROTOCOL  // Send COBS-framed binary samples with CRC16 and a sequence number (see framing.py)
 
 const int chipSelect = 10;
 volatile int hallCount = 0;
@@ -20,6 +22,115 @@ void hallISR() {
   hallCount++;
 }
 
+#ifdef BINARY_PROTOCOL
+const uint8_t FRAME_SAMPLE = 0x01;
+const uint8_t FRAME_TEXT = 0x02;
+const uint8_t MAX_TEXT_BYTES = 48;
+uint16_t frameSeq = 0;
+
+// CRC-16/CCITT-FALSE (polynomial 0x1021, initial value 0xFFFF)
+uint16_t crc16(const uint8_t *data, uint8_t length) {
+  uint16_t crc = 0xFFFF;
+  for (uint8_t i = 0; i < length; i++) {
+    crc ^= (uint16_t)data[i] << 8;
+    for (uint8_t bit = 0; bit < 8; bit++) {
+      crc = (crc & 0x8000) ? (crc << 1) ^ 0x1021 : crc << 1;
+    }
+  }
+  return crc;
+}
+
+// COBS-encode a frame (shorter than 254 bytes) and send it with the 0x00 delimiter
+void sendCobs(const uint8_t *data, uint8_t length) {
+  uint8_t out[MAX_TEXT_BYTES + 8];
+  uint8_t codeIndex = 0;
+  uint8_t outIndex = 1;
+  uint8_t code = 1;
+  for (uint8_t i = 0; i < length; i++) {
+    if (data[i] == 0) {
+      out[codeIndex] = code;
+      codeIndex = outIndex++;
+      code = 1;
+    } else {
+      out[outIndex++] = data[i];
+      code++;
+    }
+  }
+  out[codeIndex] = code;
+  out[outIndex++] = 0;
+  Serial.write(out, outIndex);
+}
+
+// type | seq | body | crc, all little-endian
+void sendFrame(uint8_t type, const uint8_t *body, uint8_t bodyLength) {
+  uint8_t frame[MAX_TEXT_BYTES + 5];
+  frame[0] = type;
+  frame[1] = frameSeq & 0xFF;
+  frame[2] = frameSeq >> 8;
+  frameSeq++;
+  memcpy(frame + 3, body, bodyLength);
+  uint16_t crc = crc16(frame, bodyLength + 3);
+  frame[bodyLength + 3] = crc & 0xFF;
+  frame[bodyLength + 4] = crc >> 8;
+  sendCobs(frame, bodyLength + 5);
+}
+
+void sendSample(uint16_t r, uint16_t g, uint16_t b, uint16_t c, uint32_t encoder) {
+  uint8_t body[12] = {
+    (uint8_t)r, (uint8_t)(r >> 8), (uint8_t)g, (uint8_t)(g >> 8),
+    (uint8_t)b, (uint8_t)(b >> 8), (uint8_t)c, (uint8_t)(c >> 8),
+    (uint8_t)encoder, (uint8_t)(encoder >> 8), (uint8_t)(encoder >> 16), (uint8_t)(encoder >> 24)
+  };
+  sendFrame(FRAME_SAMPLE, body, sizeof(body));
+}
+#endif
+
+// Messages for the host: a text line, or a text frame with BINARY_PROTOCOL
+void sendLine(const char *text) {
+  #ifdef BINARY_PROTOCOL
+  uint8_t length = strlen(text) < MAX_TEXT_BYTES ? strlen(text) : MAX_TEXT_BYTES;
+  sendFrame(FRAME_TEXT, (const uint8_t *)text, length);
+  #else
+  Serial.println(text);
+  #endif
+}
+
+#ifdef HOST_CONTROL
+char commandBuffer[16];
+uint8_t commandLength = 0;
+
+// Read host commands without blocking; answer each with ACK or ERR
+void handleHostCommands() {
+  while (Serial.available() > 0) {
+    char ch = Serial.read();
+    if (ch == '\r') {
+      continue;
+    }
+    if (ch != '\n') {
+      if (commandLength < sizeof(commandBuffer) - 1) {
+        commandBuffer[commandLength++] = ch;
+      }
+      continue;
+    }
+    commandBuffer[commandLength] = '\0';
+    char reply[32];
+    if (strcmp(commandBuffer, "STOP") == 0) {
+      digitalWrite(RELAY_PIN, LOW);
+      snprintf(reply, sizeof(reply), "ACK STOP %lu", millis() - startTime);
+      sendLine(reply);
+    } else if (strcmp(commandBuffer, "RESET") == 0) {
+      digitalWrite(RELAY_PIN, HIGH);
+      snprintf(reply, sizeof(reply), "ACK RESET %lu", millis() - startTime);
+      sendLine(reply);
+    } else if (commandLength > 0) {
+      snprintf(reply, sizeof(reply), "ERR %s", commandBuffer);
+      sendLine(reply);
+    }
+    commandLength = 0;
+  }
+}
+#endif
+
 void setup() {
   pinMode(RELAY_PIN, OUTPUT);
   digitalWrite(RELAY_PIN, HIGH);
@@ -71,7 +182,7 @@ void setup() {
 
   #endif
 
-  Serial.println("Red Green Blue Clear");
+  sendLine("Red Green Blue Clear");
 
   startTime = millis();
 }
@@ -81,6 +192,9 @@ void loop() {
 
   // Wait for color data to be ready
   while (!apds.colorDataReady()) {
+    #ifdef HOST_CONTROL
+    handleHostCommands();
+    #endif
     delay(5);
   }
 
@@ -92,11 +206,18 @@ void loop() {
   float elapsedSeconds = currentTime / 1000.0;
 
   // Print values to serial
+  #ifdef BINARY_PROTOCOL
+  noInterrupts();
+  uint32_t encoderCount = hallCount;
+  interrupts();
+  sendSample(r, g, b, c, encoderCount);
+  #else
   Serial.print(r); Serial.print(" ");
   Serial.print(g); Serial.print(" ");
   Serial.print(b); Serial.print(" ");
   Serial.print(c); Serial.print(" ");
   Serial.println(hallCount);
+  #endif
 
 
   #ifdef SD_CARD
@@ -113,11 +234,16 @@ void loop() {
   #endif
 
 
+  #ifdef HOST_CONTROL
+  // The host decides when to stop; check for commands between samples too
+  handleHostCommands();
+  #else
   //only stop if c value is low and at least 5 seconds have passed
 
   if (c < 1000 && millis() - startTime > 5000) {
     digitalWrite(RELAY_PIN, LOW);
   }
+  #endif
 
 
 
@@ -135,5 +261,14 @@ void loop() {
   //   // Add motor-off or other stop actions here if needed
   // }
 
+  #ifdef HOST_CONTROL
+  // Same pause as below, but stay responsive to host commands
+  unsigned long pauseStart = millis();
+  while (millis() - pauseStart < 100) {
+    handleHostCommands();
+    delay(1);
+  }
+  #else
   delay(100);
+  #endif
 }
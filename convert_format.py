@@ -1,58 +1,134 @@
-import pandas as pd
+"""
+CSV Format Conversion for Color Sensor Runs
+
+Converts legacy 'Timestamp,t,R,G,B,C' files (a minute-resolution base
+timestamp plus relative seconds) to the 'Timestamp,R,G,B,C' format the
+analysis scripts read. Runs logged with monotonic 'Time_ns' timestamps are
+exported with human-readable wall-clock timestamps instead.
+
+Dependencies:
+    pandas, numpy
+
+Usage:
+    python convert_format.py <input_file> [output_file]
+
+    input_file  - Legacy or monotonic CSV file (or a segmented run directory)
+    output_file - Output CSV file (default: adds '_converted' to input)
+
+Example:
+    python convert_format.py color_data_11_21.csv color_data_11_21_converted.csv
+"""
+
+import numpy as np
 import sys
-from datetime import datetime, timedelta
+from datetime import datetime
+from run_io import read_run_csv, iter_run_chunks, wall_timestamps, format_timestamps
+
+def monotonic_to_timestamp_frame(df):
+    """
+    Convert one 'Time_ns,R,G,B,C' DataFrame to 'Timestamp,R,G,B,C' by adding the
+    monotonic offsets to the run's wall-clock anchor (df.attrs['anchor']).
+    'Flags' and 'Device_ns' columns are kept.
+    """
+    import pandas as pd
+    df_converted = pd.DataFrame({
+        'Timestamp': format_timestamps(wall_timestamps(df)).values,
+        'R': df['R'].values,
+        'G': df['G'].values,
+        'B': df['B'].values,
+        'C': df['C'].values
+    })
+    for col in ('Flags', 'Device_ns'):
+        if col in df.columns:
+            df_converted[col] = df[col].values
+    return df_converted
+
+
+def parse_legacy_base_timestamp(text):
+    """Parse the minute-resolution base timestamp of a legacy file, or return None"""
+    # Try format: "11/17/25 18:52", then "2025-11-17 18:52"
+    for fmt in ("%m/%d/%y %H:%M", "%Y-%m-%d %H:%M"):
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+def legacy_to_timestamp_frame(df, base_timestamp):
+    """
+    Convert a legacy 'Timestamp,t,R,G,B,C' DataFrame to 'Timestamp,R,G,B,C', where
+    each new timestamp is the base timestamp plus the relative time 't' in seconds.
+    """
+    import pandas as pd
+    # Whole microseconds, rounded the way datetime.timedelta(seconds=t) rounds
+    offsets_us = np.round(df['t'].astype(float).values * 1e6).astype('int64')
+    timestamps = pd.Timestamp(base_timestamp) + pd.to_timedelta(offsets_us, unit='us')
+    return pd.DataFrame({
+        'Timestamp': format_timestamps(timestamps).values,
+        'R': df['R'].values,
+        'G': df['G'].values,
+        'B': df['B'].values,
+        'C': df['C'].values
+    })
+
+
+def export_monotonic_format(input_file, output_file):
+    """
+    Export a 'Time_ns,R,G,B,C' file (as written by read.py) to 'Timestamp,R,G,B,C'
+    by adding the monotonic offsets to the run's wall-clock anchor.
+    Segmented runs are converted one segment at a time into a single output file.
+    """
+    rows = 0
+    for df in iter_run_chunks(input_file):
+        if rows == 0 and not df.attrs.get('anchor'):
+            print("Warning: No wall-clock anchor found; timestamps will start at 1970-01-01")
+        
+        df_converted = monotonic_to_timestamp_frame(df)
+        df_converted.to_csv(output_file, index=False, mode='w' if rows == 0 else 'a', header=(rows == 0))
+        rows += len(df_converted)
+    
+    print(f"Converted file saved to: {output_file}")
+    print(f"Successfully converted {rows} rows")
+    
+    return rows > 0
+
 
 def convert_csv_format(input_file, output_file):
     """
     Convert CSV format from 'Timestamp,t,R,G,B,C' to 'Timestamp,R,G,B,C'
-    where the new Timestamp includes the relative time 't' added as seconds/milliseconds
+    where the new Timestamp includes the relative time 't' added as seconds/milliseconds.
+    Files with integer 'Time_ns' timestamps are exported with human-readable timestamps.
     """
     print(f"Reading: {input_file}")
     
+    # Check the columns first so monotonic runs can be streamed
+    columns = read_run_csv(input_file, nrows=0).columns
+    if 'Time_ns' in columns:
+        print("Found monotonic timestamps to export")
+        return export_monotonic_format(input_file, output_file)
+    
     # Read the CSV file
-    df = pd.read_csv(input_file)
+    df = read_run_csv(input_file)
     
     # Check if the file has the expected columns
     if 't' not in df.columns:
-        print("Error: Input file doesn't have 't' column. Already in correct format?")
+        print("Error: Input file doesn't have 't' or 'Time_ns' column. Already in correct format?")
         return False
     
     print(f"Found {len(df)} rows to convert")
     
     # Parse the base timestamp (assuming format like "11/17/25 18:52")
-    # Convert to full datetime
     base_timestamp_str = df['Timestamp'].iloc[0]
-    
-    # Try different date formats
-    try:
-        # Try format: "11/17/25 18:52"
-        base_timestamp = datetime.strptime(base_timestamp_str, "%m/%d/%y %H:%M")
-    except ValueError:
-        try:
-            # Try format: "2025-11-17 18:52"
-            base_timestamp = datetime.strptime(base_timestamp_str, "%Y-%m-%d %H:%M")
-        except ValueError:
-            print(f"Error: Unable to parse timestamp format: {base_timestamp_str}")
-            return False
+    base_timestamp = parse_legacy_base_timestamp(base_timestamp_str)
+    if base_timestamp is None:
+        print(f"Error: Unable to parse timestamp format: {base_timestamp_str}")
+        return False
     
     print(f"Base timestamp: {base_timestamp}")
     
-    # Create new timestamp column by adding 't' seconds to base timestamp
-    new_timestamps = []
-    for idx, row in df.iterrows():
-        # Add the relative time (in seconds) to the base timestamp
-        new_time = base_timestamp + timedelta(seconds=float(row['t']))
-        # Format as "YYYY-MM-DD HH:MM:SS.mmm"
-        new_timestamps.append(new_time.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3])
-    
     # Create new dataframe with converted format
-    df_converted = pd.DataFrame({
-        'Timestamp': new_timestamps,
-        'R': df['R'],
-        'G': df['G'],
-        'B': df['B'],
-        'C': df['C']
-    })
+    df_converted = legacy_to_timestamp_frame(df, base_timestamp)
     
     # Save to output file
     df_converted.to_csv(output_file, index=False)
@@ -68,7 +144,7 @@ def main():
         print("Example: python convert_format.py color_data_11_21.csv color_data_11_21_converted.csv")
         return
     
-    input_file = sys.argv[1]
+    input_file = sys.argv[1].rstrip('/\\')  # Segmented runs may be given as 'dir/'
     
     # Generate output filename if not provided
     if len(sys.argv) >= 3:
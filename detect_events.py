@@ -6,30 +6,77 @@ This script analyzes CSV files containing color sensor data to detect:
 2. Clock stop event: When the reaction completes (sigmoid transition from light to dark)
 
 Dependencies:
-    pandas, numpy, matplotlib, scipy
+    pandas, numpy, scipy (matplotlib only with --plot)
 
 Usage:
-    python detect_events.py <csv_file> [--plot]
+    python detect_events.py <csv_file_or_run_dir> [--plot] [--all-channels] [--profile FILE]
+    
+    --all-channels fits R, G, B and C together and combines them into a
+    weighted consensus clock stop time with per-channel diagnostics.
+    --profile uses detector settings tuned by tune_detectors.py.
     
 Example:
     python detect_events.py color_data_20250101_120000.csv --plot
 """
 
-import pandas as pd
 import numpy as np
+import json
 import sys
-import matplotlib.pyplot as plt
-from scipy.optimize import curve_fit
 from datetime import datetime, timedelta
+from run_io import read_run_csv, add_time_columns
+
+# Detector settings; tune_detectors.py writes profiles that override them (--profile)
+DETECTOR_DEFAULTS = {
+    'window_size': 10,        # Rolling window of the pour-in smoothing
+    'threshold_factor': 3.0,  # Pour-in threshold in rolling standard deviations of the derivative
+    'search_fraction': 0.3,   # Fraction of the run searched for the pour-in
+    'stop_level': 0.9,        # Fraction of the sigmoid transition taken as the clock stop
+}
 
 def calculate_relative_time(df):
-    """Calculate relative time in seconds from the first timestamp"""
-    df['Timestamp'] = pd.to_datetime(df['Timestamp'])
-    start_time = df['Timestamp'].iloc[0]
-    df['Time_s'] = (df['Timestamp'] - start_time).dt.total_seconds()
-    return df
+    """
+    Calculate relative time in seconds from the first sample.
+    Uses the integer 'Time_ns' column when present, so no timestamps are parsed.
+    """
+    return add_time_columns(df)
 
-def detect_pour_in(df, channel='C', window_size=10, threshold_factor=3.0):
+def rolling_mean_centered(X, window):
+    """
+    Centered rolling mean along axis 1, matching pandas rolling(window, center=True).mean().
+    Positions without a full window are NaN.
+    """
+    n = X.shape[1]
+    out = np.full(X.shape, np.nan)
+    if window > n:
+        return out
+    csum = np.concatenate([np.zeros((X.shape[0], 1)), np.cumsum(X, axis=1)], axis=1)
+    sums = csum[:, window:] - csum[:, :-window]
+    start = window // 2
+    out[:, start:start + sums.shape[1]] = sums / window
+    return out
+
+def rolling_std_centered(X, window):
+    """Centered rolling sample standard deviation (ddof=1) along axis 1"""
+    mean = rolling_mean_centered(X, window)
+    mean_sq = rolling_mean_centered(X * X, window)
+    var = (mean_sq - mean * mean) * window / (window - 1)
+    return np.sqrt(np.maximum(var, 0))
+
+def fill_edges(X):
+    """Forward fill then backward fill NaNs at the edges of each row"""
+    out = X.copy()
+    valid = ~np.isnan(out)
+    first = np.argmax(valid, axis=1)
+    last = X.shape[1] - 1 - np.argmax(valid[:, ::-1], axis=1)
+    rows = np.arange(X.shape[0])
+    cols = np.arange(X.shape[1])[None, :]
+    out = np.where(cols < first[:, None], out[rows, first][:, None], out)
+    out = np.where(cols > last[:, None], out[rows, last][:, None], out)
+    return out
+
+def detect_pour_in(df, channel='C', window_size=DETECTOR_DEFAULTS['window_size'],
+                   threshold_factor=DETECTOR_DEFAULTS['threshold_factor'],
+                   search_fraction=DETECTOR_DEFAULTS['search_fraction']):
     """
     Detect when reactants were poured in by looking for sudden changes in color readings.
     
@@ -38,10 +85,12 @@ def detect_pour_in(df, channel='C', window_size=10, threshold_factor=3.0):
         channel: Channel to analyze ('R', 'G', 'B', or 'C')
         window_size: Size of rolling window for smoothing
         threshold_factor: Multiplier for standard deviation to set threshold
+        search_fraction: Fraction of the data, from the start, searched for the pour-in
     
     Returns:
         Tuple of (pour_in_time_s, pour_in_timestamp, confidence)
     """
+    import pandas as pd
     if channel not in df.columns:
         print(f"Warning: Channel '{channel}' not found. Using 'C' instead.")
         channel = 'C'
@@ -65,8 +114,8 @@ def detect_pour_in(df, channel='C', window_size=10, threshold_factor=3.0):
     threshold = rolling_mean + threshold_factor * rolling_std
     
     # Find the first significant change (pour-in should happen early)
-    # Look in the first 30% of the data
-    search_end = int(len(df) * 0.3)
+    # Look in the first 30% of the data by default
+    search_end = int(len(df) * search_fraction)
     significant_changes = np.where(np.abs(derivative[:search_end]) > np.abs(threshold[:search_end]))[0]
     
     if len(significant_changes) > 0:
@@ -93,7 +142,36 @@ def sigmoid(x, L, k, x0):
     """
     return L / (1 + np.exp(-k * (x - x0)))
 
-def detect_clock_stop(df, channel='C', min_points=50):
+def fit_clock_sigmoid(time_s, values):
+    """
+    Fit a sigmoid to the normalized light-to-dark transition.
+    
+    Args:
+        time_s: Array of relative times in seconds
+        values: Array of channel values
+    
+    Returns:
+        Fitted (L, k, x0); raises RuntimeError or ValueError if the fit fails
+    """
+    # Normalize values to 0-1 range for better sigmoid fitting
+    # (decreasing light-to-dark transitions are inverted to an increasing sigmoid)
+    normalized = normalize_transition(values)
+    
+    # Initial guess for sigmoid parameters
+    L_guess = 1.0  # Maximum normalized value
+    k_guess = 0.1  # Steepness (adjust based on time scale)
+    x0_guess = time_s[len(time_s) // 2]  # Midpoint guess
+    
+    # Imported here so that callers not fitting with scipy don't pay for it at startup
+    from scipy.optimize import curve_fit
+    
+    popt, _ = curve_fit(sigmoid, time_s, normalized,
+                       p0=[L_guess, k_guess, x0_guess],
+                       maxfev=5000,
+                       bounds=([0.5, 0.01, time_s[0]], [1.5, 10.0, time_s[-1]]))
+    return popt
+
+def detect_clock_stop(df, channel='C', min_points=50, stop_level=DETECTOR_DEFAULTS['stop_level']):
     """
     Detect when the clock should stop by fitting a sigmoid curve to the transition.
     The reaction changes from light to dark, following a sigmoid curve.
@@ -102,6 +180,7 @@ def detect_clock_stop(df, channel='C', min_points=50):
         df: DataFrame with color data
         channel: Channel to analyze ('R', 'G', 'B', or 'C')
         min_points: Minimum number of points required for sigmoid fitting
+        stop_level: Fraction of the transition taken as the clock stop
     
     Returns:
         Tuple of (clock_stop_time_s, clock_stop_timestamp, inflection_point_time_s)
@@ -118,45 +197,15 @@ def detect_clock_stop(df, channel='C', min_points=50):
     time_s = df['Time_s'].values
     values = df[channel].values
     
-    # Determine if values are increasing or decreasing (reaction goes light to dark)
-    # If initial values are higher, reaction is decreasing (light to dark)
-    # If initial values are lower, reaction is increasing (dark to light)
-    initial_avg = np.mean(values[:min(20, len(values)//10)])
-    final_avg = np.mean(values[-min(20, len(values)//10):])
-    
-    is_decreasing = initial_avg > final_avg
-    
-    # Normalize values to 0-1 range for better sigmoid fitting
-    if is_decreasing:
-        # Invert so we're fitting an increasing sigmoid
-        normalized = (values.max() - values) / (values.max() - values.min() + 1e-6)
-    else:
-        normalized = (values - values.min()) / (values.max() - values.min() + 1e-6)
-    
-    # Initial guess for sigmoid parameters
-    L_guess = 1.0  # Maximum normalized value
-    k_guess = 0.1  # Steepness (adjust based on time scale)
-    x0_guess = time_s[len(time_s) // 2]  # Midpoint guess
-    
     try:
-        # Fit sigmoid curve
-        popt, _ = curve_fit(sigmoid, time_s, normalized,
-                           p0=[L_guess, k_guess, x0_guess],
-                           maxfev=5000,
-                           bounds=([0.5, 0.01, time_s[0]], [1.5, 10.0, time_s[-1]]))
-        
-        L, k, x0 = popt
+        L, k, x0 = fit_clock_sigmoid(time_s, values)
         
         # The inflection point (x0) is where the reaction is halfway through
         # For clock stop, we might want a point slightly after inflection
-        # Use 90% of the transition as the "stop" point
-        # Calculate time when sigmoid reaches 0.9
-        # 0.9 = L / (1 + exp(-k * (t - x0)))
-        # Solving: t = x0 + (1/k) * ln(0.9 / (L - 0.9))
-        if L > 0.9:
-            stop_time_s = x0 + (1/k) * np.log(0.9 / (L - 0.9))
-        else:
-            stop_time_s = x0
+        # Use 90% of the transition as the "stop" point by default
+        # Solving stop_level = L / (1 + exp(-k * (t - x0))):
+        # t = x0 + (1/k) * ln(stop_level / (L - stop_level))
+        stop_time_s = float(stop_time_from_sigmoid(L, k, x0, stop_level))
         
         # Ensure stop time is within data range
         stop_time_s = max(time_s[0], min(time_s[-1], stop_time_s))
@@ -176,13 +225,359 @@ def detect_clock_stop(df, channel='C', min_points=50):
         clock_stop_timestamp = df.iloc[max_change_idx]['Timestamp']
         return stop_time_s, clock_stop_timestamp, stop_time_s
 
-def analyze_csv_file(csv_file, plot=False):
+def sigmoid_batch_jacobian(t, params):
+    """
+    Sigmoid values and Jacobian for a batch of parameter sets.
+    
+    Args:
+        t: Array of times, shape (n_points,), or (n_series, n_points) for
+           series with their own time axes
+        params: Array of (L, k, x0) rows, shape (n_series, 3)
+    
+    Returns:
+        Tuple of (values, jacobian) with shapes (n_series, n_points) and
+        (n_series, n_points, 3)
+    """
+    L = params[:, 0:1]
+    k = params[:, 1:2]
+    x0 = params[:, 2:3]
+    dt = (t if t.ndim == 2 else t[None, :]) - x0
+    s = 1.0 / (1.0 + np.exp(np.clip(-k * dt, -500, 500)))
+    ds = s * (1 - s)
+    jacobian = np.stack([s, L * ds * dt, -L * ds * k], axis=-1)
+    return L * s, jacobian
+
+def levenberg_marquardt_batch(model, t, Y, p0, lower, upper, max_iter=200, tol=1e-8, weights=None):
+    """
+    Fit the same model to many series at once with a vectorized
+    Levenberg-Marquardt least-squares solver.
+    
+    Each iteration is a handful of array operations on the whole batch rather
+    than one solver call per series. Series of different lengths (e.g. separate
+    runs) are padded to a common length and the padding is masked out with
+    weights. Parameters are kept inside bounds by clipping each step.
+    
+    Args:
+        model: Function (t, params) -> (values, jacobian), see sigmoid_batch_jacobian
+        t: Array of times, shape (n_points,) shared by every series, or
+           (n_series, n_points)
+        Y: Array of observations, shape (n_series, n_points)
+        p0: Initial parameters, shape (n_series, n_params)
+        lower, upper: Parameter bounds, shape (n_params,) or (n_series, n_params)
+        max_iter: Maximum number of iterations
+        tol: Relative cost decrease below which a series counts as converged
+        weights: Optional 0/1 mask of the points to fit, shape (n_series, n_points)
+    
+    Returns:
+        Tuple of (params, covariance, sse, converged) where covariance has shape
+        (n_series, n_params, n_params)
+    """
+    lower = np.broadcast_to(np.asarray(lower, dtype=float), p0.shape)
+    upper = np.broadcast_to(np.asarray(upper, dtype=float), p0.shape)
+    params = np.clip(np.array(p0, dtype=float), lower, upper)
+    n_series, n_params = params.shape
+    eye = np.eye(n_params)
+    
+    def evaluate(rows, p):
+        values, jacobian = model(t[rows] if t.ndim == 2 else t, p)
+        residuals = Y[rows] - values
+        if weights is not None:
+            residuals = residuals * weights[rows]
+            jacobian = jacobian * weights[rows][..., None]
+        return residuals, jacobian
+    
+    t = np.asarray(t, dtype=float)
+    residuals, jacobian = evaluate(slice(None), params)
+    cost = np.einsum('bn,bn->b', residuals, residuals)
+    damping = np.full(n_series, 1e-3)
+    active = np.ones(n_series, dtype=bool)
+    converged = np.zeros(n_series, dtype=bool)
+    
+    for _ in range(max_iter):
+        idx = np.flatnonzero(active)
+        if len(idx) == 0:
+            break
+        Jt = jacobian[idx].transpose(0, 2, 1)
+        JtJ = Jt @ jacobian[idx]
+        gradient = (Jt @ residuals[idx][..., None])[..., 0]
+        diag = np.einsum('bii->bi', JtJ)
+        A = JtJ + (damping[idx, None] * diag + 1e-12)[:, :, None] * eye
+        step = np.linalg.solve(A, gradient[..., None])[..., 0]
+        
+        trial = np.clip(params[idx] + step, lower[idx], upper[idx])
+        trial_residuals, trial_jacobian = evaluate(idx, trial)
+        trial_cost = np.einsum('bn,bn->b', trial_residuals, trial_residuals)
+        
+        improved = trial_cost < cost[idx]
+        better = idx[improved]
+        decrease = cost[better] - trial_cost[improved]
+        params[better] = trial[improved]
+        residuals[better] = trial_residuals[improved]
+        jacobian[better] = trial_jacobian[improved]
+        done = decrease <= tol * np.maximum(cost[better], 1e-300)
+        cost[better] = trial_cost[improved]
+        damping[better] /= 10
+        damping[idx[~improved]] *= 10
+        
+        converged[better[done]] = True
+        active[better[done]] = False
+        # A series whose damping keeps growing has stalled at a (bounded) minimum
+        stalled = damping > 1e10
+        converged[stalled & active] = True
+        active[stalled] = False
+    
+    n_points = Y.shape[1] if weights is None else weights.sum(axis=1)
+    JtJ = jacobian.transpose(0, 2, 1) @ jacobian
+    sigma2 = cost / np.maximum(n_points - n_params, 1)
+    covariance = np.linalg.pinv(JtJ) * sigma2[:, None, None]
+    return params, covariance, cost, converged
+
+def normalize_transition(values):
+    """
+    Normalize channel values to a 0-1 increasing transition for sigmoid fitting.
+    If initial values are higher, the reaction is decreasing (light to dark) and
+    the values are inverted.
+    """
+    initial_avg = np.mean(values[:min(20, len(values)//10)])
+    final_avg = np.mean(values[-min(20, len(values)//10):])
+    
+    if initial_avg > final_avg:
+        return (values.max() - values) / (values.max() - values.min() + 1e-6)
+    return (values - values.min()) / (values.max() - values.min() + 1e-6)
+
+def stop_time_from_sigmoid(L, k, x0, stop_level=DETECTOR_DEFAULTS['stop_level']):
+    """Time at which the fitted sigmoid reaches stop_level (x0 if it never does)"""
+    L = np.asarray(L, dtype=float)
+    k = np.asarray(k, dtype=float)
+    x0 = np.asarray(x0, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stop = x0 + (1 / k) * np.log(stop_level / (L - stop_level))
+    return np.where(L > stop_level, stop, x0)
+
+def detect_clock_stop_batch(series, stop_level=DETECTOR_DEFAULTS['stop_level'], min_points=50):
+    """
+    Clock stop times of several runs from one batched sigmoid fit.
+    
+    Each run is fitted with the same normalization, starting point and bounds as
+    detect_clock_stop, so the results agree with it to well under a millisecond;
+    runs of different lengths are padded and masked.
+    
+    Args:
+        series: List of (time_s, values) array pairs, one per run
+        stop_level: Fraction of the transition taken as the clock stop
+        min_points: Minimum number of points required for sigmoid fitting
+    
+    Returns:
+        List of (clock_stop_time_s, inflection_time_s) tuples, None for runs that
+        are too short or whose fit didn't converge (use detect_clock_stop for those)
+    """
+    results = [None] * len(series)
+    fit = [i for i, (time_s, _) in enumerate(series) if len(time_s) >= min_points]
+    if not fit:
+        return results
+    
+    n_points = max(len(series[i][0]) for i in fit)
+    t = np.empty((len(fit), n_points))
+    Y = np.zeros((len(fit), n_points))
+    weights = np.zeros((len(fit), n_points))
+    p0 = np.empty((len(fit), 3))
+    lower = np.empty((len(fit), 3))
+    upper = np.empty((len(fit), 3))
+    for row, i in enumerate(fit):
+        time_s, values = series[i]
+        n = len(time_s)
+        t[row, :n] = time_s
+        t[row, n:] = time_s[-1]
+        Y[row, :n] = normalize_transition(np.asarray(values, dtype=float))
+        weights[row, :n] = 1.0
+        p0[row] = [1.0, 0.1, time_s[n // 2]]
+        lower[row] = [0.5, 0.01, time_s[0]]
+        upper[row] = [1.5, 10.0, time_s[-1]]
+    
+    params, _, _, converged = levenberg_marquardt_batch(
+        sigmoid_batch_jacobian, t, Y, p0, lower, upper, weights=weights)
+    L, k, x0 = params.T
+    stop_times = np.clip(stop_time_from_sigmoid(L, k, x0, stop_level), lower[:, 2], upper[:, 2])
+    for row, i in enumerate(fit):
+        if converged[row]:
+            results[i] = (float(stop_times[row]), float(x0[row]))
+    return results
+
+def detect_clock_stop_multichannel(df, channels=('R', 'G', 'B', 'C'), min_points=50,
+                                   stop_level=DETECTOR_DEFAULTS['stop_level']):
+    """
+    Estimate the clock stop time jointly from several channels.
+    
+    All channels are fitted in a single batched sigmoid fit. Each channel's stop
+    time gets a standard error from the fit covariance (delta method), and the
+    consensus is the inverse-variance weighted mean of channels whose fit is usable.
+    
+    Args:
+        df: DataFrame with color data and 'Time_s'
+        channels: Channels to combine
+        min_points: Minimum number of points required for sigmoid fitting
+        stop_level: Fraction of the transition taken as the stop point
+    
+    Returns:
+        Dictionary with the consensus 'clock_stop_time_s', 'clock_stop_timestamp',
+        'inflection_time_s', per-channel results under 'channels', and the
+        disagreement diagnostics 'spread_s', 'weighted_std_s', 'chi2_per_dof'
+        and 'consistent'. Returns None if no channel could be fitted.
+    """
+    channels = [ch for ch in channels if ch in df.columns]
+    if not channels:
+        print("Warning: None of the requested channels were found.")
+        return None
+    
+    if len(df) < min_points:
+        print(f"Warning: Not enough data points ({len(df)}) for sigmoid fitting. Need at least {min_points}.")
+        return None
+    
+    time_s = df['Time_s'].values.astype(float)
+    Y = np.vstack([normalize_transition(df[ch].values.astype(float)) for ch in channels])
+    
+    # Start each channel at the first time its transition crosses halfway
+    half = np.argmax(Y >= 0.5, axis=1)
+    p0 = np.column_stack([np.ones(len(channels)), np.full(len(channels), 0.1), time_s[half]])
+    lower = [0.5, 0.01, time_s[0]]
+    upper = [1.5, 10.0, time_s[-1]]
+    
+    params, covariance, sse, converged = levenberg_marquardt_batch(
+        sigmoid_batch_jacobian, time_s, Y, p0, lower, upper)
+    L, k, x0 = params.T
+    stop_times = np.clip(stop_time_from_sigmoid(L, k, x0, stop_level), time_s[0], time_s[-1])
+    
+    # Standard error of each stop time from the parameter covariance (delta method)
+    log_term = np.log(stop_level / np.maximum(L - stop_level, 1e-12))
+    grad = np.column_stack([-1 / (k * np.maximum(L - stop_level, 1e-12)), -log_term / k**2, np.ones_like(k)])
+    stop_var = np.einsum('bi,bij,bj->b', grad, covariance, grad)
+    stop_se = np.sqrt(np.maximum(stop_var, 1e-12))
+    
+    sst = np.sum((Y - Y.mean(axis=1, keepdims=True))**2, axis=1)
+    r_squared = 1 - sse / np.maximum(sst, 1e-12)
+    
+    # Only channels with a converged fit that actually reaches the stop level count
+    usable = converged & (L > stop_level) & (r_squared > 0.5) & np.isfinite(stop_se)
+    if not usable.any():
+        print("Warning: No channel produced a usable sigmoid fit.")
+        return None
+    
+    weights = np.where(usable, 1 / stop_se**2, 0.0)
+    weights /= weights.sum()
+    consensus = float(np.sum(weights * stop_times))
+    inflection = float(np.sum(weights * x0))
+    
+    used = np.flatnonzero(usable)
+    deviations = stop_times - consensus
+    z_scores = deviations / stop_se
+    if len(used) > 1:
+        chi2_per_dof = float(np.sum(z_scores[used]**2) / (len(used) - 1))
+        weighted_std = float(np.sqrt(np.sum(weights * deviations**2)))
+        spread = float(stop_times[used].max() - stop_times[used].min())
+    else:
+        chi2_per_dof = 0.0
+        weighted_std = float(stop_se[used[0]])
+        spread = 0.0
+    
+    stop_idx = np.argmin(np.abs(time_s - consensus))
+    
+    channel_results = {}
+    for i, ch in enumerate(channels):
+        channel_results[ch] = {
+            'clock_stop_time_s': float(stop_times[i]),
+            'stderr_s': float(stop_se[i]),
+            'inflection_time_s': float(x0[i]),
+            'steepness': float(k[i]),
+            'r_squared': float(r_squared[i]),
+            'weight': float(weights[i]),
+            'deviation_s': float(deviations[i]),
+            'z_score': float(z_scores[i]),
+            'used': bool(usable[i]),
+        }
+    
+    return {
+        'clock_stop_time_s': consensus,
+        'clock_stop_timestamp': df.iloc[stop_idx]['Timestamp'],
+        'inflection_time_s': inflection,
+        'channels': channel_results,
+        'spread_s': spread,
+        'weighted_std_s': weighted_std,
+        'chi2_per_dof': chi2_per_dof,
+        # Channels agree if their scatter is explained by their fit uncertainties
+        'consistent': chi2_per_dof <= 4.0,
+    }
+
+def load_profile(path):
+    """
+    Read detector settings from a profile written by tune_detectors.py.
+    
+    Returns:
+        Dictionary with the DETECTOR_DEFAULTS keys
+    """
+    with open(path, 'r') as f:
+        profile = json.load(f)
+    params = dict(DETECTOR_DEFAULTS)
+    params.update({key: value for key, value in profile.get('parameters', {}).items()
+                   if key in DETECTOR_DEFAULTS})
+    params['window_size'] = int(params['window_size'])
+    return params
+
+def pour_in_settings(params):
+    return {key: params[key] for key in ('window_size', 'threshold_factor', 'search_fraction')}
+
+def detect_run_events(df, all_channels=False, params=None):
+    """
+    Detect pour-in and clock stop in a run that is already in memory.
+    
+    Args:
+        df: DataFrame with color data, 'Time_s' and 'Timestamp'
+        all_channels: Combine R, G, B and C into a consensus clock stop time
+        params: Detector settings (see DETECTOR_DEFAULTS and load_profile)
+    
+    Returns:
+        Dictionary with the pour-in and clock stop times and timestamps,
+        'pour_in_confidence', 'inflection_time_s' and 'reaction_time_s'; with
+        all_channels, the per-channel results under 'channels' and the
+        disagreement diagnostics of detect_clock_stop_multichannel under 'consensus'
+    """
+    params = params or DETECTOR_DEFAULTS
+    pour_in_time_s, pour_in_timestamp, confidence = detect_pour_in(df, channel='C', **pour_in_settings(params))
+    
+    stop_level = params['stop_level']
+    multichannel = detect_clock_stop_multichannel(df, stop_level=stop_level) if all_channels else None
+    if multichannel is not None:
+        clock_stop_time_s = multichannel['clock_stop_time_s']
+        clock_stop_timestamp = multichannel['clock_stop_timestamp']
+        inflection_time_s = multichannel['inflection_time_s']
+    else:
+        clock_stop_time_s, clock_stop_timestamp, inflection_time_s = detect_clock_stop(
+            df, channel='C', stop_level=stop_level)
+    
+    return {
+        'pour_in_time_s': pour_in_time_s,
+        'pour_in_timestamp': pour_in_timestamp,
+        'pour_in_confidence': confidence,
+        'clock_stop_time_s': clock_stop_time_s,
+        'clock_stop_timestamp': clock_stop_timestamp,
+        'inflection_time_s': inflection_time_s,
+        'reaction_time_s': clock_stop_time_s - pour_in_time_s if (pour_in_time_s and clock_stop_time_s) else None,
+        'channels': multichannel['channels'] if multichannel else None,
+        'consensus': {key: multichannel[key] for key in ('spread_s', 'weighted_std_s', 'chi2_per_dof', 'consistent')}
+                     if multichannel else None
+    }
+
+def analyze_csv_file(csv_file, plot=False, all_channels=False, params=None):
     """
     Analyze a CSV file to detect pour-in and clock stop events.
     
     Args:
         csv_file: Path to CSV file
         plot: Whether to create a visualization plot
+        all_channels: Combine R, G, B and C into a consensus clock stop time
+        params: Detector settings (see DETECTOR_DEFAULTS and load_profile)
+    
+    Returns:
+        Result of detect_run_events(), or None if the file could not be read
     """
     print(f"\n{'='*60}")
     print(f"Analyzing: {csv_file}")
@@ -190,7 +585,7 @@ def analyze_csv_file(csv_file, plot=False):
     
     # Read CSV file
     try:
-        df = pd.read_csv(csv_file)
+        df = read_run_csv(csv_file)
     except Exception as e:
         print(f"Error reading CSV file: {e}")
         return
@@ -204,26 +599,40 @@ def analyze_csv_file(csv_file, plot=False):
     # Calculate relative time
     df = calculate_relative_time(df)
     
-    # Detect pour-in event
-    print("\n--- Pour-In Detection ---")
-    pour_in_time_s, pour_in_timestamp, confidence = detect_pour_in(df, channel='C')
+    results = detect_run_events(df, all_channels=all_channels, params=params)
+    pour_in_time_s = results['pour_in_time_s']
+    clock_stop_time_s = results['clock_stop_time_s']
+    inflection_time_s = results['inflection_time_s']
     
+    print("\n--- Pour-In Detection ---")
     if pour_in_time_s is not None:
         print(f"Pour-in detected at:")
         print(f"  Relative time: {pour_in_time_s:.2f} seconds")
-        print(f"  Timestamp: {pour_in_timestamp}")
-        print(f"  Confidence: {confidence:.1f}%")
+        print(f"  Timestamp: {results['pour_in_timestamp']}")
+        print(f"  Confidence: {results['pour_in_confidence']:.1f}%")
     else:
         print("Could not detect pour-in event")
     
-    # Detect clock stop event
     print("\n--- Clock Stop Detection ---")
-    clock_stop_time_s, clock_stop_timestamp, inflection_time_s = detect_clock_stop(df, channel='C')
+    if results['channels'] is not None:
+        consensus = results['consensus']
+        print(f"{'Channel':>8} {'Stop (s)':>10} {'+/- (s)':>9} {'R^2':>7} {'Weight':>7} {'Dev (s)':>8}")
+        for ch, res in results['channels'].items():
+            note = "" if res['used'] else "  (excluded)"
+            print(f"{ch:>8} {res['clock_stop_time_s']:>10.2f} {res['stderr_s']:>9.2f} "
+                  f"{res['r_squared']:>7.3f} {res['weight']:>7.2f} {res['deviation_s']:>8.2f}{note}")
+        print(f"Channel spread: {consensus['spread_s']:.2f}s, "
+              f"weighted std: {consensus['weighted_std_s']:.2f}s, "
+              f"chi2/dof: {consensus['chi2_per_dof']:.2f}")
+        if not consensus['consistent']:
+            print("Warning: Channels disagree by more than their fit uncertainties")
+    elif all_channels:
+        print("Falling back to the Clear channel")
     
     if clock_stop_time_s is not None:
         print(f"Clock stop detected at:")
         print(f"  Relative time: {clock_stop_time_s:.2f} seconds")
-        print(f"  Timestamp: {clock_stop_timestamp}")
+        print(f"  Timestamp: {results['clock_stop_timestamp']}")
         if inflection_time_s is not None and inflection_time_s != clock_stop_time_s:
             print(f"  Inflection point (50% transition): {inflection_time_s:.2f} seconds")
         
@@ -235,6 +644,8 @@ def analyze_csv_file(csv_file, plot=False):
     
     # Create visualization if requested
     if plot:
+        import matplotlib.pyplot as plt
+        
         fig, axes = plt.subplots(2, 1, figsize=(12, 10))
         fig.suptitle(f'Event Detection: {csv_file}', fontsize=14, fontweight='bold')
         
@@ -280,32 +691,39 @@ def analyze_csv_file(csv_file, plot=False):
         plt.tight_layout()
         
         # Save plot
-        plot_filename = csv_file.replace('.csv', '_events.png')
+        run_name = csv_file.rstrip('/\\')  # Segmented runs are directories
+        plot_filename = run_name.replace('.csv', '_events.png') if run_name.endswith('.csv') else run_name + '_events.png'
         plt.savefig(plot_filename, dpi=150, bbox_inches='tight')
         print(f"\nPlot saved to: {plot_filename}")
         
         plt.show()
     
-    return {
-        'pour_in_time_s': pour_in_time_s,
-        'pour_in_timestamp': pour_in_timestamp,
-        'clock_stop_time_s': clock_stop_time_s,
-        'clock_stop_timestamp': clock_stop_timestamp,
-        'reaction_time_s': clock_stop_time_s - pour_in_time_s if (pour_in_time_s and clock_stop_time_s) else None
-    }
+    return results
 
 def main():
     if len(sys.argv) < 2:
-        print("Usage: python detect_events.py <csv_file> [--plot]")
+        print("Usage: python detect_events.py <csv_file> [--plot] [--all-channels] [--profile FILE]")
         print("\nExample:")
         print("  python detect_events.py color_data_20250101_120000.csv")
         print("  python detect_events.py color_data_20250101_120000.csv --plot")
+        print("  python detect_events.py color_data_20250101_120000.csv --all-channels")
+        print("  python detect_events.py color_data_20250101_120000.csv --profile detector_profile.json")
         sys.exit(1)
     
     csv_file = sys.argv[1]
     plot = '--plot' in sys.argv
-    
-    results = analyze_csv_file(csv_file, plot=plot)
+    all_channels = '--all-channels' in sys.argv
+    
+    params = None
+    if '--profile' in sys.argv:
+        index = sys.argv.index('--profile')
+        if index + 1 >= len(sys.argv):
+            print("Error: --profile needs a file")
+            sys.exit(1)
+        params = load_profile(sys.argv[index + 1])
+        print(f"Detector settings from {sys.argv[index + 1]}: {params}")
+    
+    results = analyze_csv_file(csv_file, plot=plot, all_channels=all_channels, params=params)
     
     if results:
         print(f"\n{'='*60}")
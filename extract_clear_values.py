@@ -1,31 +1,117 @@
 import argparse
+import itertools
 import math
 import sys
-import pandas as pd
+from run_io import iter_run_chunks
 
 
-def get_seconds_from_start(df):
+def get_time_start(df):
     """
-    Return integer second bins starting at 0 using either 't' (relative seconds)
-    or 'Timestamp' (absolute time). Falls back to None if neither exists.
+    Return the earliest time in df in the units of its time column ('Time_ns',
+    't' or 'Timestamp'), or None if there is no usable time column.
     """
+    import pandas as pd
+    if 'Time_ns' in df.columns:
+        return df['Time_ns'].astype('int64').min()
     if 't' in df.columns:
-        rel_seconds = df['t'].astype(float)
-        start = rel_seconds.min()
-        return rel_seconds.sub(start).apply(math.floor)
+        return df['t'].astype(float).min()
     if 'Timestamp' in df.columns:
         ts = pd.to_datetime(df['Timestamp'], errors='coerce')
         if ts.isnull().all():
             return None
-        start = ts.min()
+        return ts.min()
+    return None
+
+
+def get_seconds_from_start(df, start=None):
+    """
+    Return integer second bins starting at 0 using 'Time_ns' (monotonic nanoseconds),
+    't' (relative seconds) or 'Timestamp' (absolute time). Falls back to None if
+    none of them exists.
+    
+    Pass the start of the whole run (see get_time_start) when df is one chunk of it.
+    """
+    import pandas as pd
+    if start is None:
+        start = get_time_start(df)
+        if start is None:
+            return None
+    if 'Time_ns' in df.columns:
+        time_ns = df['Time_ns'].astype('int64')
+        return (time_ns - start) // 1_000_000_000
+    if 't' in df.columns:
+        rel_seconds = df['t'].astype(float)
+        return rel_seconds.sub(start).apply(math.floor)
+    if 'Timestamp' in df.columns:
+        ts = pd.to_datetime(df['Timestamp'], errors='coerce')
         rel_seconds = (ts - start).dt.total_seconds()
         return rel_seconds.apply(math.floor)
     return None
 
 
+def clear_values_per_second(chunks, how):
+    """
+    Aggregate the Clear channel per second over a stream of chunks.
+    
+    Rows of the last second in each chunk are held back and merged with the next
+    chunk, so seconds spanning a segment boundary are aggregated as a whole.
+    
+    Args:
+        chunks: Iterable of run DataFrames in time order
+        how: 'median' or 'first'
+    
+    Returns:
+        List of values, or None if there is no time column
+    """
+    import pandas as pd
+    values = []
+    start = None
+    carry = None
+    for chunk in chunks:
+        if start is None:
+            start = get_time_start(chunk)
+            if start is None:
+                return None
+        part = chunk if carry is None else pd.concat([carry, chunk], ignore_index=True)
+        seconds = get_seconds_from_start(part, start)
+        complete = seconds < seconds.iloc[-1]
+        if complete.any():
+            values.extend(part[complete].groupby(seconds[complete])['C'].agg(how).sort_index().tolist())
+        carry = part[~complete]
+    
+    if carry is not None and len(carry) > 0:
+        seconds = get_seconds_from_start(carry, start)
+        values.extend(carry.groupby(seconds)['C'].agg(how).sort_index().tolist())
+    return values
+
+
+def select_clear_values(chunks, mode):
+    """
+    Clear channel values of a run according to the extraction mode.
+    
+    Args:
+        chunks: Iterable of run DataFrames in time order
+        mode: 'raw', 'first-per-second' or 'median-per-second'
+    
+    Returns:
+        List of values, or None if a per-second mode finds no time column
+    """
+    if mode == 'raw':
+        clear_values = []
+        for chunk in chunks:
+            clear_values.extend(chunk['C'].tolist())
+        return clear_values
+    if mode == 'median-per-second':
+        return clear_values_per_second(chunks, 'median')
+    if mode == 'first-per-second':
+        return clear_values_per_second(chunks, 'first')
+    raise ValueError(f"Unknown mode: {mode}")
+
+
 def extract_clear_values(csv_file, mode):
     """
-    Extract Clear channel values from a CSV file and print as a list.
+    Extract Clear channel values from a CSV file (or a segmented run, read one
+    segment at a time) and print as a list.
     Mode options:
       - raw: original values (default)
       - first-per-second: first sample in each second
@@ -34,32 +120,28 @@ def extract_clear_values(csv_file, mode):
     print(f"Reading: {csv_file}")
     print(f"Mode: {mode}")
     
-    df = pd.read_csv(csv_file)
+    # Read the run lazily, one segment at a time
+    chunks = iter_run_chunks(csv_file)
+    first = next(chunks, None)
+    if first is None:
+        print("Error: CSV file is empty")
+        return
     
-    if 'C' not in df.columns:
+    if 'C' not in first.columns:
         print("Error: 'C' (Clear) column not found in CSV file!")
-        print(f"Available columns: {', '.join(df.columns)}")
+        print(f"Available columns: {', '.join(first.columns)}")
         return
+    chunks = itertools.chain([first], chunks)
     
     # Decide how to aggregate
-    if mode == 'raw':
-        clear_values = df['C'].tolist()
-    else:
-        seconds_from_start = get_seconds_from_start(df)
-        if seconds_from_start is None:
-            print("Error: No time column found ('t' or 'Timestamp') for per-second aggregation.")
-            return
-        
-        grouped = df.groupby(seconds_from_start)['C']
-        if mode == 'median-per-second':
-            per_second = grouped.median().sort_index()
-        elif mode == 'first-per-second':
-            per_second = grouped.first().sort_index()
-        else:
-            print(f"Unknown mode: {mode}")
-            return
-        
-        clear_values = per_second.tolist()
+    try:
+        clear_values = select_clear_values(chunks, mode)
+    except ValueError as e:
+        print(e)
+        return
+    if clear_values is None:
+        print("Error: No time column found ('Time_ns', 't' or 'Timestamp') for per-second aggregation.")
+        return
     
     print(f"\nFound {len(clear_values)} Clear values")
     print("\nClear values as Python list:")
@@ -80,7 +162,7 @@ def extract_clear_values(csv_file, mode):
 
 def main():
     parser = argparse.ArgumentParser(description="Extract Clear channel values from CSV.")
-    parser.add_argument("csv_file", help="Path to CSV file")
+    parser.add_argument("csv_file", help="Path to CSV file or segmented run directory")
     parser.add_argument(
         "--mode",
         choices=["raw", "first-per-second", "median-per-second"],
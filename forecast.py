@@ -0,0 +1,444 @@
+"""
+Online Clock Stop Forecasting
+
+detect_events.py finds the clock stop time only after the whole light-to-dark
+transition has been recorded. This module forecasts it while the transition is
+still under way:
+
+1. A baseline of the Clear channel is tracked until the signal drops clearly
+   below it; that marks the start of the transition.
+2. From then on, every new sample triggers a refit of a falling logistic
+
+       C(t) = high - (high - low) / (1 + exp(-k * (t - x0)))
+
+   with 'high' fixed at the baseline. The fit is warm-started from the previous
+   one, uses at most max_points recent samples and at most max_iter
+   Levenberg-Marquardt iterations, so the cost per update is bounded.
+3. The predicted stop time follows detect_clock_stop's definition. That fits one
+   sigmoid to the whole normalized run, pour-in step included, so its stop lies
+   further into the transition than stop_level. Once the inflection has been
+   recorded, the run so far is completed with the fitted transition and fitted
+   the same way; the forecast is where the transition reaches the progress of
+   that stop (stop_level until then, with the band reaching to the end of the
+   transition).
+4. The standard error comes from the full covariance of both fits (delta
+   method). The transition fit's share is inflated by the lag-1 autocorrelation
+   of its residuals, which the covariance assumes to be independent.
+
+A drop that completes faster than min_transition_s (such as the pour-in step)
+is treated as a level change: the baseline is reset and the forecaster re-arms.
+
+Run standalone, recorded runs are replayed sample by sample and the forecasts
+are compared with the final detect_clock_stop result: the error, and how often
+the band contains it, along with the cost of each update.
+
+Dependencies:
+    numpy (pandas, scipy for the offline evaluation)
+
+Usage:
+    python forecast.py <csv_file> [<csv_file> ...] [--channel C] [--level 95]
+
+Example:
+    python forecast.py 26run4.csv 26run5.csv 130run1.csv
+"""
+
+import argparse
+import collections
+import sys
+import time
+
+import numpy as np
+
+from detect_events import (DETECTOR_DEFAULTS, levenberg_marquardt_batch, sigmoid_batch_jacobian,
+                           stop_time_from_sigmoid)
+
+Z_SCORES = {68: 1.0, 90: 1.645, 95: 1.96, 99: 2.576}
+# Seconds before the detected clock stop at which forecasts are evaluated
+HORIZONS = (30, 20, 10, 5, 2)
+
+
+class ClockStopForecaster:
+    """
+    Incremental forecaster of the clock stop time from a partial transition.
+
+    Args:
+        stop_level: Level of detect_clock_stop's normalized sigmoid taken as the
+                    clock stop
+        min_elapsed_s: Ignore samples before this many seconds into the run
+        baseline_samples: Samples in the baseline window
+        start_sigmas: Drop below the baseline (in units of sample noise) that
+                      starts the transition
+        start_fraction: Minimum relative drop below the baseline that starts it
+        confirm_samples: Consecutive samples below the start level required
+        min_transition_s: Fitted 10-90% durations shorter than this are steps
+        max_points: Maximum number of recent samples used in each fit, and of
+                    binned points the run before the transition is reduced to
+        max_iter: Maximum solver iterations per update
+        level: Confidence level (68, 90, 95 or 99) of the reported band
+    """
+
+    def __init__(self, stop_level=DETECTOR_DEFAULTS['stop_level'], min_elapsed_s=5.0, baseline_samples=40,
+                 start_sigmas=4.0, start_fraction=0.02, confirm_samples=3, min_transition_s=1.0,
+                 max_points=400, max_iter=20, level=95):
+        self.stop_level = stop_level
+        self.min_elapsed_s = min_elapsed_s
+        self.start_sigmas = start_sigmas
+        self.start_fraction = start_fraction
+        self.confirm_samples = confirm_samples
+        self.min_transition_s = min_transition_s
+        self.max_points = max_points
+        self.max_iter = max_iter
+        self.z = Z_SCORES[level]
+        self.baseline = collections.deque(maxlen=baseline_samples)
+        self.baseline_points = collections.deque(maxlen=baseline_samples)
+        self.points = collections.deque(maxlen=max_points)
+        # Every sample of the run, for the whole-run fit of detect_clock_stop
+        self.run_times = []
+        self.run_values = []
+        self.reset()
+
+    def reset(self):
+        """Forget the transition and go back to tracking the baseline"""
+        self.baseline.clear()
+        self.baseline_points.clear()
+        self.points.clear()
+        self.below = 0
+        self.high = None
+        self.params = None
+        self.started_s = None
+        self.prefix = None
+        self.detect_params = None
+        self.detect_variance = 0.0
+        # Progress of the transition at which detect_clock_stop will place the stop
+        self.stop_progress = self.stop_level
+        self.forecast = None
+        self.done = False
+        self.updates = 0
+
+    def _start_level(self):
+        """
+        Baseline level and the level that starts the transition.
+
+        The median level and a noise estimate from successive differences are
+        robust to the slow beginning of the transition itself, which would
+        otherwise drag the baseline down and inflate its spread.
+        """
+        values = np.fromiter(self.baseline, dtype=float)
+        level = np.median(values)
+        noise = np.median(np.abs(np.diff(values))) / (0.6745 * np.sqrt(2))
+        drop = max(self.start_sigmas * noise, self.start_fraction * level)
+        return level, level - drop
+
+    def update(self, time_s, c):
+        """
+        Feed one sample.
+
+        Returns:
+            Latest forecast dictionary (see _fit), or None before the transition
+        """
+        if self.done:
+            return self.forecast
+        self.run_times.append(time_s)
+        self.run_values.append(c)
+        if time_s < self.min_elapsed_s:
+            return None
+
+        if self.started_s is None:
+            if len(self.baseline) < self.baseline.maxlen:
+                self.baseline.append(c)
+                self.baseline_points.append((time_s, c))
+                return None
+            mean, start_level = self._start_level()
+            if c >= start_level:
+                self.below = 0
+                self.points.clear()
+                self.baseline.append(c)
+                self.baseline_points.append((time_s, c))
+                return None
+            self.below += 1
+            self.points.append((time_s, c))
+            if self.below < self.confirm_samples:
+                return None
+            self.started_s = self.points[0][0]
+            self.high = mean
+            self.prefix = self._binned_prefix(len(self.run_times) - len(self.points))
+            # Keep the baseline in the fit so the start of the drop is pinned down
+            self.points.extendleft(reversed(self.baseline_points))
+        else:
+            self.points.append((time_s, c))
+
+        self.forecast = self._fit()
+        return self.forecast
+
+    def _binned_prefix(self, start_index):
+        """
+        Samples before the transition as (times, values, weights, start_index),
+        averaged in groups so that at most max_points remain. Weights are the
+        square roots of the group sizes, so a fit still counts every sample once.
+        """
+        t = np.asarray(self.run_times[:start_index], dtype=float)
+        y = np.asarray(self.run_values[:start_index], dtype=float)
+        group = max(1, -(-len(t) // self.max_points))
+        edges = np.arange(0, len(t), group)
+        counts = np.diff(np.append(edges, len(t)))
+        return (np.add.reduceat(t, edges) / counts, np.add.reduceat(y, edges) / counts,
+                np.sqrt(counts.astype(float)), start_index)
+
+    def _update_stop_progress(self, low, k, x0):
+        """
+        Map the stop onto detect_clock_stop's definition.
+
+        detect_clock_stop fits a single sigmoid to the whole normalized run,
+        including the level before the pour-in, which broadens it: its stop lies
+        further into the transition than stop_level. The run so far is completed
+        with the fitted transition and fitted the same way, and the progress of
+        the transition at the resulting stop is kept. Before the inflection the
+        depth of the transition is too uncertain for that fit, so the mapping is
+        only taken once the inflection has been recorded and only if the stop
+        falls inside the rest of the transition; otherwise the last mapped
+        progress (initially stop_level) stays in use.
+        """
+        t_now = self.run_times[-1] - self.started_s
+        if t_now < x0:
+            return
+        prefix_t, prefix_y, prefix_w, start_index = self.prefix
+        # Remaining samples of the transition, at the sampling interval, up to 99.9%
+        t_end = x0 + np.log(999) / k
+        interval = np.median(np.diff(self.run_times[-50:]))
+        n_future = int(min(max((t_end - t_now) / interval, 0), self.max_points))
+        future_t = t_now + (t_end - t_now) * np.arange(1, n_future + 1) / max(n_future, 1)
+        future_y = self.high - (self.high - low) / (1.0 + np.exp(np.clip(-k * (future_t - x0), -500, 500)))
+        future_w = np.full(n_future, np.sqrt(max((t_end - t_now) / interval, 1) / max(n_future, 1)))
+
+        t = np.concatenate([prefix_t - self.started_s, np.asarray(self.run_times[start_index:]) - self.started_s,
+                            future_t])
+        y = np.concatenate([prefix_y, self.run_values[start_index:], future_y])
+        weights = np.concatenate([prefix_w, np.ones(len(self.run_times) - start_index), future_w])
+        # Normalized as in detect_events.normalize_transition for a light-to-dark run
+        high = max(self.run_values)
+        normalized = (high - y) / (high - min(min(self.run_values), future_y.min(initial=np.inf)) + 1e-6)
+
+        p0 = self.detect_params if self.detect_params is not None else np.array([[1.0, np.clip(k, 0.01, 10.0), x0]])
+        # detect_clock_stop's bounds, except that the inflection can't precede the
+        # transition start (before the inflection is recorded the fit can settle on the pour-in)
+        params, covariance, _, _ = levenberg_marquardt_batch(
+            sigmoid_batch_jacobian, t, normalized[None, :], p0, [0.5, 0.01, 0.0], [1.5, 10.0, t[-1]],
+            max_iter=self.max_iter, weights=weights[None, :])
+        L, k_run, x0_run = params[0]
+        stop_s = float(stop_time_from_sigmoid(L, k_run, x0_run, self.stop_level))
+        progress = 1.0 / (1.0 + np.exp(np.clip(-k * (stop_s - x0), -500, 500)))
+        if self.stop_level <= progress <= 0.999:
+            self.stop_progress = progress
+            self.detect_params = params
+            # Uncertainty of that stop from the whole-run fit (delta method over L, k and x0)
+            gradient = np.array([-1.0 / (k_run * (L - self.stop_level)), (x0_run - stop_s) / k_run, 1.0])
+            self.detect_variance = max(gradient @ covariance[0] @ gradient, 0.0)
+
+    def _model(self, t, params):
+        """Falling logistic with fixed 'high'; params are (low, k, x0)"""
+        low = params[:, 0:1]
+        k = params[:, 1:2]
+        x0 = params[:, 2:3]
+        dt = t[None, :] - x0
+        s = 1.0 / (1.0 + np.exp(np.clip(-k * dt, -500, 500)))
+        ds = s * (1 - s)
+        span = self.high - low
+        jacobian = np.stack([s, -span * ds * dt, span * ds * k], axis=-1)
+        return self.high - span * s, jacobian
+
+    def _fit(self):
+        data = np.array(self.points, dtype=float)
+        # Time relative to the transition start keeps the fit well conditioned
+        t = data[:, 0] - self.started_s
+        y = data[:, 1]
+        if self.params is None:
+            self.params = np.array([[max(y.min() * 0.5, 0.0), 1.0, t[-1] + 1.0]])
+        lower = np.array([0.0, 1e-3, t[0] - 60.0])
+        upper = np.array([self.high, 50.0, t[-1] + 3600.0])
+
+        params, covariance, _, _ = levenberg_marquardt_batch(
+            self._model, t, y[None, :], self.params, lower, upper, max_iter=self.max_iter)
+        self.params = params
+        self.updates += 1
+        low, k, x0 = params[0]
+
+        # A transition that completed within a few samples is a step (e.g. pour-in)
+        if len(t) >= 2 * self.confirm_samples and 2 * np.log(9) / k < self.min_transition_s:
+            new_level = list(self.points)[-self.confirm_samples:]
+            self.reset()
+            for point in new_level:
+                self.baseline.append(point[1])
+                self.baseline_points.append(point)
+            return None
+
+        # Stop time and its standard error (delta method with the full covariance)
+        self._update_stop_progress(low, k, x0)
+        offset = np.log(self.stop_progress / (1 - self.stop_progress))
+        stop_s = x0 + offset / k
+        gradient = np.array([0.0, -offset / k**2, 1.0])
+        # The covariance assumes independent residuals, but the misfit of the model
+        # leaves them correlated; inflate it by their lag-1 autocorrelation
+        residuals = y - self._model(t, params)[0][0]
+        rho = float(np.clip(np.dot(residuals[1:], residuals[:-1]) / max(np.dot(residuals, residuals), 1e-300),
+                            0.0, 0.99))
+        variance = max(gradient @ covariance[0] @ gradient, 0.0) * (1 + rho) / (1 - rho) + self.detect_variance
+        stop_std = float(np.sqrt(variance))
+        progress = 1.0 / (1.0 + np.exp(np.clip(-k * (t[-1] - x0), -500, 500)))
+
+        # Until the stop has been mapped it may lie anywhere up to the end of the transition
+        latest_s = stop_s if self.detect_params is not None else x0 + np.log(999) / k
+
+        if progress > 0.999:
+            self.done = True
+        return {
+            'stop_time_s': float(stop_s + self.started_s),
+            'stop_std_s': stop_std,
+            'lower_s': float(stop_s + self.started_s - self.z * stop_std),
+            'upper_s': float(latest_s + self.started_s + self.z * stop_std),
+            'inflection_time_s': float(x0 + self.started_s),
+            'progress': float(progress),
+            'n_points': len(t),
+        }
+
+
+def replay_run(df, channel='C', update_cost=None, **forecaster_kwargs):
+    """
+    Feed a recorded run through the forecaster.
+
+    Args:
+        df: Run DataFrame with 'Time_s'
+        channel: Channel to forecast from
+        update_cost: Optional metrics.LatencyHistogram receiving the duration of
+                     every update in nanoseconds
+
+    Returns:
+        List of (time_s, forecast) for every sample from the first forecast on;
+        forecast is None where the forecaster had re-armed (e.g. after the pour-in)
+    """
+    forecaster = ClockStopForecaster(**forecaster_kwargs)
+    history = []
+    for time_s, c in zip(df['Time_s'].values, df[channel].values):
+        start = time.perf_counter_ns()
+        forecast = forecaster.update(float(time_s), float(c))
+        if update_cost is not None:
+            update_cost.record(time.perf_counter_ns() - start)
+        if forecast is not None or history:
+            history.append((float(time_s), forecast))
+        if forecaster.done:
+            break
+    return history
+
+
+def evaluate_run(csv_file, channel='C', horizons=HORIZONS, update_cost=None, **forecaster_kwargs):
+    """
+    Forecast accuracy on one recorded run.
+
+    Forecasts are compared with the final detect_clock_stop result and with the
+    forecaster's own last estimate, which uses the completed transition.
+
+    Returns:
+        Dictionary with the final stop times, time of the first forecast, and per
+        horizon (seconds before the final detect_clock_stop result) the error
+        against both references, the band width and whether the band contained
+        each reference; None if detection failed
+    """
+    from detect_events import calculate_relative_time, detect_clock_stop
+    from run_io import read_run_csv
+
+    df = calculate_relative_time(read_run_csv(csv_file))
+    final_stop, _, _ = detect_clock_stop(df, channel=channel)
+    if final_stop is None:
+        return None
+
+    history = replay_run(df, channel=channel, update_cost=update_cost, **forecaster_kwargs)
+    # Forecasts made before the forecaster re-armed don't count
+    last_rearm = max((i for i, (_, f) in enumerate(history) if f is None), default=-1)
+    history = history[last_rearm + 1:]
+    result = {'file': csv_file, 'final_stop_s': float(final_stop), 'horizons': {},
+              'first_forecast_s': history[0][0] if history else None,
+              'final_forecast_s': history[-1][1]['stop_time_s'] if history else None}
+
+    times = np.array([h[0] for h in history])
+    for horizon in horizons:
+        # Latest forecast available 'horizon' seconds before the final stop
+        idx = np.searchsorted(times, final_stop - horizon, side='right') - 1
+        if idx < 0:
+            result['horizons'][horizon] = None
+            continue
+        forecast = history[idx][1]
+        result['horizons'][horizon] = {
+            'error_s': forecast['stop_time_s'] - final_stop,
+            'drift_s': forecast['stop_time_s'] - result['final_forecast_s'],
+            'band_s': forecast['upper_s'] - forecast['lower_s'],
+            'covered': forecast['lower_s'] <= final_stop <= forecast['upper_s'],
+            'covered_final': forecast['lower_s'] <= result['final_forecast_s'] <= forecast['upper_s'],
+        }
+    return result
+
+
+def main():
+    from metrics import LatencyHistogram, format_ns
+
+    parser = argparse.ArgumentParser(description="Evaluate online clock stop forecasts on recorded runs.")
+    parser.add_argument("csv_files", nargs="+", help="Run CSV files or segmented run directories")
+    parser.add_argument("--channel", default="C", help="Channel to forecast from (default: C)")
+    parser.add_argument("--level", type=int, choices=sorted(Z_SCORES), default=95,
+                        help="Confidence level of the forecast band (default: 95)")
+    args = parser.parse_args()
+
+    update_cost = LatencyHistogram()
+    results = []
+    for csv_file in args.csv_files:
+        print(f"Replaying: {csv_file}")
+        result = evaluate_run(csv_file, channel=args.channel, update_cost=update_cost, level=args.level)
+        if result is None:
+            print("  ✗ Clock stop not detected; skipped")
+            continue
+        results.append(result)
+
+    if not results:
+        print("No runs could be evaluated.")
+        sys.exit(1)
+
+    print(f"\n{'='*60}")
+    print(f"Forecast Accuracy ({args.level}% band)")
+    print(f"{'='*60}")
+    print("Error of the forecast available N seconds before the detected clock stop:\n")
+    print(f"{'Run':>24} {'Detected':>9} {'Forecast':>9} {'First fc':>9} "
+          + " ".join(f"{f'-{h}s':>8}" for h in HORIZONS))
+    for r in results:
+        first = f"{r['first_forecast_s']:.1f}" if r['first_forecast_s'] is not None else "-"
+        final = f"{r['final_forecast_s']:.2f}" if r['final_forecast_s'] is not None else "-"
+        cells = []
+        for h in HORIZONS:
+            entry = r['horizons'][h]
+            cells.append(f"{entry['error_s']:+8.2f}" if entry else f"{'-':>8}")
+        name = r['file'].rstrip('/').split('/')[-1]
+        print(f"{name:>24} {r['final_stop_s']:>9.2f} {final:>9} {first:>9} " + " ".join(cells))
+
+    print("\nSummary by horizon:")
+    print("  vs detected = forecast - detect_clock_stop; vs final = forecast - forecaster's final estimate")
+    print("  Coverage = share of bands containing the detected stop (the final estimate)")
+    print(f"{'Horizon':>8} {'Runs':>5} {'MAE vs detected':>16} {'Bias':>7} {'MAE vs final':>13} "
+          f"{'Band (s)':>9} {'Coverage':>9} {'(final)':>8}")
+    for h in HORIZONS:
+        entries = [r['horizons'][h] for r in results if r['horizons'][h]]
+        if not entries:
+            print(f"{h:>7}s {0:>5} {'-':>16} {'-':>7} {'-':>13} {'-':>9} {'-':>9} {'-':>8}")
+            continue
+        errors = np.array([e['error_s'] for e in entries])
+        drifts = np.array([e['drift_s'] for e in entries])
+        bands = np.array([e['band_s'] for e in entries])
+        coverage = np.mean([e['covered'] for e in entries]) * 100
+        coverage_final = np.mean([e['covered_final'] for e in entries]) * 100
+        print(f"{h:>7}s {len(entries):>5} {np.mean(np.abs(errors)):>16.2f} {np.mean(errors):>+7.2f} "
+              f"{np.mean(np.abs(drifts)):>13.2f} {np.median(bands):>9.2f} {coverage:>8.0f}% "
+              f"{f'({coverage_final:.0f}%)':>8}")
+
+    stats = update_cost.snapshot()
+    print(f"\nUpdate cost over {stats['count']} samples: p50={format_ns(stats['p50'])} "
+          f"p99={format_ns(stats['p99'])} max={format_ns(stats['max'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Synthetic Data Generator for Iodine Clock Reaction Runs
+
+Generates realistic color sensor logs for benchmarking and testing the analysis
+scripts without an Arduino attached. Each run contains:
+1. A baseline period with the empty beaker under the light
+2. A pour-in step when the reactants are added
+3. A sigmoid light-to-dark transition when the clock stops
+4. Gaussian sensor noise, timing jitter and dropped samples
+
+Three output formats are supported:
+    monotonic - 'Time_ns,R,G,B,C' with a wall-clock anchor line, as written by read.py
+    new       - 'Timestamp,R,G,B,C' as exported by convert_format.py
+    legacy    - 'Timestamp,t,R,G,B,C' as handled by convert_format.py
+
+Dependencies:
+    numpy
+
+Usage:
+    python generate_data.py <rows> [output_file] [--format new|legacy|monotonic] [--seed N]
+
+Example:
+    python generate_data.py 100000 synthetic_run.csv
+    python generate_data.py 1e6 synthetic_legacy.csv --format legacy --seed 7
+"""
+
+import argparse
+import numpy as np
+from datetime import datetime, timedelta
+from run_io import format_anchor_line
+
+# Firmware cadence: 150 ms integration time plus delay(100)
+SAMPLE_INTERVAL = 0.25
+CHUNK_ROWS = 1_000_000
+
+# Channel levels (R, G, B, C) in each phase of the reaction
+BASELINE_LEVELS = np.array([1500.0, 1650.0, 1150.0, 4300.0])
+SOLUTION_LEVELS = np.array([1250.0, 1400.0, 1000.0, 3700.0])
+DARK_LEVELS = np.array([90.0, 110.0, 140.0, 380.0])
+
+
+def clock_reaction_signal(time_s, pour_in_s, clock_stop_s, transition_width_s):
+    """
+    Noise-free channel values for the given times.
+
+    Args:
+        time_s: Array of relative times in seconds
+        pour_in_s: Time of the pour-in step
+        clock_stop_s: Inflection time of the light-to-dark transition
+        transition_width_s: Time for the transition to go from 10% to 90%
+
+    Returns:
+        Array of shape (len(time_s), 4) with R, G, B, C values
+    """
+    # Logistic steepness so that 10%-90% spans transition_width_s
+    k = 2 * np.log(9) / transition_width_s
+    poured = (time_s >= pour_in_s)[:, None]
+    darkened = 1.0 / (1.0 + np.exp(np.clip(-k * (time_s - clock_stop_s), -500, 500)))[:, None]
+
+    solution = SOLUTION_LEVELS + (DARK_LEVELS - SOLUTION_LEVELS) * darkened
+    return np.where(poured, solution, BASELINE_LEVELS)
+
+
+def generate_chunks(rows, seed=0, pour_in_fraction=0.1, clock_stop_fraction=0.6,
+                    transition_width_s=8.0, noise_fraction=0.01, dropout_rate=0.002,
+                    jitter_s=0.01, chunk_rows=CHUNK_ROWS):
+    """
+    Generate a synthetic run in chunks so that very large runs fit in memory.
+
+    Args:
+        rows: Number of rows to emit (dropped samples are not counted)
+        seed: Random seed for reproducibility
+        pour_in_fraction: Pour-in position as a fraction of the run duration
+        clock_stop_fraction: Clock stop position as a fraction of the run duration
+        transition_width_s: Duration of the light-to-dark transition
+        noise_fraction: Standard deviation of sensor noise relative to the level
+        dropout_rate: Probability that any single sample is lost
+        jitter_s: Standard deviation of host-side timing jitter
+        chunk_rows: Rows per yielded chunk
+
+    Yields:
+        Tuples of (time_s, values) where values has shape (n, 4) of int R, G, B, C
+    """
+    rng = np.random.default_rng(seed)
+
+    # Sample slots include the dropped ones so the timeline keeps its cadence
+    slots = int(rows / (1 - dropout_rate)) + 1
+    duration_s = slots * SAMPLE_INTERVAL
+    pour_in_s = duration_s * pour_in_fraction
+    clock_stop_s = duration_s * clock_stop_fraction
+
+    emitted = 0
+    slot = 0
+    while emitted < rows:
+        n = min(chunk_rows, rows - emitted)
+        # Draw slightly more slots than needed to cover dropouts in this chunk
+        slot_count = int(n / (1 - dropout_rate)) + 16
+        slot_idx = slot + np.arange(slot_count)
+        kept = rng.random(slot_count) >= dropout_rate
+        slot_idx = slot_idx[kept][:n]
+        slot = slot_idx[-1] + 1
+
+        time_s = slot_idx * SAMPLE_INTERVAL + rng.normal(0, jitter_s, len(slot_idx))
+        time_s = np.maximum(time_s, 0.0)
+
+        clean = clock_reaction_signal(time_s, pour_in_s, clock_stop_s, transition_width_s)
+        noisy = clean + rng.normal(0, 1, clean.shape) * clean * noise_fraction
+        values = np.clip(np.round(noisy), 0, 65535).astype(np.int64)
+
+        emitted += len(slot_idx)
+        yield time_s, values
+
+
+def format_relative_timestamps(time_s, base_time):
+    """Format relative times as 'YYYY-MM-DD HH:MM:SS.mmm' strings (numpy only, no pandas)"""
+    base = np.datetime64(base_time, 'ms')
+    stamps = base + np.round(time_s * 1000).astype('timedelta64[ms]')
+    return np.char.replace(np.datetime_as_string(stamps, unit='ms'), 'T', ' ')
+
+
+def format_legacy_timestamps(time_s, base_time):
+    """Format relative times as minute-resolution 'MM/DD/YY HH:MM' strings"""
+    minutes = (time_s // 60).astype(np.int64)
+    unique_minutes, inverse = np.unique(minutes, return_inverse=True)
+    labels = np.array([(base_time + timedelta(minutes=int(m))).strftime("%m/%d/%y %H:%M")
+                       for m in unique_minutes])
+    return labels[inverse]
+
+
+def write_run(output_file, rows, fmt='new', seed=0, base_time=None, **signal_kwargs):
+    """
+    Write a synthetic run to a CSV file.
+
+    Args:
+        output_file: Output CSV file path
+        rows: Number of data rows
+        fmt: 'new' for Timestamp,R,G,B,C, 'legacy' for Timestamp,t,R,G,B,C
+             or 'monotonic' for Time_ns,R,G,B,C
+        seed: Random seed for reproducibility
+        base_time: datetime of the first sample (default: 2025-01-01 12:00:00)
+        **signal_kwargs: Passed through to generate_chunks
+
+    Returns:
+        Number of rows written
+    """
+    if base_time is None:
+        base_time = datetime(2025, 1, 1, 12, 0, 0)
+
+    written = 0
+    with open(output_file, 'w', newline='') as f:
+        if fmt == 'legacy':
+            f.write("Timestamp,t,R,G,B,C\n")
+        elif fmt == 'monotonic':
+            anchor_ns = int((base_time - datetime(1970, 1, 1)).total_seconds()) * 1_000_000_000
+            f.write(format_anchor_line(anchor_ns, 0))
+            f.write("Time_ns,R,G,B,C\n")
+        else:
+            f.write("Timestamp,R,G,B,C\n")
+
+        for time_s, values in generate_chunks(rows, seed=seed, **signal_kwargs):
+            r, g, b, c = values.T.tolist()
+            if fmt == 'legacy':
+                stamps = format_legacy_timestamps(time_s, base_time).tolist()
+                rel = np.char.mod('%.3f', time_s).tolist()
+                lines = [f"{ts},{t},{rv},{gv},{bv},{cv}\n"
+                         for ts, t, rv, gv, bv, cv in zip(stamps, rel, r, g, b, c)]
+            elif fmt == 'monotonic':
+                time_ns = np.round(time_s * 1e9).astype(np.int64).tolist()
+                lines = [f"{t},{rv},{gv},{bv},{cv}\n"
+                         for t, rv, gv, bv, cv in zip(time_ns, r, g, b, c)]
+            else:
+                stamps = format_relative_timestamps(time_s, base_time).tolist()
+                lines = [f"{ts},{rv},{gv},{bv},{cv}\n"
+                         for ts, rv, gv, bv, cv in zip(stamps, r, g, b, c)]
+            f.writelines(lines)
+            written += len(lines)
+
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic iodine clock reaction run.")
+    parser.add_argument("rows", type=float, help="Number of data rows (e.g. 1000 or 1e6)")
+    parser.add_argument("output_file", nargs="?", help="Output CSV file (default: synthetic_<rows>_<format>.csv)")
+    parser.add_argument("--format", choices=["new", "legacy", "monotonic"], default="new",
+                        help="Output column format (default: new)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument("--transition-width", type=float, default=8.0,
+                        help="Light-to-dark transition duration in seconds (default: 8.0)")
+    parser.add_argument("--dropout-rate", type=float, default=0.002,
+                        help="Probability of a dropped sample (default: 0.002)")
+    args = parser.parse_args()
+
+    rows = int(args.rows)
+    output_file = args.output_file or f"synthetic_{rows}_{args.format}.csv"
+
+    print(f"Generating {rows} rows ({args.format} format) to: {output_file}")
+    written = write_run(output_file, rows, fmt=args.format, seed=args.seed,
+                        transition_width_s=args.transition_width,
+                        dropout_rate=args.dropout_rate)
+    print(f"Successfully wrote {written} rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,88 +1,144 @@
-import pandas as pd
+"""
+Median Resampling of Color Sensor Runs
+
+Reduces a run to one row per fixed time interval, with the median of every
+channel over the samples in that interval. Runs are read in chunks, so
+segmented runs and files larger than memory are handled.
+
+Dependencies:
+    pandas, numpy
+
+Usage:
+    python interpolate_data.py <input_file> [output_file] [interval]
+
+    input_file  - Input CSV file with color data (or a segmented run directory)
+    output_file - Output CSV file (default: adds '_interpolated' to input)
+    interval    - Time interval in seconds for median calculation (default: 1.0)
+
+Example:
+    python interpolate_data.py color_data_11_21.csv output.csv 1.0
+"""
+
 import numpy as np
 import sys
-from datetime import datetime, timedelta
+from datetime import datetime
+from run_io import iter_timed_chunks, format_timestamps
+
+CHANNELS = ['R', 'G', 'B', 'C']
+# Resampled runs are timestamped with their bins counted from this time
+BASE_TIME = datetime(2025, 1, 1, 0, 0, 0)
+
+def median_per_bin(chunks, interval):
+    """
+    Compute per-bin channel medians from a stream of timed chunks.
+    
+    Rows of the last bin in each chunk are held back and merged with the next
+    chunk, so bins spanning a segment boundary get the same median as if the
+    whole run had been read at once. Rows must be in time order.
+    
+    Args:
+        chunks: Iterable of DataFrames with 'Time_s' and channel columns
+        interval: Bin width in seconds
+    
+    Yields:
+        DataFrames indexed by 'Time_bin' with the median of each channel
+    """
+    import pandas as pd
+    carry = None
+    for chunk in chunks:
+        part = chunk[['Time_s'] + CHANNELS]
+        if carry is not None:
+            part = pd.concat([carry, part], ignore_index=True)
+        
+        # Assign each data point to a time bin
+        time_bin = np.floor(part['Time_s'] / interval) * interval
+        complete = time_bin < time_bin.iloc[-1]
+        if complete.any():
+            yield part[complete].groupby(time_bin[complete].rename('Time_bin'))[CHANNELS].median()
+        carry = part[~complete]
+    
+    if carry is not None and len(carry) > 0:
+        time_bin = np.floor(carry['Time_s'] / interval) * interval
+        yield carry.groupby(time_bin.rename('Time_bin'))[CHANNELS].median()
+
+def resample_median(chunks, interval=1.0, monotonic=True):
+    """
+    Median of each channel per time bin, as non-negative integers.
+    
+    Args:
+        chunks: Iterable of DataFrames with 'Time_s' and channel columns, in time order
+        interval: Bin width in seconds
+        monotonic: Enforce monotonically increasing values (each value >= previous value)
+    
+    Returns:
+        DataFrame with 'Time_bin' and channel columns, or None if there is no data
+    """
+    import pandas as pd
+    pieces = list(median_per_bin(chunks, interval))
+    if not pieces:
+        return None
+    grouped = pd.concat(pieces).reset_index()
+    
+    # Round values to integers and ensure they are non-negative
+    for channel in CHANNELS:
+        grouped[channel] = np.maximum(np.round(grouped[channel]).astype(int), 0)
+    
+    # A running maximum makes each value >= the previous one
+    if monotonic:
+        grouped[CHANNELS] = grouped[CHANNELS].cummax()
+    return grouped
+
+def timestamp_median_frame(grouped, base_time=BASE_TIME):
+    """Output format of resample_median(): 'Timestamp,R,G,B,C' with bins counted from base_time"""
+    import pandas as pd
+    timestamps = pd.Timestamp(base_time) + pd.to_timedelta(grouped['Time_bin'].values, unit='s')
+    return pd.DataFrame({
+        'Timestamp': format_timestamps(timestamps).values,
+        'R': grouped['R'].values,
+        'G': grouped['G'].values,
+        'B': grouped['B'].values,
+        'C': grouped['C'].values
+    })
 
 def interpolate_color_data(input_file, output_file, interval=1.0):
     """
     Calculate median color sensor data over regular time intervals
     
     Args:
-        input_file: Input CSV file path
+        input_file: Input CSV file path, or a segmented run directory
         output_file: Output CSV file path
         interval: Time interval in seconds (default: 1.0)
     """
     print(f"Reading: {input_file}")
+    print(f"Calculating median for data points every {interval} second(s)")
     
-    # Read the CSV file
-    df = pd.read_csv(input_file)
+    # Read the run one segment at a time; relative time comes from the integer
+    # 'Time_ns' column when available, else from parsed timestamps
+    stats = {'rows': 0, 'time_end': 0.0}
     
-    print(f"Found {len(df)} data points")
+    def counted(chunks):
+        for chunk in chunks:
+            stats['rows'] += len(chunk)
+            stats['time_end'] = chunk['Time_s'].iloc[-1]
+            yield chunk
     
-    # Parse timestamps and calculate relative time
-    df['Timestamp'] = pd.to_datetime(df['Timestamp'])
-    start_time = df['Timestamp'].iloc[0]
-    df['Time_s'] = (df['Timestamp'] - start_time).dt.total_seconds()
+    # Group by time bin and calculate median for each channel
+    grouped = resample_median(counted(iter_timed_chunks(input_file)), interval)
+    if grouped is None:
+        print("Error: No data points found")
+        return False
     
     # Get the time range
     time_start = 0
-    time_end = df['Time_s'].iloc[-1]
+    time_end = stats['time_end']
     
+    print(f"Found {stats['rows']} data points")
     print(f"Original time range: {time_start:.2f}s to {time_end:.2f}s")
-    print(f"Calculating median for data points every {interval} second(s)")
-    
-    # Assign each data point to a time bin
-    df['Time_bin'] = np.floor(df['Time_s'] / interval) * interval
-    
-    # Group by time bin and calculate median for each channel
-    grouped = df.groupby('Time_bin').agg({
-        'R': 'median',
-        'G': 'median',
-        'B': 'median',
-        'C': 'median'
-    }).reset_index()
-    
     print(f"Created {len(grouped)} median points")
-    
-    # Round values to integers
-    grouped['R'] = np.round(grouped['R']).astype(int)
-    grouped['G'] = np.round(grouped['G']).astype(int)
-    grouped['B'] = np.round(grouped['B']).astype(int)
-    grouped['C'] = np.round(grouped['C']).astype(int)
-    
-    # Ensure values are non-negative
-    grouped['R'] = np.maximum(grouped['R'], 0)
-    grouped['G'] = np.maximum(grouped['G'], 0)
-    grouped['B'] = np.maximum(grouped['B'], 0)
-    grouped['C'] = np.maximum(grouped['C'], 0)
-    
-    # Enforce monotonically increasing values (each value >= previous value)
     print("Enforcing monotonically increasing constraint...")
-    for channel in ['R', 'G', 'B', 'C']:
-        for i in range(1, len(grouped)):
-            if grouped.loc[i, channel] < grouped.loc[i-1, channel]:
-                grouped.loc[i, channel] = grouped.loc[i-1, channel]
-    
-    # Create new timestamps starting from time 0
-    # Use a base timestamp of 2025-01-01 00:00:00
-    base_time = datetime(2025, 1, 1, 0, 0, 0)
-    new_timestamps = [base_time + timedelta(seconds=float(t)) for t in grouped['Time_bin']]
-    new_timestamps_str = [ts.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3] for ts in new_timestamps]
-    
-    new_times = grouped['Time_bin']
-    new_r = grouped['R']
-    new_g = grouped['G']
-    new_b = grouped['B']
-    new_c = grouped['C']
-    
-    # Create output dataframe
-    df_interpolated = pd.DataFrame({
-        'Timestamp': new_timestamps_str,
-        'R': new_r,
-        'G': new_g,
-        'B': new_b,
-        'C': new_c
-    })
+    
+    # Create new timestamps starting from time 0 at BASE_TIME
+    df_interpolated = timestamp_median_frame(grouped)
     
     # Save to file
     df_interpolated.to_csv(output_file, index=False)
@@ -93,10 +149,10 @@ def interpolate_color_data(input_file, output_file, interval=1.0):
     print("\n" + "=" * 60)
     print("Summary:")
     print("=" * 60)
-    print(f"Original data points: {len(df)}")
+    print(f"Original data points: {stats['rows']}")
     print(f"Median data points: {len(df_interpolated)}")
     print(f"Time interval: {interval} second(s)")
-    print(f"Average points per interval: {len(df) / len(df_interpolated):.1f}")
+    print(f"Average points per interval: {stats['rows'] / len(df_interpolated):.1f}")
     print(f"Duration: {time_end:.2f} seconds ({time_end/60:.2f} minutes)")
     
     return True
@@ -107,13 +163,13 @@ def main():
         print("Usage: python interpolate_data.py <input_file> [output_file] [interval]")
         print("Example: python interpolate_data.py color_data_11_21.csv output.csv 1.0")
         print("\nArguments:")
-        print("  input_file  - Input CSV file with color data")
+        print("  input_file  - Input CSV file with color data (or a segmented run directory)")
         print("  output_file - Output CSV file (default: adds '_interpolated' to input)")
         print("  interval    - Time interval in seconds for median calculation (default: 1.0)")
         print("\nNote: This tool calculates the median of all data points within each time interval.")
         return
     
-    input_file = sys.argv[1]
+    input_file = sys.argv[1].rstrip('/\\')  # Segmented runs may be given as 'dir/'
     
     # Generate output filename if not provided
     if len(sys.argv) >= 3:
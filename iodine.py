@@ -0,0 +1,121 @@
+"""
+Unified Command Line Interface for the Iodine Clock Tools
+
+One entry point for logging and analysis. Each subcommand runs the main() of
+the existing script with the remaining arguments, and its module is imported
+only when that subcommand runs. Scripts import pandas, scipy and matplotlib
+inside the functions that use them, so '--help' and argument errors stay fast:
+
+    log        Log sensor data from the Arduino (read.py)
+    detect     Detect pour-in and clock stop events (detect_events.py)
+    resample   Median-resample a run to a fixed interval (interpolate_data.py)
+    convert    Convert legacy CSV formats (convert_format.py)
+    extract    Extract Clear channel values (extract_clear_values.py)
+    plot       Plot the runs listed in files_to_plot.txt (plot.py)
+
+plus the other analysis tools (pipeline, watch, tune, bootstrap, forecast, kinetics, integrity,
+dashboard, relay, simulate). 'python benchmark.py --startup' measures the
+total cold-start time of every subcommand against STARTUP_BUDGET_S.
+
+Usage:
+    python iodine.py <subcommand> [arguments...]
+    python iodine.py <subcommand> --help
+
+Example:
+    python iodine.py log --port /dev/ttyUSB0
+    python iodine.py detect color_data_20250101_120000.csv --plot
+    python iodine.py resample color_data_20250101_120000.csv out.csv 1.0
+"""
+
+import ast
+import importlib
+import os
+import sys
+
+# Subcommand -> (module, description, parses its own --help)
+SUBCOMMANDS = {
+    'log': ('read', "Log sensor data from the Arduino", False),
+    'detect': ('detect_events', "Detect pour-in and clock stop events", False),
+    'resample': ('interpolate_data', "Median-resample a run to a fixed interval", False),
+    'convert': ('convert_format', "Convert legacy CSV formats", False),
+    'extract': ('extract_clear_values', "Extract Clear channel values", True),
+    'plot': ('plot', "Plot the runs listed in files_to_plot.txt", True),
+    'pipeline': ('pipeline', "Run an analysis recipe in memory", True),
+    'watch': ('watch_runs', "Watch folders and process new runs automatically", True),
+    'tune': ('tune_detectors', "Tune detector settings against labeled runs", True),
+    'bootstrap': ('bootstrap_events', "Bootstrap confidence intervals for event times", True),
+    'forecast': ('forecast', "Evaluate online clock stop forecasts on recorded runs", True),
+    'kinetics': ('kinetics', "Fit reaction times against reagent conditions", True),
+    'integrity': ('stream_integrity', "Report sample loss and host lag in a run", True),
+    'dashboard': ('live_server', "Replay a run through the live dashboard", True),
+    'relay': ('relay_control', "Test host-side relay control on the simulator", True),
+    'simulate': ('simulator', "Simulate the firmware on a pseudo-terminal", True),
+}
+
+# Total cold-start budget in seconds for '<subcommand> --help', checked by benchmark.py --startup
+STARTUP_BUDGET_S = 0.25
+# Modules too slow to import at startup; '<subcommand> --help' must not load any of them
+HEAVY_MODULES = ('pandas', 'scipy', 'matplotlib')
+
+
+def print_usage():
+    print("Usage: python iodine.py <subcommand> [arguments...]\n")
+    print("Subcommands:")
+    for name, (_, description, _) in SUBCOMMANDS.items():
+        print(f"  {name:<10} {description}")
+    print("\nRun 'python iodine.py <subcommand> --help' for details.")
+
+
+def module_docstring(module_name):
+    """Docstring of a script next to this one, read from its source without importing it"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), module_name + ".py")
+    with open(path, 'r', encoding='utf-8') as f:
+        return ast.get_docstring(ast.parse(f.read(), filename=path))
+
+
+def run_log(args):
+    """'log' takes the serial port settings on the command line; the rest stays in read.py"""
+    import argparse
+
+    # Imported before parsing so that 'log --help' measures the real startup cost
+    read = importlib.import_module('read')
+    parser = argparse.ArgumentParser(prog="iodine.py log", description="Log sensor data from the Arduino. "
+                                     "Other settings are the configuration constants in read.py.")
+    parser.add_argument("--port", help="Serial port (default: SERIAL_PORT in read.py)")
+    parser.add_argument("--baud", type=int, help="Baud rate (default: BAUD_RATE in read.py)")
+    options = parser.parse_args(args)
+    if options.port:
+        read.SERIAL_PORT = options.port
+    if options.baud:
+        read.BAUD_RATE = options.baud
+    read.main()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ('-h', '--help'):
+        print_usage()
+        return
+    name, args = argv[0], argv[1:]
+    if name not in SUBCOMMANDS:
+        print(f"Unknown subcommand '{name}'\n")
+        print_usage()
+        sys.exit(2)
+
+    if name == 'log':
+        run_log(args)
+        return
+
+    module_name, description, own_help = SUBCOMMANDS[name]
+    if not own_help and any(arg in ('-h', '--help') for arg in args):
+        # Scripts that read sys.argv directly document their usage in the docstring
+        print(module_docstring(module_name) or description)
+        return
+
+    module = importlib.import_module(module_name)
+    sys.argv = [f"iodine.py {name}"] + args
+    module.main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,407 @@
+"""
+Batched Kinetics Analysis Across Runs
+
+Relates reaction time to reagent conditions over a whole series of runs
+(e.g. the 26run*, 130run* and 209run* series). A conditions table lists each
+run file with its concentrations and temperature:
+
+    file,conc_KI,conc_S2O8,temperature_c
+    26run4.csv,0.20,0.10,21.5
+    26run5.csv,0.10,0.10,21.5
+    130run1.csv,0.20,0.05,30.0
+
+Columns starting with 'conc_' are concentrations; 'temperature_c' or
+'temperature_k' is the temperature. Other columns are carried through as notes.
+
+Reaction times (pour-in to clock stop) are measured with the detect_events.py
+detectors and cached per run, keyed by file size, modification time and
+detector settings (the defaults, or a profile from tune_detectors.py), so adding
+one run to the table only analyzes that run. Uncached runs are split into one
+batch per worker process; within a batch, pour-in is detected for all runs in
+one vectorized pass and the clock stop sigmoids are fitted in one batched solve.
+
+The rate is taken as 1 / reaction time and fitted across all runs in a single
+vectorized least-squares solve of the combined rate-law / Arrhenius model:
+
+    ln(1/t) = ln(A) - (Ea/R) * (1/T) + sum_i n_i * ln([X_i])
+
+Concentrations or temperatures that don't vary across the runs are left out of
+the model, since their orders can't be identified.
+
+Dependencies:
+    pandas, numpy, scipy
+
+Usage:
+    python kinetics.py <conditions_csv> [--output results.csv] [--cache cache.json]
+                       [--all-channels] [--workers N] [--profile detector_profile.json]
+
+Example:
+    python kinetics.py conditions.csv --all-channels
+    python kinetics.py conditions.csv --profile detector_profile.json
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from run_io import run_fingerprint
+
+GAS_CONSTANT = 8.314462618  # J/(mol K)
+DEFAULT_CACHE = "kinetics_cache.json"
+# Bump when detection changes so cached reaction times are recomputed
+CACHE_VERSION = 2
+# Upper bound on runs x points fitted together in one batched solve
+MAX_BATCH_ELEMENTS = 2_000_000
+
+
+def measure_reaction_time(path, all_channels=False, params=None):
+    """
+    Detect pour-in and clock stop in one run.
+
+    Returns:
+        Dictionary with pour_in_time_s, clock_stop_time_s and reaction_time_s
+        (None where detection failed)
+    """
+    from detect_events import calculate_relative_time, detect_run_events
+    from run_io import read_run_csv
+
+    df = calculate_relative_time(read_run_csv(path))
+    events = detect_run_events(df, all_channels=all_channels, params=params)
+    return reaction_result(events['pour_in_time_s'], events['clock_stop_time_s'])
+
+
+def reaction_result(pour_in_time_s, clock_stop_time_s):
+    reaction_time_s = None
+    if pour_in_time_s is not None and clock_stop_time_s is not None:
+        reaction_time_s = float(clock_stop_time_s - pour_in_time_s)
+    return {
+        'pour_in_time_s': None if pour_in_time_s is None else float(pour_in_time_s),
+        'clock_stop_time_s': None if clock_stop_time_s is None else float(clock_stop_time_s),
+        'reaction_time_s': reaction_time_s,
+    }
+
+
+def detect_pour_in_runs(series, params):
+    """
+    Pour-in times of several runs in one vectorized pass.
+
+    Only the searched start of each run matters, plus enough samples for the
+    smoothing and threshold windows, so those prefixes are stacked into one
+    array (padded with each run's last value) and handed to detect_pour_in_batch.
+    Runs too short to have that margin are detected one at a time.
+    """
+    from bootstrap_events import detect_pour_in_batch
+    from detect_events import detect_pour_in, pour_in_settings
+
+    window_size = params['window_size']
+    margin = 2 * window_size + 4
+    times = [None] * len(series)
+    batched = []
+    for i, (df, values) in enumerate(series):
+        search_end = int(len(values) * params['search_fraction'])
+        if search_end + margin <= len(values):
+            batched.append((i, search_end))
+        else:
+            times[i], _, _ = detect_pour_in(df, channel='C', **pour_in_settings(params))
+    if not batched:
+        return times
+
+    width = max(search_end for _, search_end in batched) + margin
+    X = np.empty((len(batched), width))
+    for row, (i, search_end) in enumerate(batched):
+        prefix = series[i][1][:search_end + margin]
+        X[row, :len(prefix)] = prefix
+        X[row, len(prefix):] = prefix[-1]
+    indices = detect_pour_in_batch(X, window_size, params['threshold_factor'],
+                                   search_end=np.array([search_end for _, search_end in batched]))
+    for (i, _), index in zip(batched, indices):
+        if index >= 0:
+            times[i] = float(series[i][0]['Time_s'].iloc[index])
+    return times
+
+
+def measure_batch(paths, all_channels=False, params=None):
+    """
+    Detect pour-in and clock stop in several runs at once.
+
+    Pour-in is detected for all runs in one vectorized pass and the clock stop
+    sigmoids are fitted in batched solves (detect_events.detect_clock_stop_batch),
+    so the per-run cost is mostly reading the file. Runs the batched fit can't
+    handle, and --all-channels consensus fits, go through detect_events as usual.
+
+    Returns:
+        List of result dictionaries (see measure_reaction_time), or {'error': ...}
+    """
+    from detect_events import (DETECTOR_DEFAULTS, calculate_relative_time, detect_clock_stop,
+                               detect_clock_stop_batch, detect_clock_stop_multichannel)
+    from run_io import read_run_csv
+
+    params = params or DETECTOR_DEFAULTS
+    results = [None] * len(paths)
+    series = []
+    for i, path in enumerate(paths):
+        try:
+            df = calculate_relative_time(read_run_csv(path))
+            series.append((i, df, df['C'].values.astype(float)))
+        except Exception as e:
+            results[i] = {'error': str(e)}
+
+    pour_in = detect_pour_in_runs([(df, values) for _, df, values in series], params)
+
+    clock_stop = [None] * len(series)
+    if all_channels:
+        for j, (_, df, _) in enumerate(series):
+            multichannel = detect_clock_stop_multichannel(df, stop_level=params['stop_level'])
+            if multichannel is not None:
+                clock_stop[j] = multichannel['clock_stop_time_s']
+    else:
+        # Similar lengths together keep the padding small; batches are bounded in size
+        order = sorted(range(len(series)), key=lambda j: len(series[j][2]))
+        start = 0
+        while start < len(order):
+            end = start + 1
+            while end < len(order) and (end - start + 1) * len(series[order[end]][2]) <= MAX_BATCH_ELEMENTS:
+                end += 1
+            group = order[start:end]
+            fits = detect_clock_stop_batch([(series[j][1]['Time_s'].values.astype(float), series[j][2])
+                                            for j in group], stop_level=params['stop_level'])
+            for j, fit in zip(group, fits):
+                if fit is not None:
+                    clock_stop[j] = fit[0]
+            start = end
+
+    for j, (i, df, _) in enumerate(series):
+        if clock_stop[j] is None:
+            clock_stop[j], _, _ = detect_clock_stop(df, channel='C', stop_level=params['stop_level'])
+        results[i] = reaction_result(pour_in[j], clock_stop[j])
+    return results
+
+
+def _measure_worker(args):
+    paths, all_channels, params = args
+    try:
+        return measure_batch(paths, all_channels, params)
+    except Exception as e:
+        return [{'error': str(e)}] * len(paths)
+
+
+def load_cache(cache_file):
+    if cache_file and os.path.exists(cache_file):
+        with open(cache_file, 'r') as f:
+            return json.load(f)
+    return {}
+
+
+def save_cache(cache_file, cache):
+    if not cache_file:
+        return
+    tmp_path = cache_file + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, cache_file)
+
+
+def measure_runs(paths, cache_file=DEFAULT_CACHE, all_channels=False, workers=None, params=None):
+    """
+    Reaction times for many runs, reusing cached results where the run and the
+    detector settings are unchanged.
+
+    Args:
+        params: Detector settings (detect_events.DETECTOR_DEFAULTS or a tuned profile)
+
+    Returns:
+        List of result dictionaries in the same order as paths
+    """
+    from detect_events import DETECTOR_DEFAULTS
+
+    params = dict(params or DETECTOR_DEFAULTS)
+    cache = load_cache(cache_file)
+    settings = {'version': CACHE_VERSION, 'all_channels': all_channels, 'detector': params}
+
+    results = [None] * len(paths)
+    pending = []
+    for i, path in enumerate(paths):
+        key = os.path.abspath(path)
+        entry = cache.get(key)
+        fingerprint = run_fingerprint(path)
+        if entry and entry['fingerprint'] == fingerprint and entry['settings'] == settings:
+            results[i] = entry['result']
+        else:
+            pending.append((i, path, key, fingerprint))
+
+    print(f"{len(paths) - len(pending)} run(s) cached, {len(pending)} to analyze")
+
+    if pending:
+        # One batch of runs per worker, each analyzed in vectorized passes
+        workers = min(workers or os.cpu_count() or 1, len(pending))
+        per_batch = -(-len(pending) // workers)
+        pending_paths = [path for _, path, _, _ in pending]
+        jobs = [(pending_paths[start:start + per_batch], all_channels, params)
+                for start in range(0, len(pending), per_batch)]
+        if len(jobs) == 1:
+            measured = _measure_worker(jobs[0])
+        else:
+            # Imported here so that startup doesn't pay for the process pool machinery
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                measured = [result for batch in executor.map(_measure_worker, jobs) for result in batch]
+
+        for (i, path, key, fingerprint), result in zip(pending, measured):
+            results[i] = result
+            if 'error' in result:
+                print(f"  Error analyzing {path}: {result['error']}")
+                continue
+            cache[key] = {'fingerprint': fingerprint, 'settings': settings, 'result': result}
+        save_cache(cache_file, cache)
+
+    return results
+
+
+def fit_kinetics(table):
+    """
+    Fit the rate-law / Arrhenius model to all runs with a usable reaction time.
+
+    Args:
+        table: DataFrame with 'reaction_time_s', 'conc_*' columns and optionally
+               'temperature_k'
+
+    Returns:
+        Dictionary with the fitted terms, their standard errors, r_squared and
+        the per-run predicted reaction times; None if too few runs
+    """
+    import pandas as pd
+    usable = table['reaction_time_s'].notna() & (table['reaction_time_s'] > 0)
+    conc_cols = [c for c in table.columns if c.startswith('conc_')]
+    for col in conc_cols:
+        usable &= table[col].notna() & (table[col] > 0)
+    data = table[usable]
+
+    # Only terms that actually vary across runs can be identified
+    terms = []
+    columns = [np.ones(len(data))]
+    names = ['ln_A']
+    if 'temperature_k' in data.columns and data['temperature_k'].nunique() > 1:
+        columns.append(1.0 / data['temperature_k'].values)
+        names.append('minus_Ea_over_R')
+        terms.append('temperature_k')
+    for col in conc_cols:
+        if data[col].nunique() > 1:
+            columns.append(np.log(data[col].values))
+            names.append(f"order_{col[len('conc_'):]}")
+            terms.append(col)
+
+    X = np.column_stack(columns)
+    y = np.log(1.0 / data['reaction_time_s'].values)
+    n_runs, n_terms = X.shape
+    if n_runs <= n_terms:
+        print(f"Error: Need more than {n_terms} usable runs to fit {n_terms} terms (have {n_runs})")
+        return None
+
+    coef, _, rank, _ = np.linalg.lstsq(X, y, rcond=None)
+    residuals = y - X @ coef
+    dof = n_runs - rank
+    sigma2 = residuals @ residuals / dof
+    stderr = np.sqrt(np.diag(np.linalg.pinv(X.T @ X)) * sigma2)
+    ss_tot = np.sum((y - y.mean())**2)
+    r_squared = 1 - (residuals @ residuals) / ss_tot if ss_tot > 0 else 1.0
+
+    fit = {
+        'terms': dict(zip(names, coef.tolist())),
+        'stderr': dict(zip(names, stderr.tolist())),
+        'r_squared': float(r_squared),
+        'n_runs': int(n_runs),
+        'predicted_reaction_time_s': pd.Series(1.0 / np.exp(X @ coef), index=data.index),
+    }
+    if 'minus_Ea_over_R' in fit['terms']:
+        fit['activation_energy_kj_mol'] = -fit['terms']['minus_Ea_over_R'] * GAS_CONSTANT / 1000
+        fit['activation_energy_stderr_kj_mol'] = fit['stderr']['minus_Ea_over_R'] * GAS_CONSTANT / 1000
+    return fit
+
+
+def load_conditions(conditions_file):
+    """Read the conditions table and resolve run paths relative to it"""
+    import pandas as pd
+    table = pd.read_csv(conditions_file)
+    if 'file' not in table.columns:
+        print("Error: Conditions table needs a 'file' column")
+        return None
+    base_dir = os.path.dirname(os.path.abspath(conditions_file))
+    table['path'] = [p if os.path.isabs(p) else os.path.join(base_dir, p) for p in table['file']]
+    if 'temperature_c' in table.columns and 'temperature_k' not in table.columns:
+        table['temperature_k'] = table['temperature_c'] + 273.15
+    return table
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit reaction time against reagent conditions across runs.")
+    parser.add_argument("conditions_csv", help="CSV with a 'file' column plus conc_* and temperature columns")
+    parser.add_argument("--output", help="Per-run results CSV (default: <conditions>_kinetics.csv)")
+    parser.add_argument("--cache", default=DEFAULT_CACHE, help="Per-run result cache (default: kinetics_cache.json)")
+    parser.add_argument("--all-channels", action="store_true",
+                        help="Use the multi-channel consensus clock stop time")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--profile", help="Detector settings tuned by tune_detectors.py")
+    args = parser.parse_args()
+    import pandas as pd
+
+    print("=" * 60)
+    print("Kinetics Analysis")
+    print("=" * 60)
+
+    table = load_conditions(args.conditions_csv)
+    if table is None:
+        sys.exit(1)
+
+    missing = [p for p in table['path'] if not os.path.exists(p)]
+    for p in missing:
+        print(f"  ✗ Not found: {p}")
+    table = table[~table['path'].isin(missing)].reset_index(drop=True)
+    if table.empty:
+        print("No run files found.")
+        sys.exit(1)
+
+    params = None
+    if args.profile:
+        from detect_events import load_profile
+        params = load_profile(args.profile)
+        print(f"Detector settings from {args.profile}: {params}")
+
+    results = measure_runs(list(table['path']), cache_file=args.cache,
+                           all_channels=args.all_channels, workers=args.workers, params=params)
+    for col in ('pour_in_time_s', 'clock_stop_time_s', 'reaction_time_s'):
+        table[col] = [r.get(col) if r else None for r in results]
+    table['reaction_time_s'] = pd.to_numeric(table['reaction_time_s'])
+
+    fit = fit_kinetics(table)
+
+    print(f"\n{'Run':>24} {'Reaction (s)':>13} {'Predicted (s)':>14}")
+    if fit is not None:
+        table['predicted_reaction_time_s'] = fit['predicted_reaction_time_s']
+    for _, row in table.iterrows():
+        observed = f"{row['reaction_time_s']:.2f}" if pd.notna(row['reaction_time_s']) else "-"
+        predicted = row.get('predicted_reaction_time_s')
+        predicted = f"{predicted:.2f}" if predicted is not None and pd.notna(predicted) else "-"
+        print(f"{os.path.basename(row['file']):>24} {observed:>13} {predicted:>14}")
+
+    if fit is not None:
+        print(f"\nModel: ln(1/t) = ln(A) - (Ea/R)/T + sum(n_i * ln[X_i])   ({fit['n_runs']} runs)")
+        for name, value in fit['terms'].items():
+            print(f"  {name}: {value:.4f} +/- {fit['stderr'][name]:.4f}")
+        if 'activation_energy_kj_mol' in fit:
+            print(f"  Activation energy: {fit['activation_energy_kj_mol']:.1f} "
+                  f"+/- {fit['activation_energy_stderr_kj_mol']:.1f} kJ/mol")
+        print(f"  R^2: {fit['r_squared']:.4f}")
+
+    output_file = args.output
+    if output_file is None:
+        base = args.conditions_csv[:-4] if args.conditions_csv.endswith('.csv') else args.conditions_csv
+        output_file = base + '_kinetics.csv'
+    table.drop(columns=['path']).to_csv(output_file, index=False)
+    print(f"\nPer-run results saved to: {output_file}")
+
+
+if __name__ == "__main__":
+    main()
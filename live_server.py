@@ -0,0 +1,465 @@
+"""
+Live Dashboard Server for Color Sensor Runs
+
+Publishes samples from read.py to any number of browsers over a local
+HTTP/WebSocket server, so the acquisition loop never draws plots itself:
+
+    http://127.0.0.1:8765/               - dashboard page (no external scripts)
+    ws://127.0.0.1:8765/ws               - live updates
+    http://127.0.0.1:8765/snapshot.json  - current history as plain JSON
+
+The acquisition loop only calls publish(), which appends the sample to a deque.
+A background thread with its own asyncio event loop does everything else:
+
+1. Decimation: samples are averaged into fixed-width time bins (LIVE_BIN_SECONDS)
+   before they are sent anywhere.
+2. Delta updates: every push interval, only the bins completed since the last
+   push are encoded (once) and written to every client.
+3. History snapshot: completed bins are kept in a history that halves its
+   resolution whenever it exceeds max_history points, so a late-joining client
+   gets the whole run in a compact snapshot when it connects. Bins completed
+   after that are averaged into history points of the same (coarser) width.
+
+Clients that can't keep up are disconnected rather than buffered without limit.
+
+read.py starts the server only when LIVE_DASHBOARD_PORT is set, and keeps
+logging without it if the port cannot be opened.
+
+Dependencies:
+    Python standard library only
+
+Usage:
+    from live_server import LiveServer
+    server = LiveServer(port=8765)
+    server.start()
+    server.publish(time_s, r, g, b, c)
+    server.stop()
+
+    python live_server.py <csv_file> [--port 8765] [--speed 10]   # replay a logged run
+
+Example:
+    python live_server.py color_data_20250101_120000.csv --speed 20
+"""
+
+import argparse
+import asyncio
+import base64
+import collections
+import hashlib
+import json
+import struct
+import threading
+import time
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+# Drop a client whose unsent data exceeds this many bytes
+MAX_CLIENT_BUFFER = 1_000_000
+
+DASHBOARD_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Color Sensor Live</title>
+<style>
+body { font-family: sans-serif; margin: 12px; background: #fafafa; }
+#grid { display: grid; grid-template-columns: 1fr 1fr; gap: 10px; }
+canvas { width: 100%; height: 260px; background: #fff; border: 1px solid #ccc; }
+#status { color: #666; margin-bottom: 8px; }
+</style></head>
+<body>
+<h2>Real-Time Color Sensor Data</h2>
+<div id="status">Connecting...</div>
+<div id="grid">
+<canvas id="R"></canvas><canvas id="G"></canvas>
+<canvas id="B"></canvas><canvas id="C"></canvas>
+</div>
+<script>
+const channels = ['R', 'G', 'B', 'C'];
+const colors = {R: 'red', G: 'green', B: 'blue', C: 'purple'};
+let points = [];
+let pending = false;
+
+function draw() {
+  pending = false;
+  for (let ci = 0; ci < channels.length; ci++) {
+    const canvas = document.getElementById(channels[ci]);
+    const w = canvas.width = canvas.clientWidth, h = canvas.height = canvas.clientHeight;
+    const ctx = canvas.getContext('2d');
+    ctx.fillStyle = '#000';
+    ctx.fillText(channels[ci] + ' Channel', 8, 14);
+    if (points.length < 2) continue;
+    const t0 = points[0][0], t1 = points[points.length - 1][0];
+    let lo = Infinity, hi = -Infinity;
+    for (const p of points) { lo = Math.min(lo, p[ci + 1]); hi = Math.max(hi, p[ci + 1]); }
+    if (hi === lo) { hi += 1; lo -= 1; }
+    ctx.fillText(hi.toFixed(0), 8, 28);
+    ctx.fillText(lo.toFixed(0), 8, h - 6);
+    ctx.fillText(t1.toFixed(1) + ' s', w - 60, h - 6);
+    ctx.strokeStyle = colors[channels[ci]];
+    ctx.beginPath();
+    points.forEach((p, i) => {
+      const x = 40 + (p[0] - t0) / (t1 - t0 || 1) * (w - 50);
+      const y = h - 14 - (p[ci + 1] - lo) / (hi - lo) * (h - 34);
+      i ? ctx.lineTo(x, y) : ctx.moveTo(x, y);
+    });
+    ctx.stroke();
+  }
+}
+
+function connect() {
+  const ws = new WebSocket('ws://' + location.host + '/ws');
+  const status = document.getElementById('status');
+  ws.onmessage = (event) => {
+    const msg = JSON.parse(event.data);
+    if (msg.type === 'snapshot') points = msg.points;
+    else points = points.concat(msg.points);
+    status.textContent = points.length + ' points, bin ' + msg.bin_s + ' s, ' + msg.samples + ' samples';
+    if (!pending) { pending = true; requestAnimationFrame(draw); }
+  };
+  ws.onclose = () => { status.textContent = 'Disconnected, retrying...'; setTimeout(connect, 2000); };
+}
+connect();
+</script>
+</body></html>
+"""
+
+
+class Decimator:
+    """
+    Average samples into time bins and keep a bounded history of the bins.
+
+    Args:
+        bin_s: Width of a bin in seconds
+        max_history: Halve the history resolution when it grows beyond this
+    """
+
+    def __init__(self, bin_s=1.0, max_history=2000):
+        self.bin_s = bin_s
+        self.history_bin_s = bin_s
+        self.max_history = max_history
+        self.history = []
+        self.samples = 0
+        self._bin_index = None
+        self._sums = None
+        self._count = 0
+        # Number of bins averaged into each history point, and the history point
+        # still collecting bins as [index, weighted sums, weight]
+        self._weights = []
+        self._open = None
+
+    def _close_bin(self):
+        t = (self._bin_index + 0.5) * self.bin_s
+        point = [round(t, 3)] + [round(s / self._count, 1) for s in self._sums]
+        self._bin_index = None
+        return point
+
+    def add(self, samples):
+        """
+        Add (time_s, r, g, b, c) samples in time order.
+
+        Returns:
+            List of bins completed by these samples as [time_s, r, g, b, c]
+        """
+        completed = []
+        for sample in samples:
+            self.samples += 1
+            index = int(sample[0] // self.bin_s)
+            if self._bin_index is not None and index != self._bin_index:
+                completed.append(self._close_bin())
+            if self._bin_index is None:
+                self._bin_index = index
+                self._sums = list(sample[1:])
+                self._count = 1
+            else:
+                for i, value in enumerate(sample[1:]):
+                    self._sums[i] += value
+                self._count += 1
+        self._extend_history(completed)
+        return completed
+
+    def flush(self):
+        """Close the bin still collecting samples; returns it as a list of completed bins"""
+        if self._bin_index is None:
+            return []
+        completed = [self._close_bin()]
+        self._extend_history(completed)
+        return completed
+
+    def snapshot(self):
+        """History points of width history_bin_s, including the one still collecting bins"""
+        if self._open is None:
+            return list(self.history)
+        return self.history + [self._history_point(*self._open)]
+
+    def _history_point(self, index, sums, weight):
+        t = (index + 0.5) * self.history_bin_s
+        return [round(t, 3)] + [round(s / weight, 1) for s in sums]
+
+    def _add_to_history(self, point, weight):
+        # Bins are aligned on multiples of bin_s, so this lands every bin (or
+        # merged history point) entirely inside one history point
+        index = int(point[0] // self.history_bin_s)
+        if self._open is not None and self._open[0] != index:
+            self.history.append(self._history_point(*self._open))
+            self._weights.append(self._open[2])
+            self._open = None
+        if self._open is None:
+            self._open = [index, [v * weight for v in point[1:]], weight]
+        else:
+            for i, value in enumerate(point[1:]):
+                self._open[1][i] += value * weight
+            self._open[2] += weight
+
+    def _extend_history(self, points):
+        for point in points:
+            self._add_to_history(point, 1)
+        while len(self.history) > self.max_history:
+            # Halve the resolution: regroup everything into bins twice as wide
+            entries = list(zip(self.history, self._weights))
+            if self._open is not None:
+                entries.append((self._history_point(*self._open), self._open[2]))
+            self.history, self._weights, self._open = [], [], None
+            self.history_bin_s *= 2
+            for point, weight in entries:
+                self._add_to_history(point, weight)
+
+
+def encode_frame(payload, opcode=0x1):
+    """Encode an unmasked (server-to-client) WebSocket frame"""
+    header = bytes([0x80 | opcode])
+    length = len(payload)
+    if length < 126:
+        header += bytes([length])
+    elif length < 65536:
+        header += bytes([126]) + struct.pack('!H', length)
+    else:
+        header += bytes([127]) + struct.pack('!Q', length)
+    return header + payload
+
+
+async def read_frame(reader):
+    """Read one (masked) client frame; returns (opcode, payload)"""
+    first, second = await reader.readexactly(2)
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack('!H', await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack('!Q', await reader.readexactly(8))[0]
+    mask = await reader.readexactly(4) if second & 0x80 else b'\x00\x00\x00\x00'
+    data = await reader.readexactly(length)
+    payload = bytes(b ^ mask[i % 4] for i, b in enumerate(data))
+    return first & 0x0F, payload
+
+
+class LiveServer:
+    """
+    Serve the live dashboard from a background thread.
+
+    Args:
+        host: Interface to bind (default: localhost only)
+        port: TCP port
+        bin_s: Decimation bin width in seconds
+        push_interval: Seconds between delta updates to clients
+        max_history: Maximum number of points in the history snapshot
+    """
+
+    def __init__(self, host='127.0.0.1', port=8765, bin_s=1.0, push_interval=0.5, max_history=2000):
+        self.host = host
+        self.port = port
+        self.push_interval = push_interval
+        self.decimator = Decimator(bin_s=bin_s, max_history=max_history)
+        self.pending = collections.deque()
+        self.clients = set()
+        self.loop = None
+        self.thread = None
+        self._ready = threading.Event()
+        self._stopping = None
+        self._tasks = set()
+        self.error = None
+
+    def publish(self, time_s, r, g, b, c):
+        """Queue one sample; cheap and safe to call from the acquisition loop"""
+        self.pending.append((time_s, r, g, b, c))
+
+    def start(self):
+        """Start the server thread and wait until it is listening"""
+        self.thread = threading.Thread(target=self._run, name="live-server", daemon=True)
+        self.thread.start()
+        self._ready.wait()
+        if self.error is not None:
+            raise self.error
+
+    def stop(self):
+        """Send the remaining samples and shut the server down"""
+        if self.loop is None or self.thread is None:
+            return
+        self.loop.call_soon_threadsafe(self._stopping.set)
+        self.thread.join(timeout=5)
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/"
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        try:
+            self.loop.run_until_complete(self._serve())
+        except Exception as e:
+            self.error = e
+            self._ready.set()
+        finally:
+            self.loop.close()
+
+    async def _serve(self):
+        self._stopping = asyncio.Event()
+        server = await asyncio.start_server(self._handle, self.host, self.port)
+        self._ready.set()
+        async with server:
+            while not self._stopping.is_set():
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), self.push_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._push()
+
+            # Send the last samples, including the bin still open, then close every connection
+            self._push(flush=True)
+            for writer in list(self.clients):
+                writer.write(encode_frame(struct.pack('!H', 1001), opcode=0x8))
+                try:
+                    await asyncio.wait_for(writer.drain(), 1.0)
+                except (ConnectionError, asyncio.TimeoutError):
+                    pass
+                writer.close()
+            # Closed connections end their handlers; cancel any that are still running
+            tasks = list(self._tasks)
+            if tasks:
+                _, still_running = await asyncio.wait(tasks, timeout=1.0)
+                for task in still_running:
+                    task.cancel()
+                await asyncio.gather(*still_running, return_exceptions=True)
+
+    def _message(self, kind, points):
+        return json.dumps({'type': kind, 'bin_s': self.decimator.bin_s if kind == 'delta'
+                           else self.decimator.history_bin_s,
+                           'samples': self.decimator.samples, 'points': points},
+                          separators=(',', ':')).encode()
+
+    def _drain_pending(self):
+        samples = []
+        while self.pending:
+            samples.append(self.pending.popleft())
+        return self.decimator.add(samples)
+
+    def _push(self, flush=False):
+        """
+        Decimate queued samples and send the new bins to every client.
+
+        This is the only place queued samples are decimated, so every completed
+        bin reaches the connected clients exactly once.
+        """
+        completed = self._drain_pending()
+        if flush:
+            completed += self.decimator.flush()
+        if not completed or not self.clients:
+            return
+        frame = encode_frame(self._message('delta', completed))
+        for writer in list(self.clients):
+            if writer.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+                self.clients.discard(writer)
+                writer.close()
+                continue
+            writer.write(frame)
+
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1')
+                if line in ('\r\n', '\n', ''):
+                    break
+                key, _, value = line.partition(':')
+                headers[key.strip().lower()] = value.strip()
+            path = request_line[1] if len(request_line) > 1 else '/'
+
+            if path == '/ws' and headers.get('upgrade', '').lower() == 'websocket':
+                await self._websocket(reader, writer, headers)
+            elif path == '/snapshot.json':
+                # Connected clients get the queued bins too, before the snapshot includes them
+                self._push()
+                self._respond(writer, '200 OK', 'application/json', self._message('snapshot', self.decimator.snapshot()))
+            elif path == '/':
+                self._respond(writer, '200 OK', 'text/html; charset=utf-8', DASHBOARD_HTML.encode())
+            else:
+                self._respond(writer, '404 Not Found', 'text/plain', b'Not found\n')
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            # Only cancelled at shutdown; finishing normally keeps asyncio from logging it
+            pass
+        finally:
+            self.clients.discard(writer)
+            self._tasks.discard(task)
+            writer.close()
+
+    def _respond(self, writer, status, content_type, body):
+        writer.write(f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                     f"Content-Length: {len(body)}\r\nCache-Control: no-cache\r\n"
+                     f"Connection: close\r\n\r\n".encode() + body)
+
+    async def _websocket(self, reader, writer, headers):
+        key = headers.get('sec-websocket-key', '')
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode()).digest()).decode()
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+                      f"Connection: Upgrade\r\nSec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+
+        # Bring the history up to date (sending the new bins to the other clients),
+        # then send it before any delta
+        self._push()
+        writer.write(encode_frame(self._message('snapshot', self.decimator.snapshot())))
+        self.clients.add(writer)
+        await writer.drain()
+
+        while True:
+            opcode, payload = await read_frame(reader)
+            if opcode == 0x8:  # close
+                writer.write(encode_frame(payload[:2], opcode=0x8))
+                return
+            if opcode == 0x9:  # ping
+                writer.write(encode_frame(payload, opcode=0xA))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a logged run through the live dashboard.")
+    parser.add_argument("csv_file", help="Run CSV file or segmented run directory")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to bind (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port (default: 8765)")
+    parser.add_argument("--speed", type=float, default=10.0, help="Replay speed factor (default: 10)")
+    args = parser.parse_args()
+
+    from run_io import iter_timed_chunks
+
+    server = LiveServer(host=args.host, port=args.port)
+    server.start()
+    print(f"Dashboard at {server.url} (Ctrl+C to stop)")
+
+    start = time.monotonic()
+    try:
+        for chunk in iter_timed_chunks(args.csv_file, chunksize=10_000):
+            for t, r, g, b, c in chunk[['Time_s', 'R', 'G', 'B', 'C']].itertuples(index=False):
+                delay = t / args.speed - (time.monotonic() - start)
+                if delay > 0:
+                    time.sleep(delay)
+                server.publish(float(t), int(r), int(g), int(b), int(c))
+        print("Replay finished; still serving (Ctrl+C to stop)")
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
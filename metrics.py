@@ -0,0 +1,294 @@
+"""
+Low-Overhead Metrics for the Acquisition Loop
+
+Provides HDR-style latency histograms and simple counters so read.py can report
+where time goes (serial reads, parsing, CSV writes, fsync, plot redraws) without
+printing on every sample.
+
+Histograms use log-linear buckets: values are grouped by power of two, and each
+power of two is split into a fixed number of linear sub-buckets. Recording is
+O(1) with no allocation and memory stays constant, while percentiles keep a
+bounded relative error (about 3% with the default 5 sub-bucket bits).
+
+Usage:
+    metrics = Metrics()
+    with metrics.time_stage('parse'):
+        ...
+    metrics.increment('lines_received')
+    metrics.maybe_report()
+"""
+
+import json
+import socket
+import time
+from contextlib import contextmanager
+
+
+class LatencyHistogram:
+    """
+    Log-linear histogram of integer values (nanoseconds by default).
+
+    Args:
+        sub_bucket_bits: Number of bits of precision kept within each power of two
+        highest_value: Largest trackable value; larger values are clamped
+    """
+
+    def __init__(self, sub_bucket_bits=5, highest_value=60 * 1_000_000_000):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_bucket_count = 1 << sub_bucket_bits
+        self.half_count = self.sub_bucket_count >> 1
+        self.highest_value = highest_value
+        self.counts = [0] * (self._bucket_index(highest_value) + 1)
+        self.reset()
+
+    def reset(self):
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def _bucket_index(self, value):
+        if value < self.sub_bucket_count:
+            return value
+        shift = value.bit_length() - self.sub_bucket_bits
+        top = value >> shift
+        return self.sub_bucket_count + (shift - 1) * self.half_count + (top - self.half_count)
+
+    def _bucket_value(self, index):
+        """Representative (midpoint) value of a bucket"""
+        if index < self.sub_bucket_count:
+            return index
+        offset = index - self.sub_bucket_count
+        shift = offset // self.half_count + 1
+        top = offset % self.half_count + self.half_count
+        low = top << shift
+        return low + ((1 << shift) >> 1)
+
+    def record(self, value):
+        value = int(value)
+        if value < 0:
+            value = 0
+        elif value > self.highest_value:
+            value = self.highest_value
+        self.counts[self._bucket_index(value)] += 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """Add all values recorded in another histogram with the same layout"""
+        for i, c in enumerate(other.counts):
+            if c:
+                self.counts[i] += c
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+
+    def percentile(self, p):
+        """Approximate value at percentile p (0-100), or None if empty"""
+        if self.count == 0:
+            return None
+        if p >= 100:
+            return self.max
+        target = max(1, int(round(self.count * p / 100.0)))
+        running = 0
+        for i, c in enumerate(self.counts):
+            running += c
+            if running >= target:
+                return min(max(self._bucket_value(i), self.min), self.max)
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    def snapshot(self):
+        """Summary statistics as a dictionary (values in the recorded unit)"""
+        return {
+            'count': self.count,
+            'min': self.min,
+            'mean': self.mean(),
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'p999': self.percentile(99.9),
+            'max': self.max,
+        }
+
+
+class MetricsExporter:
+    """
+    Export metric snapshots as JSON for external dashboards.
+
+    Target can be a file path (one JSON object per line is appended) or a
+    'udp://host:port' address (one JSON datagram per snapshot).
+    """
+
+    def __init__(self, target):
+        self.target = target
+        self.sock = None
+        self.address = None
+        self.file = None
+        if target.startswith('udp://'):
+            host, port = target[len('udp://'):].rsplit(':', 1)
+            self.address = (host, int(port))
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        else:
+            self.file = open(target, 'a', buffering=1)
+
+    def export(self, snapshot):
+        payload = json.dumps(snapshot, sort_keys=True)
+        try:
+            if self.sock is not None:
+                self.sock.sendto(payload.encode('utf-8'), self.address)
+            else:
+                self.file.write(payload + "\n")
+        except OSError as e:
+            # Metrics must never take down acquisition
+            print(f"Warning: metrics export to {self.target} failed: {e}")
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+        if self.file is not None:
+            self.file.close()
+
+
+def format_ns(value):
+    """Format a nanosecond value with a readable unit"""
+    if value is None:
+        return "-"
+    if value >= 1_000_000_000:
+        return f"{value / 1e9:.2f}s"
+    if value >= 1_000_000:
+        return f"{value / 1e6:.2f}ms"
+    if value >= 1_000:
+        return f"{value / 1e3:.1f}us"
+    return f"{value}ns"
+
+
+class Metrics:
+    """
+    Per-stage latency histograms plus counters, with periodic reporting.
+
+    Each stage keeps an interval histogram (reset at every summary) and a total
+    histogram for the shutdown report.
+
+    Args:
+        interval: Seconds between one-line summaries (None disables them)
+        export_target: Optional file path or 'udp://host:port' for snapshots
+    """
+
+    def __init__(self, interval=10, export_target=None):
+        self.interval = interval
+        self.stages = {}
+        self.counters = {}
+        self.interval_counters = {}
+        self.start_ns = time.monotonic_ns()
+        self.last_report_ns = self.start_ns
+        self.exporter = MetricsExporter(export_target) if export_target else None
+
+    def _stage(self, name):
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = (LatencyHistogram(), LatencyHistogram())
+            self.stages[name] = stage
+        return stage
+
+    def record(self, name, duration_ns):
+        self._stage(name)[0].record(duration_ns)
+
+    @contextmanager
+    def time_stage(self, name):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter_ns() - start)
+
+    def increment(self, name, amount=1):
+        self.interval_counters[name] = self.interval_counters.get(name, 0) + amount
+
+    def _roll_interval(self):
+        """Fold interval data into the totals and start a new interval"""
+        for interval_hist, total_hist in self.stages.values():
+            total_hist.merge(interval_hist)
+            interval_hist.reset()
+        for name, value in self.interval_counters.items():
+            self.counters[name] = self.counters.get(name, 0) + value
+        self.interval_counters = {}
+
+    def snapshot(self, now_ns=None):
+        """Interval statistics as a dictionary, suitable for export"""
+        now_ns = now_ns or time.monotonic_ns()
+        elapsed_s = (now_ns - self.last_report_ns) / 1e9
+        return {
+            'uptime_s': round((now_ns - self.start_ns) / 1e9, 3),
+            'interval_s': round(elapsed_s, 3),
+            'counters': dict(self.interval_counters),
+            'stages_ns': {name: hists[0].snapshot() for name, hists in self.stages.items()},
+        }
+
+    def summary_line(self, snapshot):
+        """One-line human readable version of an interval snapshot"""
+        counters = snapshot['counters']
+        elapsed_s = max(snapshot['interval_s'], 1e-9)
+        rate = counters.get('samples_logged', 0) / elapsed_s
+        parts = [f"[{snapshot['uptime_s']:.0f}s] {rate:.1f} samples/s"]
+        if counters:
+            parts.append(" ".join(f"{k}={v}" for k, v in sorted(counters.items())))
+        for name, stats in snapshot['stages_ns'].items():
+            if stats['count']:
+                parts.append(f"{name} p50={format_ns(stats['p50'])} p99={format_ns(stats['p99'])}")
+        return " | ".join(parts)
+
+    def maybe_report(self, force=False):
+        """Print and export a summary if the reporting interval has elapsed"""
+        now_ns = time.monotonic_ns()
+        if not force and (self.interval is None or now_ns - self.last_report_ns < self.interval * 1e9):
+            return
+        snapshot = self.snapshot(now_ns)
+        if self.interval is not None:
+            print(self.summary_line(snapshot))
+        if self.exporter is not None:
+            self.exporter.export(snapshot)
+        self._roll_interval()
+        self.last_report_ns = now_ns
+
+    def report(self):
+        """Full report covering the whole run (call at shutdown)"""
+        self._roll_interval()
+        uptime_s = (time.monotonic_ns() - self.start_ns) / 1e9
+        lines = ["=" * 60, "Acquisition Metrics", "=" * 60]
+        lines.append(f"Uptime: {uptime_s:.1f} seconds")
+        for name, value in sorted(self.counters.items()):
+            lines.append(f"  {name}: {value}")
+        if self.stages:
+            lines.append("")
+            lines.append(f"{'stage':>12} {'count':>8} {'mean':>9} {'p50':>9} {'p90':>9} "
+                         f"{'p99':>9} {'p99.9':>9} {'max':>9}")
+            for name, (_, total) in self.stages.items():
+                stats = total.snapshot()
+                mean = int(stats['mean']) if stats['mean'] is not None else None
+                lines.append(f"{name:>12} {stats['count']:>8} {format_ns(mean):>9} "
+                             f"{format_ns(stats['p50']):>9} {format_ns(stats['p90']):>9} "
+                             f"{format_ns(stats['p99']):>9} {format_ns(stats['p999']):>9} "
+                             f"{format_ns(stats['max']):>9}")
+        return "\n".join(lines)
+
+    def close(self):
+        self._roll_interval()
+        if self.exporter is not None:
+            self.exporter.export({
+                'final': True,
+                'counters': dict(self.counters),
+                'stages_ns': {name: hists[1].snapshot() for name, hists in self.stages.items()},
+            })
+            self.exporter.close()
@@ -0,0 +1,398 @@
+"""
+In-Process Analysis Pipeline
+
+Chains the conversion, resampling, detection and extraction steps in memory
+instead of writing a CSV between each script. A recipe (TOML, or YAML if PyYAML
+is installed) lists the input runs and the stages to apply to each of them.
+Frames are passed from stage to stage as DataFrames with 'Time_s' and a
+datetime 'Timestamp' column; only the artifacts a recipe asks for are written.
+Runs get these columns as they are loaded ('Time_ns' runs: anchor + offset,
+legacy 't' files: base timestamp + t), so every stage can come first.
+
+Stages:
+    convert   - Add wall-clock timestamps; a no-op on loaded runs, kept so
+                older recipes still work
+    resample  - Median per time bin (interpolate_data.resample_median)
+                  interval (1.0), monotonic (true), timestamps ('fixed': bins
+                  counted from interpolate_data.BASE_TIME as interpolate_data.py
+                  writes them, or 'run': from the run's first sample)
+    detect    - Pour-in and clock stop events (detect_events.detect_run_events)
+                  all_channels (false), output (JSON file)
+    extract   - Clear channel values (extract_clear_values.select_clear_values)
+                  mode ('raw'), output (JSON file)
+    write     - Save the current frame as a 'Timestamp,R,G,B,C' CSV
+                  path (required)
+
+detect, extract and write leave the frame unchanged, so they can appear anywhere
+in the chain. Output paths are relative to the recipe, like the inputs, and
+'{stem}' in them is replaced by the input file name without its extension.
+
+Stage results are memoized in the cache directory, keyed on the input run's
+size and modification time, the stages before them and their parameters,
+so re-running a recipe after changing a later stage starts from the deepest
+cached result. Bump STAGE_VERSION when a stage's behaviour changes. Results
+are never evicted; --clear-cache empties the cache directory first.
+
+An input that fails (unreadable, or missing a column a stage needs) is
+reported and skipped; the other inputs are still processed.
+
+Dependencies:
+    pandas, numpy, scipy (detect), PyYAML (optional, for .yaml recipes)
+
+Usage:
+    python pipeline.py <recipe.toml|recipe.yaml> [--no-cache] [--clear-cache] [--cache-dir DIR]
+
+Example recipe (TOML):
+    inputs = ["color_data_20250101_120000.csv", "color_data_11_21.csv"]
+
+    [[stages]]
+    stage = "convert"
+
+    [[stages]]
+    stage = "detect"
+    output = "{stem}_events.json"
+
+    [[stages]]
+    stage = "resample"
+    interval = 1.0
+    monotonic = false
+
+    [[stages]]
+    stage = "write"
+    path = "{stem}_resampled.csv"
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import sys
+import time
+
+from run_io import read_run_csv, run_fingerprint, add_time_columns, format_timestamps
+
+# Part of every cache key; bump it to invalidate cached results after changing a stage
+STAGE_VERSION = 3
+DEFAULT_CACHE_DIR = ".pipeline_cache"
+# Stage parameters that name artifacts rather than change the result
+OUTPUT_PARAMS = ('output', 'path')
+
+
+def convert_stage(df):
+    """Frame with 'Time_s' and a datetime 'Timestamp' column"""
+    import pandas as pd
+    from convert_format import parse_legacy_base_timestamp
+
+    if 'Time_s' in df.columns:
+        return df
+    df = df.copy()
+    if 't' in df.columns:
+        base_timestamp = parse_legacy_base_timestamp(str(df['Timestamp'].iloc[0]))
+        if base_timestamp is None:
+            raise ValueError(f"Unable to parse timestamp format: {df['Timestamp'].iloc[0]}")
+        offsets_us = (df['t'].astype(float) * 1e6).round().astype('int64')
+        df['Timestamp'] = pd.Timestamp(base_timestamp) + pd.to_timedelta(offsets_us, unit='us')
+        df['Time_s'] = df['t'].astype(float) - float(df['t'].iloc[0])
+        return df
+    return add_time_columns(df)
+
+
+def resample_stage(df, interval=1.0, monotonic=True, timestamps='fixed'):
+    """
+    Median per time bin. Bins are timestamped from interpolate_data.BASE_TIME
+    like interpolate_data.py output (timestamps='fixed'), or from the run's
+    first sample (timestamps='run').
+    """
+    import pandas as pd
+    from interpolate_data import BASE_TIME, resample_median
+
+    if timestamps not in ('fixed', 'run'):
+        raise ValueError(f"Unknown resample timestamps '{timestamps}' (choose from fixed, run)")
+    grouped = resample_median([df], interval=interval, monotonic=monotonic)
+    if grouped is None:
+        raise ValueError("No data to resample")
+    frame = grouped.rename(columns={'Time_bin': 'Time_s'})
+    base_time = pd.Timestamp(BASE_TIME) if timestamps == 'fixed' else df['Timestamp'].iloc[0]
+    frame.insert(0, 'Timestamp', base_time + pd.to_timedelta(frame['Time_s'], unit='s'))
+    return frame
+
+
+def detect_stage(df, all_channels=False):
+    from detect_events import detect_run_events
+
+    return detect_run_events(df, all_channels=all_channels)
+
+
+def extract_stage(df, mode='raw'):
+    from extract_clear_values import select_clear_values
+
+    values = select_clear_values([df], mode)
+    if values is None:
+        raise ValueError("No time column found for per-second aggregation")
+    return [int(v) for v in values]
+
+
+def write_stage(df, path):
+    import pandas as pd
+
+    columns = ['R', 'G', 'B', 'C'] + [col for col in ('Flags', 'Device_ns') if col in df.columns]
+    out = pd.DataFrame({'Timestamp': format_timestamps(df['Timestamp']).values})
+    for col in columns:
+        out[col] = df[col].values
+    out.to_csv(path, index=False)
+    return path
+
+
+# Stage name -> (function, True if it returns a new frame, False if it returns a result)
+STAGES = {
+    'convert': (convert_stage, True),
+    'resample': (resample_stage, True),
+    'detect': (detect_stage, False),
+    'extract': (extract_stage, False),
+    'write': (write_stage, False),
+}
+
+
+def load_recipe(path):
+    """
+    Read a recipe file.
+
+    Returns:
+        Dictionary with 'inputs' (list of paths, relative to the recipe),
+        'stages' (list of dictionaries with a 'stage' name and its parameters)
+        and 'base_dir' (the recipe's directory, which output paths are relative to)
+    """
+    if path.endswith(('.yaml', '.yml')):
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError("YAML recipes need PyYAML (pip install pyyaml); use a .toml recipe instead")
+        with open(path) as f:
+            recipe = yaml.safe_load(f) or {}
+    else:
+        import tomllib
+        with open(path, 'rb') as f:
+            recipe = tomllib.load(f)
+
+    inputs = recipe.get('inputs') or ([recipe['input']] if 'input' in recipe else [])
+    if not inputs:
+        raise ValueError("Recipe has no 'inputs'")
+    stages = recipe.get('stages') or []
+    for i, stage in enumerate(stages):
+        name = stage.get('stage')
+        if name not in STAGES:
+            raise ValueError(f"Stage {i + 1}: unknown stage '{name}' (choose from {', '.join(STAGES)})")
+    if any(stage['stage'] == 'write' and 'path' not in stage for stage in stages):
+        raise ValueError("'write' stages need a 'path'")
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    recipe['inputs'] = [os.path.join(base_dir, p) for p in inputs]
+    recipe['stages'] = stages
+    recipe['base_dir'] = base_dir
+    return recipe
+
+
+def stage_key(previous_key, stage):
+    """Cache key of a stage's result: the key of its input plus its name and parameters"""
+    params = {k: v for k, v in stage.items() if k not in OUTPUT_PARAMS}
+    text = json.dumps([previous_key, STAGE_VERSION, params], sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def input_key(path):
+    text = json.dumps([os.path.abspath(path), STAGE_VERSION, run_fingerprint(path)])
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    Pickled stage results on disk, plus the ones produced in this process.
+
+    Args:
+        cache_dir: Directory for the pickles, or None to keep results in memory only
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.memory = {}
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".pkl")
+
+    def __contains__(self, key):
+        return key in self.memory or (self.cache_dir is not None and os.path.exists(self._path(key)))
+
+    def get(self, key):
+        if key not in self.memory:
+            with open(self._path(key), 'rb') as f:
+                self.memory[key] = pickle.load(f)
+        return self.memory[key]
+
+    def clear(self):
+        """Delete every cached result"""
+        self.memory.clear()
+        if self.cache_dir:
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(('.pkl', '.pkl.tmp')):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+    def put(self, key, value):
+        self.memory[key] = value
+        if self.cache_dir:
+            # Write then rename so an interrupted run never leaves a truncated pickle
+            tmp = self._path(key) + ".tmp"
+            with open(tmp, 'wb') as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._path(key))
+
+
+def output_path(template, input_path, output_dir=None):
+    """Output path for a run; relative templates are resolved against output_dir if given"""
+    stem = os.path.splitext(os.path.basename(input_path.rstrip('/\\')))[0]
+    path = template.replace('{stem}', stem)
+    return os.path.join(output_dir, path) if output_dir else path
+
+
+def save_result(result, path):
+    """Write a detect or extract result as JSON"""
+    def default(value):
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        if hasattr(value, 'item'):
+            return value.item()
+        return str(value)
+
+    with open(path, 'w') as f:
+        json.dump(result, f, indent=2, default=default)
+
+
+def run_pipeline(input_path, stages, cache, output_dir=None):
+    """
+    Apply the stages to one run, writing outputs relative to output_dir
+    (the current directory if None).
+
+    Frames are only loaded or computed when a later stage needs them: if the
+    result of the last frame stage is cached, the run is not read at all.
+    Only stage results are cached; the loaded run is already keyed by its fingerprint.
+
+    Returns:
+        Dictionary of stage results, keyed '<index>:<stage>' (e.g. '2:detect')
+    """
+    keys = [input_key(input_path)]
+    for stage in stages:
+        keys.append(stage_key(keys[-1], stage))
+
+    # Frame that each stage reads: the input or the output of the last frame stage before it
+    frame_keys = []
+    current = keys[0]
+    for stage, key in zip(stages, keys[1:]):
+        frame_keys.append(current)
+        if STAGES[stage['stage']][1]:
+            current = key
+
+    frames = {}
+
+    def frame(key):
+        if key in frames:
+            return frames[key]
+        if key == keys[0]:
+            print(f"  load: {input_path}")
+            frames[key] = convert_stage(read_run_csv(input_path))
+            return frames[key]
+        if key in cache:
+            frames[key] = cache.get(key)
+            return frames[key]
+        index = keys.index(key) - 1
+        frames[key] = execute(index)
+        return frames[key]
+
+    def execute(index):
+        stage = stages[index]
+        name = stage['stage']
+        function, _ = STAGES[name]
+        params = {k: v for k, v in stage.items() if k != 'stage' and k not in OUTPUT_PARAMS}
+        if name == 'write':
+            params['path'] = output_path(stage['path'], input_path, output_dir)
+        data = frame(frame_keys[index])
+        start = time.perf_counter()
+        result = function(data, **params)
+        print(f"  {name}: {time.perf_counter() - start:.3f}s")
+        if name != 'write':
+            cache.put(keys[index + 1], result)
+        return result
+
+    results = {}
+    for index, stage in enumerate(stages):
+        name = stage['stage']
+        key = keys[index + 1]
+        produces_frame = STAGES[name][1]
+        if name != 'write' and key in cache:
+            print(f"  {name}: cached")
+            if not produces_frame:
+                results[f"{index}:{name}"] = cache.get(key)
+            continue
+        if produces_frame:
+            # Computed on demand by the next stage that reads it
+            continue
+        result = execute(index)
+        results[f"{index}:{name}"] = result
+        if name == 'write':
+            print(f"    saved: {result}")
+
+    for index, stage in enumerate(stages):
+        if 'output' in stage and f"{index}:{stage['stage']}" in results:
+            path = output_path(stage['output'], input_path, output_dir)
+            save_result(results[f"{index}:{stage['stage']}"], path)
+            print(f"    saved: {path}")
+    return results
+
+
+def print_result(name, result):
+    if name == 'detect':
+        for field in ('pour_in_time_s', 'clock_stop_time_s', 'reaction_time_s'):
+            value = result.get(field)
+            print(f"    {field}: {value:.3f}" if value is not None else f"    {field}: -")
+    elif name == 'extract':
+        print(f"    {len(result)} Clear values")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run an analysis recipe on one or more runs.")
+    parser.add_argument("recipe", help="Recipe file (.toml, or .yaml with PyYAML)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help=f"Directory for memoized stage results (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--no-cache", action="store_true", help="Do not read or write the cache directory")
+    parser.add_argument("--clear-cache", action="store_true",
+                        help="Delete all memoized stage results before running")
+    args = parser.parse_args()
+
+    try:
+        recipe = load_recipe(args.recipe)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    cache = ResultCache(None if args.no_cache else args.cache_dir)
+    if args.clear_cache:
+        cache.clear()
+    stages = recipe['stages']
+    print(f"Recipe: {args.recipe} ({' -> '.join(s['stage'] for s in stages) or 'no stages'})")
+    for input_path in recipe['inputs']:
+        print(f"\n{input_path}")
+        try:
+            results = run_pipeline(input_path, stages, cache, output_dir=recipe['base_dir'])
+        except (OSError, ValueError) as e:
+            print(f"  Error: {e}")
+            continue
+        except KeyError as e:
+            print(f"  Error: missing column: {e.args[0] if e.args else e}")
+            continue
+        for label, result in results.items():
+            print_result(label.split(':', 1)[1], result)
+
+
+if __name__ == "__main__":
+    main()
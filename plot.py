@@ -1,17 +1,21 @@
-import pandas as pd
-import matplotlib.pyplot as plt
+import argparse
 import glob
 import os
 from datetime import datetime
+import numpy as np
+from run_io import iter_timed_chunks, read_run_csv, add_time_columns
 
 def plot_color_data(csv_files):
     """
-    Plot R, G, B, C values from multiple CSV files
+    Plot R, G, B, C values from multiple CSV files.
+    Segmented runs are read and plotted one segment at a time.
     """
     if not csv_files:
         print("No color data CSV files found!")
         return
     
+    import matplotlib.pyplot as plt
+    
     print(f"Found {len(csv_files)} CSV file(s) to plot")
     
     # Create a figure with subplots
@@ -25,29 +29,26 @@ def plot_color_data(csv_files):
     color_map = {'R': 'red', 'G': 'green', 'B': 'blue', 'C': 'purple'}
     
     # Plot each CSV file
-    for csv_file in csv_files:
+    for file_idx, csv_file in enumerate(csv_files):
         try:
-            # Read the CSV file
-            df = pd.read_csv(csv_file)
-            
-            # Convert timestamp to datetime
-            df['Timestamp'] = pd.to_datetime(df['Timestamp'])
-            
-            # Create a relative time in seconds from start
-            df['Time (s)'] = (df['Timestamp'] - df['Timestamp'].iloc[0]).dt.total_seconds()
-            
             # Extract filename for legend
-            filename = os.path.basename(csv_file)
+            filename = os.path.basename(csv_file.rstrip(os.sep))
+            file_color = f"C{file_idx % 10}"
+            point_count = 0
             
-            # Plot each color channel in its own subplot
-            for idx, color_channel in enumerate(colors_to_plot):
-                if color_channel in df.columns:
-                    axes_flat[idx].scatter(df['Time (s)'], df[color_channel], 
-                                          label=filename, 
-                                          s=20,
-                                          alpha=0.7)
+            # Read the file one segment at a time; 'Time_s' is relative to the run start
+            for chunk_idx, df in enumerate(iter_timed_chunks(csv_file)):
+                # Plot each color channel in its own subplot
+                for idx, color_channel in enumerate(colors_to_plot):
+                    if color_channel in df.columns:
+                        axes_flat[idx].scatter(df['Time_s'], df[color_channel], 
+                                              label=filename if chunk_idx == 0 else None, 
+                                              color=file_color,
+                                              s=20,
+                                              alpha=0.7)
+                point_count += len(df)
             
-            print(f"Plotted: {filename} ({len(df)} data points)")
+            print(f"Plotted: {filename} ({point_count} data points)")
             
         except Exception as e:
             print(f"Error plotting {csv_file}: {e}")
@@ -78,22 +79,21 @@ def plot_combined_rgb(csv_files):
     if not csv_files:
         return
     
+    import matplotlib.pyplot as plt
+    
     fig, ax = plt.subplots(figsize=(15, 6))
     fig.suptitle('RGB + Clear Values Combined', fontsize=16, fontweight='bold')
     
     for csv_file in csv_files:
         try:
-            df = pd.read_csv(csv_file)
-            df['Timestamp'] = pd.to_datetime(df['Timestamp'])
-            df['Time (s)'] = (df['Timestamp'] - df['Timestamp'].iloc[0]).dt.total_seconds()
+            filename = os.path.basename(csv_file.rstrip(os.sep))
             
-            filename = os.path.basename(csv_file)
-            
-            # Plot R, G, B, C on same axis
-            ax.scatter(df['Time (s)'], df['R'], c='red', label=f'{filename} - Red', alpha=0.7, s=20)
-            ax.scatter(df['Time (s)'], df['G'], c='green', label=f'{filename} - Green', alpha=0.7, s=20)
-            ax.scatter(df['Time (s)'], df['B'], c='blue', label=f'{filename} - Blue', alpha=0.7, s=20)
-            ax.scatter(df['Time (s)'], df['C'], c='purple', label=f'{filename} - Clear', alpha=0.7, s=20)
+            for chunk_idx, df in enumerate(iter_timed_chunks(csv_file)):
+                # Plot R, G, B, C on same axis (legend entries only for the first segment)
+                for channel, color, name in [('R', 'red', 'Red'), ('G', 'green', 'Green'),
+                                             ('B', 'blue', 'Blue'), ('C', 'purple', 'Clear')]:
+                    ax.scatter(df['Time_s'], df[channel], c=color, alpha=0.7, s=20,
+                               label=f'{filename} - {name}' if chunk_idx == 0 else None)
             
         except Exception as e:
             print(f"Error in combined plot for {csv_file}: {e}")
@@ -113,6 +113,189 @@ def plot_combined_rgb(csv_files):
     plt.show()
 
 
+def save_run_plot(csv_file, output_file):
+    """
+    Save the R, G, B, C channels of one run to an image file without opening a
+    window, for unattended use (e.g. watch_runs.py).
+    """
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    fig, axes = plt.subplots(2, 2, figsize=(15, 10))
+    fig.suptitle(os.path.basename(csv_file.rstrip(os.sep)), fontsize=16, fontweight='bold')
+    color_map = {'R': 'red', 'G': 'green', 'B': 'blue', 'C': 'purple'}
+
+    for df in iter_timed_chunks(csv_file):
+        for ax, (channel, color) in zip(axes.flatten(), color_map.items()):
+            ax.scatter(df['Time_s'], df[channel], color=color, s=8, alpha=0.7)
+
+    for ax, channel in zip(axes.flatten(), color_map):
+        ax.set_xlabel('Time (seconds)', fontsize=10)
+        ax.set_ylabel(f'{channel} Value', fontsize=10)
+        ax.set_title(f'{channel} Channel', fontsize=12, fontweight='bold')
+        ax.grid(True, alpha=0.3)
+
+    plt.tight_layout()
+    fig.savefig(output_file, dpi=150, bbox_inches='tight')
+    plt.close(fig)
+    return output_file
+
+
+def align_at_pour_in(csv_files, channels=('R', 'G', 'B', 'C')):
+    """
+    Load runs and express their time relative to the detected pour-in.
+    
+    Args:
+        csv_files: Run CSV files or segmented run directories
+        channels: Channels to keep
+    
+    Returns:
+        List of (filename, aligned time array, {channel: value array});
+        runs without a detectable pour-in are skipped
+    """
+    from detect_events import detect_pour_in
+    
+    runs = []
+    for csv_file in csv_files:
+        filename = os.path.basename(csv_file.rstrip(os.sep))
+        try:
+            df = add_time_columns(read_run_csv(csv_file))
+            pour_in_time_s, _, _ = detect_pour_in(df, channel='C')
+        except Exception as e:
+            print(f"Error reading {csv_file}: {e}")
+            continue
+        if pour_in_time_s is None:
+            print(f"Skipped (no pour-in detected): {filename}")
+            continue
+        time_s = df['Time_s'].to_numpy(dtype=float) - pour_in_time_s
+        runs.append((filename, time_s, {ch: df[ch].to_numpy(dtype=float) for ch in channels}))
+        print(f"Aligned: {filename} (pour-in at {pour_in_time_s:.1f} s, {len(df)} points)")
+    return runs
+
+
+def resample_to_grid(runs, channels=('R', 'G', 'B', 'C'), step=1.0):
+    """
+    Linearly interpolate every run onto one common time grid.
+    
+    All runs are interpolated in a single np.interp call per channel: each run's
+    times are shifted by a multiple of a span longer than any run, so the
+    concatenated series stays sorted and no grid point interpolates across two
+    runs. Grid points outside a run's own time range are NaN.
+    
+    Args:
+        runs: Output of align_at_pour_in()
+        channels: Channels to resample
+        step: Grid spacing in seconds
+    
+    Returns:
+        Tuple of (grid, {channel: array of shape (n_runs, n_grid)})
+    """
+    starts = np.array([time_s[0] for _, time_s, _ in runs])
+    ends = np.array([time_s[-1] for _, time_s, _ in runs])
+    grid = np.arange(np.floor(starts.min() / step) * step, ends.max() + step, step)
+    span = grid[-1] - grid[0] + 2 * step
+    
+    shifts = np.arange(len(runs)) * span
+    all_times = np.concatenate([time_s + shift for (_, time_s, _), shift in zip(runs, shifts)])
+    queries = grid[None, :] + shifts[:, None]
+    outside = (grid[None, :] < starts[:, None]) | (grid[None, :] > ends[:, None])
+    
+    resampled = {}
+    for channel in channels:
+        all_values = np.concatenate([values[channel] for _, _, values in runs])
+        on_grid = np.interp(queries.ravel(), all_times, all_values).reshape(queries.shape)
+        on_grid[outside] = np.nan
+        resampled[channel] = on_grid
+    return grid, resampled
+
+
+def ensemble_statistics(values, percentiles=(10, 90), min_runs=2):
+    """
+    Mean, median and percentile band across runs at each grid point.
+    
+    Args:
+        values: Array of shape (n_runs, n_grid), NaN where a run has no data
+        percentiles: Lower and upper percentile of the band
+        min_runs: Grid points covered by fewer runs are NaN
+    
+    Returns:
+        Dictionary of 'mean', 'median', 'lower', 'upper' and 'count' arrays
+    """
+    count = np.sum(~np.isnan(values), axis=0)
+    covered = count >= min_runs
+    stats = {key: np.full(values.shape[1], np.nan) for key in ('mean', 'median', 'lower', 'upper')}
+    if covered.any():
+        subset = values[:, covered]
+        stats['mean'][covered] = np.nanmean(subset, axis=0)
+        stats['median'][covered] = np.nanmedian(subset, axis=0)
+        lower, upper = np.nanpercentile(subset, percentiles, axis=0)
+        stats['lower'][covered] = lower
+        stats['upper'][covered] = upper
+    stats['count'] = count
+    return stats
+
+
+def plot_overlay(csv_files, channels=('R', 'G', 'B', 'C'), step=1.0, percentiles=(10, 90),
+                 show_runs=False, output_file=None, show=True):
+    """
+    Plot the ensemble of runs aligned at their pour-in, one panel per channel.
+    
+    Each panel shows the percentile band, mean and median across runs, so the
+    number of artists doesn't grow with the number of runs; show_runs adds the
+    individual runs as one faint line collection per panel.
+    """
+    runs = align_at_pour_in(csv_files, channels)
+    if not runs:
+        print("No runs with a detectable pour-in to overlay!")
+        return None
+    
+    import matplotlib
+    if not show:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import LineCollection
+    
+    grid, resampled = resample_to_grid(runs, channels, step)
+    min_runs = min(2, len(runs))
+    color_map = {'R': 'red', 'G': 'green', 'B': 'blue', 'C': 'purple'}
+    
+    ncols = 2 if len(channels) > 1 else 1
+    nrows = (len(channels) + ncols - 1) // ncols
+    fig, axes = plt.subplots(nrows, ncols, figsize=(15, 5 * nrows), squeeze=False)
+    fig.suptitle(f'{len(runs)} Runs Aligned at Pour-In', fontsize=16, fontweight='bold')
+    
+    for ax, channel in zip(axes.flatten(), channels):
+        color = color_map.get(channel, 'black')
+        stats = ensemble_statistics(resampled[channel], percentiles, min_runs)
+        if show_runs:
+            segments = [np.column_stack([grid, row]) for row in resampled[channel]]
+            ax.add_collection(LineCollection(segments, colors=color, alpha=0.15, linewidths=0.5))
+        ax.fill_between(grid, stats['lower'], stats['upper'], color=color, alpha=0.25,
+                        label=f'{percentiles[0]:g}-{percentiles[1]:g}th percentile')
+        ax.plot(grid, stats['mean'], color=color, linewidth=1.5, label='Mean')
+        ax.plot(grid, stats['median'], color='black', linewidth=1, linestyle='--', label='Median')
+        ax.axvline(0, color='gray', linewidth=1, linestyle=':')
+        ax.set_xlabel('Time since pour-in (seconds)', fontsize=10)
+        ax.set_ylabel(f'{channel} Value', fontsize=10)
+        ax.set_title(f'{channel} Channel', fontsize=12, fontweight='bold')
+        ax.grid(True, alpha=0.3)
+        ax.legend(fontsize=8)
+    for ax in axes.flatten()[len(channels):]:
+        ax.set_visible(False)
+    
+    plt.tight_layout()
+    
+    output_file = output_file or f"color_overlay_{datetime.now().strftime('%Y%m%d_%H%M%S')}.png"
+    plt.savefig(output_file, dpi=300, bbox_inches='tight')
+    print(f"\nOverlay plot saved as: {output_file}")
+    
+    if show:
+        plt.show()
+    plt.close(fig)
+    return output_file
+
+
 def read_files_to_plot(filelist_path="files_to_plot.txt"):
     """
     Read list of CSV files to plot from a text file
@@ -166,18 +349,44 @@ def read_files_to_plot(filelist_path="files_to_plot.txt"):
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Plot the runs listed in a file list.")
+    parser.add_argument("--files", default="files_to_plot.txt",
+                        help="File listing the runs to plot (default: files_to_plot.txt)")
+    parser.add_argument("--overlay", action="store_true",
+                        help="Align runs at their pour-in and plot ensemble mean, median and percentile bands")
+    parser.add_argument("--step", type=float, default=1.0, help="Overlay time grid spacing in seconds (default: 1.0)")
+    parser.add_argument("--percentiles", type=float, nargs=2, default=[10, 90], metavar=("LOW", "HIGH"),
+                        help="Overlay percentile band (default: 10 90)")
+    parser.add_argument("--channels", default="R,G,B,C", help="Overlay channels (default: R,G,B,C)")
+    parser.add_argument("--show-runs", action="store_true", help="Also draw each run faintly in the overlay")
+    parser.add_argument("--output", help="Overlay image file (default: color_overlay_<timestamp>.png)")
+    parser.add_argument("--no-show", action="store_true", help="Save the plots without opening a window")
+    args = parser.parse_args()
+    
     print("=" * 60)
     print("Color Sensor Data Plotter")
     print("=" * 60)
     
     # Read list of files to plot from text file
-    csv_files = read_files_to_plot("files_to_plot.txt")
+    csv_files = read_files_to_plot(args.files)
     
     if not csv_files:
         print("\nNo valid CSV files to plot.")
-        print("Please edit 'files_to_plot.txt' and add the files you want to plot.")
+        print(f"Please edit '{args.files}' and add the files you want to plot.")
         return
     
+    if args.overlay:
+        print(f"\nOverlaying {len(csv_files)} file(s)...\n")
+        channels = tuple(ch.strip() for ch in args.channels.split(',') if ch.strip())
+        plot_overlay(csv_files, channels=channels, step=args.step, percentiles=tuple(args.percentiles),
+                     show_runs=args.show_runs, output_file=args.output, show=not args.no_show)
+        print("\nDone!")
+        return
+    
+    if args.no_show:
+        import matplotlib
+        matplotlib.use('Agg')
+    
     print(f"\nPlotting {len(csv_files)} file(s)...\n")
     
     # Create the main plot with all channels
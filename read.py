@@ -1,20 +1,43 @@
 import serial
-import csv
+import collections
 import datetime
 import time
-import os
-import matplotlib.pyplot as plt
+from metrics import Metrics
+from stream_integrity import CadenceMonitor, format_summary, write_device_time
+from run_io import new_anchor
+from run_writer import CsvRunWriter, SegmentedRunWriter
+from framing import SerialReceiver
 
 # Configuration
 SERIAL_PORT = '/dev/ttyACM0'  # Change this to your Arduino's port (e.g., COM3, COM4, /dev/ttyUSB0, etc.)
 BAUD_RATE = 115200      # Make sure this matches your Arduino's baud rate
 TIMEOUT = 1           # Serial timeout in seconds
+SERIAL_PROTOCOL = 'auto'  # 'text', 'binary' (firmware built with BINARY_PROTOCOL) or 'auto' to detect
 UPDATE_INTERVAL = 5   # Update graph every N data points
-ENABLE_LIVE_GRAPH = True  # Set to False to disable live plotting (faster data logging)
+ENABLE_LIVE_GRAPH = False  # In-process matplotlib plot; slows logging, prefer the live dashboard
+LIVE_DASHBOARD_PORT = None  # Serve a live browser dashboard at http://127.0.0.1:<port>/, e.g. 8765 (None = off)
+LIVE_DASHBOARD_HOST = '127.0.0.1'  # Use '0.0.0.0' to let other machines on the network watch
+LIVE_DASHBOARD_BIN = 1.0  # Seconds of samples averaged into one dashboard point
+METRICS_INTERVAL = 10  # Seconds between one-line metrics summaries (None to disable)
+METRICS_EXPORT = None  # Optional metrics export: a file path (JSON lines) or 'udp://127.0.0.1:8125'
+EXPECTED_INTERVAL = 0.25  # Expected firmware sample interval in seconds (150 ms integration + delay(100))
+RECONSTRUCT_DEVICE_TIME = False  # Add a jitter-free 'Device_ns' column, fitted over the whole run when it closes
+SEGMENT_MAX_BYTES = None    # Roll over to a new segment at this size, e.g. 10_000_000 (None = no size limit)
+SEGMENT_MAX_SECONDS = None  # Roll over to a new segment after this many seconds, e.g. 3600 (None = no time limit)
+HOST_CONTROL_STRATEGY = None  # Decide the stop on the host: 'debounce', 'filtered' or 'predictive'
+                              # (firmware must be built with HOST_CONTROL; None leaves the stop to the firmware)
+STOP_THRESHOLD = 1000   # Clear value below which the reaction counts as dark
+STOP_MIN_ELAPSED = 5.0  # Seconds after the first sample before a stop is allowed
+FORECAST_CLOCK_STOP = False  # Forecast the clock stop time while the transition is still under way
+FORECAST_PRINT_INTERVAL = 5  # Seconds between printed forecasts
+# If either segment limit is set, the run is written to a color_data_<timestamp>/ directory
+# of segments plus a manifest.json instead of a single CSV file
 
 def generate_unique_filename():
-    """Generate a unique CSV filename using timestamp"""
+    """Generate a unique CSV filename (or segment directory name) using timestamp"""
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    if SEGMENT_MAX_BYTES is not None or SEGMENT_MAX_SECONDS is not None:
+        return f"color_data_{timestamp}"
     filename = f"color_data_{timestamp}.csv"
     return filename
 
@@ -54,10 +77,16 @@ def main():
     print(f"Connecting to {SERIAL_PORT} at {BAUD_RATE} baud...")
     
     ser = None
-    csvfile = None
+    run_writer = None
     fig = None
     axes_flat = None
     lines = None
+    live_server = None
+    relay = None
+    forecaster = None
+    last_forecast_print = None
+    metrics = Metrics(interval=METRICS_INTERVAL, export_target=METRICS_EXPORT)
+    monitor = CadenceMonitor(expected_interval_s=EXPECTED_INTERVAL)
     
     try:
         # Initialize data storage (using lists to keep all data points)
@@ -67,11 +96,17 @@ def main():
         b_data = []
         c_data = []
         
-        start_time = None
+        start_ns = None
         data_counter = 0
         
         # Set up real-time plotting if enabled
+        # Optional subsystems are imported only when enabled, to keep startup fast
+        if FORECAST_CLOCK_STOP:
+            from forecast import ClockStopForecaster
+            forecaster = ClockStopForecaster(min_elapsed_s=STOP_MIN_ELAPSED)
+        
         if ENABLE_LIVE_GRAPH:
+            import matplotlib.pyplot as plt
             plt.ion()  # Turn on interactive mode
             fig, axes = plt.subplots(2, 2, figsize=(12, 8))
             fig.suptitle('Real-Time Color Sensor Data', fontsize=14, fontweight='bold')
@@ -98,19 +133,44 @@ def main():
         else:
             print("Live graph disabled (faster data logging).")
         
+        # The dashboard runs in its own thread; the loop only queues samples for it
+        if LIVE_DASHBOARD_PORT is not None:
+            from live_server import LiveServer
+            live_server = LiveServer(host=LIVE_DASHBOARD_HOST, port=LIVE_DASHBOARD_PORT,
+                                     bin_s=LIVE_DASHBOARD_BIN)
+            try:
+                live_server.start()
+                print(f"Live dashboard at {live_server.url}")
+            except OSError as e:
+                # A busy port (e.g. a second logger) must not stop the acquisition
+                print(f"Warning: live dashboard unavailable ({e}); logging without it")
+                live_server = None
+        
         # Open serial connection
         ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=TIMEOUT)
         time.sleep(2)  # Wait for Arduino to reset after serial connection
         ser.reset_input_buffer()  # Clear any accumulated data in the buffer
+        receiver = SerialReceiver(ser, SERIAL_PROTOCOL)
         print("Connected! Reading data... (Press Ctrl+C to stop)")
         
-        # Open CSV file for writing with line buffering
-        csvfile = open(csv_filename, 'w', newline='', buffering=1)
-        csv_writer = csv.writer(csvfile)
+        if HOST_CONTROL_STRATEGY is not None:
+            from relay_control import RelayController, make_criterion
+            criterion = make_criterion(HOST_CONTROL_STRATEGY, threshold=STOP_THRESHOLD,
+                                       min_elapsed_s=STOP_MIN_ELAPSED)
+            relay = RelayController(ser, criterion, metrics)
+            print(f"Host relay control: {HOST_CONTROL_STRATEGY} (stop below C={STOP_THRESHOLD})")
         
-        # Write header
-        csv_writer.writerow(['Timestamp', 'R', 'G', 'B', 'C'])
-        csvfile.flush()  # Flush header immediately
+        # Anchor the monotonic clock to the wall clock once per run; samples are
+        # stored as integer nanoseconds and only formatted when exported
+        anchor_mono_ns, anchor_wall_ns, utc_offset_s = new_anchor()
+        
+        # Open the CSV file (or segmented run directory); the header is flushed immediately
+        header = ['Time_ns', 'R', 'G', 'B', 'C', 'Flags']
+        if SEGMENT_MAX_BYTES is not None or SEGMENT_MAX_SECONDS is not None:
+            run_writer = SegmentedRunWriter(csv_filename, header, (anchor_wall_ns, utc_offset_s),
+                                            max_bytes=SEGMENT_MAX_BYTES, max_seconds=SEGMENT_MAX_SECONDS)
+        else:
+            run_writer = CsvRunWriter(csv_filename, header, (anchor_wall_ns, utc_offset_s))
         
         # Read and log data
         colors_list = ['R', 'G', 'B', 'C']
@@ -121,25 +181,74 @@ def main():
             # Read all available lines to avoid backlog
             if ser.in_waiting > 0:
                 while ser.in_waiting > 0:
-                    # Read line from serial
-                    line = ser.readline().decode('utf-8', errors='ignore').strip()
+                    # Read and decode whatever is waiting: text lines or binary frames
+                    with metrics.time_stage('read'):
+                        events = receiver.read_available()
                     
-                    if line:
-                        print(f"Received: {line}")
-                        
-                        # Parse the color data
-                        color_data = parse_color_data(line)
+                    # Sample frames decoded from one read share its arrival time
+                    batch_remaining = collections.Counter(
+                        arrival_ns for kind, _, arrival_ns, _ in events if kind == 'sample')
+                    
+                    for kind, value, arrival_ns, backlog_bytes in events:
+                        if kind == 'sample':
+                            # Binary frames arrive decoded and CRC-checked
+                            metrics.increment('frames_received')
+                            batch_remaining[arrival_ns] -= 1
+                            color_data = (value.r, value.g, value.b, value.c)
+                            field_count = None
+                        else:
+                            line = value
+                            metrics.increment('lines_received')
+                            
+                            # Relay acknowledgements are not samples
+                            if relay is not None and relay.on_line(line, arrival_ns):
+                                continue
+                            
+                            # Parse the color data
+                            with metrics.time_stage('parse'):
+                                color_data = parse_color_data(line)
+                            
+                            if color_data is None and line != "Red Green Blue Clear":
+                                metrics.increment('parse_failures')
+                            field_count = len(line.split())
                         
                         if color_data:
                             r, g, b, c = color_data
-                            timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+                            
+                            # Check arrival against the firmware cadence and flag suspect samples
+                            flags = monitor.observe(arrival_ns, backlog_bytes=backlog_bytes,
+                                                    field_count=field_count,
+                                                    batch_remaining=batch_remaining[arrival_ns])
+                            if kind == 'sample' and (value.lost or value.corrupt):
+                                # Frames missing by sequence number, some of them failing the CRC
+                                metrics.increment('frames_lost', value.lost)
+                                metrics.increment('crc_errors', value.corrupt)
+                                flags = "|".join(filter(None, [flags, f"seq{value.lost}"]))
+                            if flags:
+                                metrics.increment('suspect_samples')
+                            
+                            time_ns = arrival_ns - anchor_mono_ns
                             
                             # Set start time on first data point
-                            if start_time is None:
-                                start_time = time.time()
+                            if start_ns is None:
+                                start_ns = time_ns
                             
                             # Calculate relative time in seconds
-                            current_time = time.time() - start_time
+                            current_time = (time_ns - start_ns) / 1e9
+                            
+                            # Decide the stop before logging so the command isn't delayed by disk I/O
+                            if relay is not None and relay.on_sample(current_time, c, arrival_ns):
+                                print(f"Stop command sent at {current_time:.2f} s (C={c})")
+                            
+                            if forecaster is not None and not forecaster.done:
+                                with metrics.time_stage('forecast'):
+                                    forecast = forecaster.update(current_time, c)
+                                if forecast is not None and (last_forecast_print is None or forecaster.done or
+                                        current_time - last_forecast_print >= FORECAST_PRINT_INTERVAL):
+                                    print(f"Clock stop forecast: {forecast['stop_time_s']:.1f} s "
+                                          f"({forecast['lower_s']:.1f}-{forecast['upper_s']:.1f} s, "
+                                          f"{forecast['progress']*100:.0f}% through the transition)")
+                                    last_forecast_print = current_time
                             
                             # Store data
                             time_data.append(current_time)
@@ -149,27 +258,36 @@ def main():
                             c_data.append(c)
                             
                             # Write to CSV
-                            csv_writer.writerow([timestamp, r, g, b, c])
-                            csvfile.flush()  # Ensure data is written immediately
-                            os.fsync(csvfile.fileno())  # Force OS to write to disk
+                            with metrics.time_stage('csv_write'):
+                                run_writer.writerow([time_ns, r, g, b, c, flags])  # Flushed immediately
+                            with metrics.time_stage('fsync'):
+                                run_writer.sync()  # Force OS to write to disk
+                            metrics.increment('samples_logged')
                             
-                            print(f"Logged: {timestamp} - R:{r} G:{g} B:{b} C:{c}")
+                            if live_server is not None:
+                                with metrics.time_stage('publish'):
+                                    live_server.publish(current_time, r, g, b, c)
                             
                             # Update plot periodically (only if live graph is enabled)
                             if ENABLE_LIVE_GRAPH:
                                 data_counter += 1
                                 if data_counter % UPDATE_INTERVAL == 0:
-                                    for idx, channel in enumerate(colors_list):
-                                        lines[channel].set_data(time_data, data_map[channel])
-                                        axes_flat[idx].relim()
-                                        axes_flat[idx].autoscale_view()
-                                    
-                                    fig.canvas.draw_idle()
-                                    fig.canvas.flush_events()
-                                    plt.pause(0.001)
+                                    with metrics.time_stage('redraw'):
+                                        for idx, channel in enumerate(colors_list):
+                                            lines[channel].set_data(time_data, data_map[channel])
+                                            axes_flat[idx].relim()
+                                            axes_flat[idx].autoscale_view()
+                                        
+                                        fig.canvas.draw_idle()
+                                        fig.canvas.flush_events()
+                                        plt.pause(0.001)
+                                    metrics.increment('redraws')
             else:
                 # Small delay to prevent CPU spinning when no data is available
                 time.sleep(0.01)
+            
+            # Periodic one-line summary instead of printing every sample
+            metrics.maybe_report()
     
     except serial.SerialException as e:
         print(f"Error opening serial port: {e}")
@@ -184,21 +302,36 @@ def main():
         if ENABLE_LIVE_GRAPH:
             plt.ioff()
         
-        # Ensure file is properly closed
-        if csvfile is not None:
+        if live_server is not None:
+            live_server.stop()
+        
+        # Ensure file is properly closed (finalizes the last segment of a segmented run)
+        if run_writer is not None:
             try:
-                csvfile.flush()
-                os.fsync(csvfile.fileno())
-                csvfile.close()
+                run_writer.close()
                 print("CSV file closed and saved.")
             except:
                 pass
+            
+            # The device timeline needs the cadence fit over the whole run
+            if RECONSTRUCT_DEVICE_TIME and monitor.samples:
+                try:
+                    write_device_time(run_writer.path, EXPECTED_INTERVAL)
+                    print("Device_ns column added.")
+                except Exception as e:
+                    print(f"Could not add Device_ns column: {e}")
         
         # Ensure serial port is closed
         if ser is not None and ser.is_open:
             ser.close()
             print("Serial port closed.")
         
+        # Full timing and data-integrity reports for the whole run
+        print(metrics.report())
+        metrics.close()
+        if monitor.samples:
+            print(format_summary(monitor.summary()))
+        
         if ENABLE_LIVE_GRAPH:
             print("Close the plot window to exit completely.")
         else:
@@ -0,0 +1,301 @@
+"""
+Host-Side Closed-Loop Relay Control
+
+Moves the stop decision from the firmware's fixed "c < 1000 after 5 s" check to
+the host, where the criterion can be debounced, filtered or predictive. When the
+criterion fires, the host sends "STOP" over the serial link; firmware built with
+HOST_CONTROL (color_target_detector.ino) opens the relay and answers "ACK STOP".
+
+Stop criteria (all ignore the first min_elapsed_s seconds, as the firmware does):
+    debounce   - Clear value below the threshold for required_hits samples in a row
+    filtered   - Exponential moving average of the Clear value below the threshold
+    predictive - Linear trend over the last samples predicts the threshold crossing
+                 within lead_s, to compensate for command latency
+
+Latency is measured per stage with metrics.LatencyHistogram:
+    stop_decision - sample arrival to criterion evaluated (every sample)
+    stop_command  - arrival of the triggering sample to STOP written
+    stop_ack      - STOP written to ACK received
+    sample_to_ack - arrival of the triggering sample to ACK received
+
+Run standalone, the controller is exercised against the pty firmware simulator
+(simulator.py) for several runs and the latency percentiles are reported.
+
+Dependencies:
+    pyserial, numpy
+
+Usage:
+    python relay_control.py [--strategy debounce|filtered|predictive] [--runs 5]
+                            [--speed 20] [--threshold 1000]
+
+Example:
+    python relay_control.py --strategy predictive --runs 10 --speed 40
+"""
+
+import argparse
+import collections
+import time
+
+from metrics import Metrics
+
+STOP_COMMAND = b"STOP\n"
+
+
+class DebouncedStop:
+    """
+    Stop once the Clear value has been below the threshold for several samples.
+
+    Args:
+        threshold: Clear value below which the reaction counts as dark
+        min_elapsed_s: Ignore samples before this many seconds into the run
+        required_hits: Consecutive samples below the threshold needed to stop
+    """
+
+    def __init__(self, threshold=1000, min_elapsed_s=5.0, required_hits=3):
+        self.threshold = threshold
+        self.min_elapsed_s = min_elapsed_s
+        self.required_hits = required_hits
+        self.consecutive_hits = 0
+
+    def value(self, c):
+        return c
+
+    def update(self, time_s, c):
+        """Feed one sample; returns True when the relay should be stopped"""
+        value = self.value(c)
+        if time_s < self.min_elapsed_s:
+            return False
+        if value < self.threshold:
+            self.consecutive_hits += 1
+        else:
+            self.consecutive_hits = 0
+        return self.consecutive_hits >= self.required_hits
+
+
+class FilteredStop(DebouncedStop):
+    """
+    Stop once an exponential moving average of the Clear value is below the threshold.
+
+    Args:
+        alpha: Smoothing factor of the moving average (1 = no smoothing)
+        (other arguments as DebouncedStop; required_hits defaults to 1)
+    """
+
+    def __init__(self, threshold=1000, min_elapsed_s=5.0, required_hits=1, alpha=0.3):
+        super().__init__(threshold, min_elapsed_s, required_hits)
+        self.alpha = alpha
+        self.average = None
+
+    def value(self, c):
+        self.average = c if self.average is None else self.average + self.alpha * (c - self.average)
+        return self.average
+
+
+class PredictiveStop:
+    """
+    Stop when a linear fit over the recent samples predicts the threshold
+    crossing within lead_s seconds.
+
+    Args:
+        threshold: Clear value below which the reaction counts as dark
+        min_elapsed_s: Ignore samples before this many seconds into the run
+        window: Number of recent samples in the trend fit
+        lead_s: How far ahead a predicted crossing triggers the stop; set it to
+                the expected command latency plus relay actuation time
+    """
+
+    def __init__(self, threshold=1000, min_elapsed_s=5.0, window=8, lead_s=0.25):
+        self.threshold = threshold
+        self.min_elapsed_s = min_elapsed_s
+        self.window = window
+        self.lead_s = lead_s
+        self.recent = collections.deque(maxlen=window)
+
+    def update(self, time_s, c):
+        self.recent.append((time_s, c))
+        if time_s < self.min_elapsed_s or len(self.recent) < self.window:
+            return False
+
+        n = len(self.recent)
+        mean_t = sum(t for t, _ in self.recent) / n
+        mean_c = sum(v for _, v in self.recent) / n
+        var_t = sum((t - mean_t) ** 2 for t, _ in self.recent)
+        if var_t == 0:
+            return False
+        slope = sum((t - mean_t) * (v - mean_c) for t, v in self.recent) / var_t
+        current = mean_c + slope * (time_s - mean_t)
+
+        if current < self.threshold:
+            return True
+        # Only a falling trend can reach the threshold
+        if slope >= 0:
+            return False
+        return (self.threshold - current) / slope <= self.lead_s
+
+
+STRATEGIES = {
+    'debounce': DebouncedStop,
+    'filtered': FilteredStop,
+    'predictive': PredictiveStop,
+}
+
+
+def make_criterion(strategy, **kwargs):
+    """Create a stop criterion by name (see STRATEGIES)"""
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown stop strategy '{strategy}' (choose from {', '.join(STRATEGIES)})")
+    return STRATEGIES[strategy](**kwargs)
+
+
+class RelayController:
+    """
+    Evaluate a stop criterion on every sample and send the stop command once.
+
+    Args:
+        ser: Open serial port (anything with write() and flush())
+        criterion: Stop criterion with update(time_s, c) -> bool
+        metrics: Metrics instance that receives the latency stages
+    """
+
+    def __init__(self, ser, criterion, metrics=None):
+        self.ser = ser
+        self.criterion = criterion
+        self.metrics = metrics or Metrics(interval=None)
+        self.stopped = False
+        self.acknowledged = False
+        self.stop_time_s = None
+        self.trigger_arrival_ns = None
+        self.command_ns = None
+
+    def on_sample(self, time_s, c, arrival_ns):
+        """
+        Feed one parsed sample.
+
+        Args:
+            time_s: Seconds since the start of the run
+            c: Clear channel value
+            arrival_ns: time.monotonic_ns() when the sample's line was read
+
+        Returns:
+            True if this sample triggered the stop command
+        """
+        if self.stopped:
+            return False
+        triggered = self.criterion.update(time_s, c)
+        self.metrics.record('stop_decision', time.monotonic_ns() - arrival_ns)
+        if not triggered:
+            return False
+
+        self.ser.write(STOP_COMMAND)
+        self.ser.flush()
+        self.command_ns = time.monotonic_ns()
+        self.trigger_arrival_ns = arrival_ns
+        self.metrics.record('stop_command', self.command_ns - arrival_ns)
+        self.stopped = True
+        self.stop_time_s = time_s
+        return True
+
+    def on_line(self, line, arrival_ns):
+        """
+        Handle a non-sample line from the firmware.
+
+        Returns:
+            True if the line was a relay acknowledgement or error
+        """
+        if line.startswith("ACK STOP"):
+            if self.command_ns is not None and not self.acknowledged:
+                self.metrics.record('stop_ack', arrival_ns - self.command_ns)
+                self.metrics.record('sample_to_ack', arrival_ns - self.trigger_arrival_ns)
+                self.acknowledged = True
+            return True
+        if line.startswith("ACK") or line.startswith("ERR"):
+            if line.startswith("ERR"):
+                print(f"Firmware rejected command: {line}")
+            return True
+        return False
+
+
+def run_simulated(strategy, runs=5, speed=20.0, rows=2000, threshold=1000, **criterion_kwargs):
+    """
+    Run the controller against the pty firmware simulator.
+
+    Returns:
+        Tuple of (metrics, per-run results); each result records when the host
+        stopped, when the simulated signal truly crossed the threshold, and the
+        Clear value at which the simulator opened the relay
+    """
+    import numpy as np
+    import serial
+
+    from generate_data import SAMPLE_INTERVAL
+    from read import parse_color_data
+    from simulator import FirmwareSimulator
+
+    metrics = Metrics(interval=None)
+    results = []
+    for run in range(runs):
+        simulator = FirmwareSimulator(rows=rows, seed=run, speed=speed)
+        true_cross = int(np.argmax(simulator.values[:, 3] < threshold)) * SAMPLE_INTERVAL
+        ser = serial.Serial(simulator.port, timeout=0.1)
+        controller = RelayController(ser, make_criterion(strategy, threshold=threshold, **criterion_kwargs),
+                                     metrics)
+        sample_index = 0
+        with simulator:
+            deadline = None
+            while simulator.running() or ser.in_waiting:
+                line = ser.readline().decode('utf-8', errors='ignore').strip()
+                arrival_ns = time.monotonic_ns()
+                if not line or controller.on_line(line, arrival_ns):
+                    if controller.acknowledged:
+                        break
+                    continue
+                sample = parse_color_data(line)
+                if sample is None:
+                    continue
+                # Firmware time (sample index x cadence) keeps results comparable across speeds
+                controller.on_sample(sample_index * SAMPLE_INTERVAL, sample[3], arrival_ns)
+                sample_index += 1
+                if controller.stopped and deadline is None:
+                    deadline = time.monotonic() + 2.0
+                if deadline is not None and time.monotonic() > deadline:
+                    break
+            ser.close()
+
+        results.append({
+            'run': run,
+            'stop_time_s': controller.stop_time_s,
+            'true_crossing_s': true_cross,
+            'relay_c': simulator.stop_c,
+            'acknowledged': controller.acknowledged,
+        })
+    return metrics, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test host-side relay control against the firmware simulator.")
+    parser.add_argument("--strategy", choices=sorted(STRATEGIES), default="debounce",
+                        help="Stop criterion (default: debounce)")
+    parser.add_argument("--runs", type=int, default=5, help="Simulated runs (default: 5)")
+    parser.add_argument("--speed", type=float, default=20.0, help="Simulator time compression (default: 20)")
+    parser.add_argument("--rows", type=int, default=2000, help="Samples per simulated run (default: 2000)")
+    parser.add_argument("--threshold", type=float, default=1000, help="Clear value threshold (default: 1000)")
+    args = parser.parse_args()
+
+    print(f"Simulating {args.runs} run(s) with the '{args.strategy}' criterion at {args.speed:g}x speed")
+    metrics, results = run_simulated(args.strategy, runs=args.runs, speed=args.speed,
+                                     rows=args.rows, threshold=args.threshold)
+
+    print(f"\n{'Run':>4} {'Stop (s)':>9} {'Crossing (s)':>13} {'Error (s)':>10} {'Relay C':>8} {'ACK':>4}")
+    for r in results:
+        stop = f"{r['stop_time_s']:.2f}" if r['stop_time_s'] is not None else "-"
+        error = (f"{r['stop_time_s'] - r['true_crossing_s']:+.2f}"
+                 if r['stop_time_s'] is not None else "-")
+        relay_c = r['relay_c'] if r['relay_c'] is not None else "-"
+        print(f"{r['run']:>4} {stop:>9} {r['true_crossing_s']:>13.2f} {error:>10} {relay_c:>8} "
+              f"{'yes' if r['acknowledged'] else 'no':>4}")
+    print()
+    print(metrics.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Shared Run File Reading and Timestamp Handling
+
+read.py stores each sample's time as integer nanoseconds from a monotonic clock
+('Time_ns' column), plus a single wall-clock anchor per run written as a comment
+line at the top of the CSV:
+
+    # anchor_wall_ns=1763401920123456789 utc_offset_s=3600
+    Time_ns,R,G,B,C,Flags
+    0,150,200,180,600,
+    250113042,151,201,180,601,
+
+The monotonic clock can't jump when NTP adjusts the wall clock, so relative
+times stay correct. Human-readable timestamps are only produced when a file is
+exported or when a tool needs a 'Timestamp' column, and always with vectorized
+integer arithmetic rather than string parsing.
+
+Older files with a 'Timestamp' column (read.py) or a 't' column (legacy format)
+are still accepted everywhere.
+
+A run can also be a directory of segments written by run_writer.SegmentedRunWriter.
+Every function taking a run path accepts the directory (or its manifest.json) and
+treats the segments as one logical stream; iter_run_chunks() and
+iter_timed_chunks() read it lazily, one segment at a time.
+"""
+
+import json
+import os
+import time
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+MANIFEST_NAME = "manifest.json"
+
+
+def new_anchor():
+    """
+    Capture the clock anchor for a run.
+
+    Returns:
+        Tuple of (monotonic_ns, wall_ns, utc_offset_s) taken at the same instant
+    """
+    mono_ns = time.monotonic_ns()
+    wall_ns = time.time_ns()
+    utc_offset_s = time.localtime(wall_ns // 1_000_000_000).tm_gmtoff
+    return mono_ns, wall_ns, utc_offset_s
+
+
+def format_anchor_line(wall_ns, utc_offset_s):
+    """Comment line recording the wall-clock anchor of a run"""
+    return f"# anchor_wall_ns={wall_ns} utc_offset_s={utc_offset_s}\n"
+
+
+def parse_anchor_line(line):
+    """
+    Parse a '# key=value ...' anchor line.
+
+    Returns:
+        Dictionary of integer values, or None if the line isn't an anchor line
+    """
+    line = line.strip()
+    if not line.startswith('#'):
+        return None
+    values = {}
+    for part in line[1:].split():
+        if '=' in part:
+            key, value = part.split('=', 1)
+            try:
+                values[key] = int(value)
+            except ValueError:
+                values[key] = value
+    return values if 'anchor_wall_ns' in values else None
+
+
+def read_anchor(csv_file):
+    """Return the anchor dictionary of a CSV file, or None if it has none"""
+    with open(csv_file, 'r') as f:
+        return parse_anchor_line(f.readline())
+
+
+def manifest_path(path):
+    """Return the manifest path if 'path' is a segmented run, otherwise None"""
+    if os.path.isdir(path):
+        candidate = os.path.join(path, MANIFEST_NAME)
+        return candidate if os.path.exists(candidate) else None
+    if os.path.basename(path) == MANIFEST_NAME:
+        return path
+    return None
+
+
+def is_segmented(path):
+    return manifest_path(path) is not None
+
+
+def read_manifest(path):
+    """Load the manifest of a segmented run"""
+    with open(manifest_path(path), 'r') as f:
+        return json.load(f)
+
+
+def segment_paths(path, include_partial=True):
+    """
+    Ordered list of segment files of a run.
+
+    For a single CSV file this is just [path]. For a segmented run it is the
+    finalized segments from the manifest, followed by any finalized segment the
+    manifest doesn't list yet (the writer crashed between renaming it and
+    updating the manifest) and, when include_partial is True, any '.part'
+    segment that was still being written, in name order.
+    """
+    manifest_file = manifest_path(path)
+    if manifest_file is None:
+        return [path]
+
+    run_dir = os.path.dirname(manifest_file)
+    with open(manifest_file, 'r') as f:
+        manifest = json.load(f)
+    paths = [os.path.join(run_dir, seg['file']) for seg in manifest['segments']]
+
+    listed = {seg['file'] for seg in manifest['segments']}
+    unlisted = []
+    for name in os.listdir(run_dir):
+        base = name[:-len('.part')] if name.endswith('.part') else name
+        if not (base.startswith('segment_') and base.endswith('.csv')) or base in listed:
+            continue
+        if name.endswith('.part') and not include_partial:
+            continue
+        unlisted.append((base, name))
+    paths.extend(os.path.join(run_dir, name) for _, name in sorted(unlisted))
+    return paths
+
+
+def run_fingerprint(path):
+    """
+    Size and modification time of a run file, or of every file in a segmented
+    run; changes whenever the run's data may have changed.
+    """
+    parts = []
+    for segment in segment_paths(path):
+        stat = os.stat(segment)
+        parts.append([os.path.basename(segment), stat.st_size, stat.st_mtime_ns])
+    return parts
+
+
+def iter_run_chunks(path, chunksize=None, include_partial=True, **kwargs):
+    """
+    Lazily read a run as a sequence of DataFrames.
+
+    Yields one DataFrame per segment (or per 'chunksize' rows within each
+    segment), so only one piece of the run is in memory at a time. The anchor
+    is stored in each chunk's attrs['anchor'].
+    """
+    import pandas as pd
+
+    for segment in segment_paths(path, include_partial=include_partial):
+        anchor = read_anchor(segment)
+        reader = pd.read_csv(segment, comment='#' if anchor else None,
+                             chunksize=chunksize, **kwargs)
+        for chunk in (reader if chunksize else [reader]):
+            if len(chunk) == 0:
+                continue
+            chunk.attrs['anchor'] = anchor
+            yield chunk
+
+
+def read_run_csv(csv_file, **kwargs):
+    """
+    Read a run CSV file (or a whole segmented run) in any supported format.
+
+    The anchor (if present) is stored in df.attrs['anchor'].
+    Extra keyword arguments are passed to pandas.read_csv.
+    """
+    import pandas as pd
+
+    if is_segmented(csv_file):
+        chunks = list(iter_run_chunks(csv_file, **kwargs))
+        if not chunks:
+            return pd.DataFrame(columns=read_manifest(csv_file)['columns'])
+        df = pd.concat(chunks, ignore_index=True)
+        df.attrs['anchor'] = chunks[0].attrs['anchor']
+        return df
+
+    anchor = read_anchor(csv_file)
+    df = pd.read_csv(csv_file, comment='#' if anchor else None, **kwargs)
+    df.attrs['anchor'] = anchor
+    return df
+
+
+def time_origin(df):
+    """Time value of the first sample, in the units of the best time column"""
+    import pandas as pd
+
+    if 'Time_ns' in df.columns:
+        return int(df['Time_ns'].iloc[0])
+    if 't' in df.columns:
+        return float(df['t'].iloc[0])
+    if 'Timestamp' in df.columns:
+        return pd.to_datetime(df['Timestamp'].iloc[0])
+    return None
+
+
+def relative_seconds(df, origin=None):
+    """
+    Seconds from the first sample, using the best time column available.
+
+    Args:
+        df: Run DataFrame (or one chunk of a run)
+        origin: Time of the run's first sample as returned by time_origin();
+                defaults to the first row of df
+
+    Returns:
+        pandas Series of floats, or None if no time column exists
+    """
+    import pandas as pd
+
+    if 'Time_ns' in df.columns:
+        time_ns = df['Time_ns'].astype('int64')
+        return (time_ns - (time_ns.iloc[0] if origin is None else origin)) / 1e9
+    if 't' in df.columns:
+        rel_seconds = df['t'].astype(float)
+        return rel_seconds - (rel_seconds.iloc[0] if origin is None else origin)
+    if 'Timestamp' in df.columns:
+        ts = pd.to_datetime(df['Timestamp'])
+        return (ts - (ts.iloc[0] if origin is None else origin)).dt.total_seconds()
+    return None
+
+
+def iter_timed_chunks(path, chunksize=None, **kwargs):
+    """
+    Like iter_run_chunks(), with a 'Time_s' column measured from the first
+    sample of the whole run rather than of each chunk.
+    """
+    origin = None
+    for chunk in iter_run_chunks(path, chunksize=chunksize, **kwargs):
+        if origin is None:
+            origin = time_origin(chunk)
+        chunk['Time_s'] = relative_seconds(chunk, origin)
+        yield chunk
+
+
+def wall_timestamps(df):
+    """
+    Wall-clock timestamps for each sample as a datetime64 Series (local time).
+
+    For Time_ns files this is the run anchor plus the monotonic offset; no
+    strings are parsed.
+    """
+    import pandas as pd
+
+    if 'Time_ns' in df.columns:
+        anchor = df.attrs.get('anchor') or {}
+        base_ns = anchor.get('anchor_wall_ns', 0) + anchor.get('utc_offset_s', 0) * 1_000_000_000
+        return pd.to_datetime(df['Time_ns'].astype('int64') + base_ns, unit='ns')
+    return pd.to_datetime(df['Timestamp'])
+
+
+def add_time_columns(df):
+    """Add 'Time_s' and a datetime 'Timestamp' column to a run DataFrame"""
+    if 'Time_ns' in df.columns or 'Timestamp' in df.columns:
+        df['Timestamp'] = wall_timestamps(df)
+    df['Time_s'] = relative_seconds(df)
+    return df
+
+
+def format_timestamps(timestamps):
+    """Format datetime64 values as 'YYYY-MM-DD HH:MM:SS.mmm' strings for export"""
+    import pandas as pd
+
+    return pd.Series(timestamps).dt.strftime(TIMESTAMP_FORMAT).str[:-3]
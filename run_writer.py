@@ -0,0 +1,203 @@
+"""
+CSV Writers for Acquisition Runs
+
+read.py writes samples through one of two writers with the same interface:
+
+    CsvRunWriter       - one color_data_<timestamp>.csv file for the whole run
+    SegmentedRunWriter - a color_data_<timestamp>/ directory of CSV segments
+
+A segmented run rolls over to a new segment when the current one reaches a size
+or age limit. The active segment is written as 'segment_NNNNN.csv.part' and is
+only renamed to 'segment_NNNNN.csv' once it has been fsynced and closed, so a
+finalized segment is never partially written. 'manifest.json' lists the
+finalized segments in order and is replaced atomically after each rollover:
+
+    {
+      "anchor_wall_ns": 1763401920123456789,
+      "utc_offset_s": 3600,
+      "columns": ["Time_ns", "R", "G", "B", "C", "Flags"],
+      "segments": [{"file": "segment_00000.csv", "rows": 14400, ...}],
+      "complete": false
+    }
+
+A crash can therefore only affect the last (still '.part') segment. A segment
+renamed just before a crash, before the manifest was replaced, is still found:
+run_io.segment_paths() appends unlisted segments in name order. Every segment
+is a standalone CSV with its own anchor line and header; run_io.py reads a
+segmented run as one logical stream.
+"""
+
+import csv
+import json
+import os
+import time
+
+from run_io import MANIFEST_NAME, format_anchor_line
+
+
+def _fsync_directory(path):
+    """Make a rename inside a directory durable (not supported on Windows)"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def write_json_atomic(path, data):
+    """Write JSON to a temporary file and atomically replace the target"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2)
+        f.write("\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class CsvRunWriter:
+    """
+    Write a run to a single CSV file.
+
+    Args:
+        path: Output CSV file path
+        header: List of column names
+        anchor: Tuple of (wall_ns, utc_offset_s) written as the first line
+    """
+
+    def __init__(self, path, header, anchor):
+        self.path = path
+        self.file = open(path, 'w', newline='', buffering=1)
+        self.writer = csv.writer(self.file)
+        self.file.write(format_anchor_line(*anchor))
+        self.writer.writerow(header)
+        self.file.flush()
+        self.rows = 0
+
+    def writerow(self, row):
+        self.writer.writerow(row)
+        self.file.flush()
+        self.rows += 1
+
+    def sync(self):
+        """Force written rows to disk"""
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+
+
+class SegmentedRunWriter:
+    """
+    Write a run as a directory of size- or time-limited CSV segments.
+
+    Args:
+        run_dir: Output directory (created if needed)
+        header: List of column names; the first column must be 'Time_ns'
+        anchor: Tuple of (wall_ns, utc_offset_s) shared by all segments
+        max_bytes: Roll over when a segment reaches this size (None for no limit)
+        max_seconds: Roll over when a segment is this old (None for no limit)
+    """
+
+    def __init__(self, run_dir, header, anchor, max_bytes=None, max_seconds=None):
+        self.run_dir = run_dir
+        self.path = run_dir
+        self.header = list(header)
+        self.anchor = anchor
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.rows = 0
+
+        os.makedirs(run_dir, exist_ok=True)
+        self.manifest = {
+            'anchor_wall_ns': anchor[0],
+            'utc_offset_s': anchor[1],
+            'columns': self.header,
+            'segments': [],
+            'complete': False,
+        }
+        write_json_atomic(os.path.join(run_dir, MANIFEST_NAME), self.manifest)
+
+        self.file = None
+        self._open_segment()
+
+    def _segment_name(self, index):
+        return f"segment_{index:05d}.csv"
+
+    def _open_segment(self):
+        index = len(self.manifest['segments'])
+        self.segment_name = self._segment_name(index)
+        self.part_path = os.path.join(self.run_dir, self.segment_name + ".part")
+        self.file = open(self.part_path, 'w', newline='', buffering=1)
+        self.writer = csv.writer(self.file)
+        self.file.write(format_anchor_line(*self.anchor))
+        self.writer.writerow(self.header)
+        self.file.flush()
+        self.segment_rows = 0
+        self.segment_opened = time.monotonic()
+        self.first_time_ns = None
+        self.last_time_ns = None
+
+    def _finalize_segment(self):
+        """fsync and close the active segment, rename it and record it in the manifest"""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        size = self.file.tell()
+        self.file.close()
+        self.file = None
+
+        if self.segment_rows == 0:
+            os.remove(self.part_path)
+            return
+
+        final_path = os.path.join(self.run_dir, self.segment_name)
+        os.replace(self.part_path, final_path)
+        _fsync_directory(self.run_dir)
+
+        self.manifest['segments'].append({
+            'file': self.segment_name,
+            'rows': self.segment_rows,
+            'bytes': size,
+            'first_time_ns': self.first_time_ns,
+            'last_time_ns': self.last_time_ns,
+        })
+        write_json_atomic(os.path.join(self.run_dir, MANIFEST_NAME), self.manifest)
+
+    def _should_roll(self):
+        if self.segment_rows == 0:
+            return False
+        if self.max_bytes is not None and self.file.tell() >= self.max_bytes:
+            return True
+        if self.max_seconds is not None and time.monotonic() - self.segment_opened >= self.max_seconds:
+            return True
+        return False
+
+    def writerow(self, row):
+        if self._should_roll():
+            self._finalize_segment()
+            self._open_segment()
+
+        self.writer.writerow(row)
+        self.file.flush()
+        if self.first_time_ns is None:
+            self.first_time_ns = row[0]
+        self.last_time_ns = row[0]
+        self.segment_rows += 1
+        self.rows += 1
+
+    def sync(self):
+        """Force written rows of the active segment to disk"""
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        if self.file is not None:
+            self._finalize_segment()
+        self.manifest['complete'] = True
+        write_json_atomic(os.path.join(self.run_dir, MANIFEST_NAME), self.manifest)
@@ -0,0 +1,210 @@
+"""
+Pseudo-Terminal Simulator of the Color Sensor Firmware
+
+Emulates color_target_detector.ino on a pty so read.py and relay_control.py
+can be tested without an Arduino. The simulator prints one
+"R G B C Encoder" line per sample at the firmware cadence (optionally sped up)
+using the synthetic clock reaction from generate_data.py, and answers relay
+commands the way the firmware does when built with HOST_CONTROL:
+
+    STOP   -> relay off, replies "ACK STOP <device_ms>"
+    RESET  -> relay on again, replies "ACK RESET <device_ms>"
+    other  -> replies "ERR <command>"
+
+With --protocol binary it sends framed binary samples and replies instead, like
+firmware built with BINARY_PROTOCOL (see framing.py).
+
+Dependencies:
+    numpy (POSIX only: uses os.openpty)
+
+Usage:
+    python simulator.py [--speed 1] [--rows 4000] [--seed 0] [--protocol text|binary]
+
+Example:
+    python simulator.py --speed 10
+    # then set SERIAL_PORT in read.py to the printed /dev/pts/N path
+"""
+
+import argparse
+import os
+import threading
+import time
+import tty
+
+from framing import encode_sample_frame, encode_text_frame
+from generate_data import SAMPLE_INTERVAL, generate_chunks
+
+
+class FirmwareSimulator:
+    """
+    Firmware emulator on the master side of a pty.
+
+    Args:
+        rows: Number of samples in the simulated run
+        seed: Random seed for the synthetic signal
+        speed: Time compression factor (10 sends samples 10x faster)
+        loop: Start the run over when it ends
+        protocol: 'text' lines or 'binary' frames
+        **signal_kwargs: Passed through to generate_data.generate_chunks
+    """
+
+    def __init__(self, rows=4000, seed=0, speed=1.0, loop=False, protocol='text', **signal_kwargs):
+        if protocol not in ('text', 'binary'):
+            raise ValueError(f"Unknown protocol '{protocol}'")
+        self.speed = speed
+        self.loop = loop
+        self.protocol = protocol
+        self.frame_seq = 0
+        signal_kwargs.setdefault('dropout_rate', 0.0)
+        signal_kwargs.setdefault('jitter_s', 0.0)
+        self.values = next(generate_chunks(rows, seed=seed, chunk_rows=rows, **signal_kwargs))[1]
+
+        self.master_fd, self.slave_fd = os.openpty()
+        tty.setraw(self.slave_fd)  # no echo or newline translation, like a real serial port
+        self.port = os.ttyname(self.slave_fd)
+
+        self.relay_on = True
+        self.stop_sample = None
+        self.stop_c = None
+        self.sample_index = 0
+        self.commands = []
+        self._write_lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._start_ns = None
+
+    def device_ms(self):
+        """Simulated millis() since start"""
+        return int((time.monotonic_ns() - self._start_ns) * self.speed / 1e6)
+
+    def _write(self, data):
+        try:
+            os.write(self.master_fd, data)
+        except OSError:
+            self._stopping.set()
+
+    def _write_line(self, text):
+        """Send a message: a text line, or a text frame in binary mode"""
+        with self._write_lock:
+            if self.protocol == 'binary':
+                self._write(encode_text_frame(self.frame_seq, text))
+                self.frame_seq += 1
+            else:
+                self._write((text + "\r\n").encode())
+
+    def _write_sample(self, r, g, b, c, hall_count):
+        with self._write_lock:
+            if self.protocol == 'binary':
+                self._write(encode_sample_frame(self.frame_seq, r, g, b, c, hall_count))
+                self.frame_seq += 1
+            else:
+                self._write(f"{r} {g} {b} {c} {hall_count}\r\n".encode())
+
+    def _emit_samples(self):
+        self._write_line("Red Green Blue Clear")
+        interval_s = SAMPLE_INTERVAL / self.speed
+        next_ns = time.monotonic_ns()
+        hall_count = 0
+        while not self._stopping.is_set():
+            if self.sample_index >= len(self.values):
+                if not self.loop:
+                    break
+                self.sample_index = 0
+            r, g, b, c = self.values[self.sample_index]
+            hall_count += 1
+            self._write_sample(int(r), int(g), int(b), int(c), hall_count)
+            self.sample_index += 1
+            next_ns += int(interval_s * 1e9)
+            delay = (next_ns - time.monotonic_ns()) / 1e9
+            if delay > 0:
+                self._stopping.wait(delay)
+
+    def _read_commands(self):
+        buffer = b""
+        while not self._stopping.is_set():
+            try:
+                data = os.read(self.master_fd, 256)
+            except OSError:
+                break
+            if not data:
+                break
+            buffer += data
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                self._handle_command(line.decode(errors='ignore').strip())
+
+    def _handle_command(self, command):
+        if not command:
+            return
+        self.commands.append((time.monotonic_ns(), command))
+        if command == "STOP":
+            if self.relay_on:
+                self.relay_on = False
+                self.stop_sample = self.sample_index
+                self.stop_c = int(self.values[max(self.sample_index - 1, 0)][3])
+            self._write_line(f"ACK STOP {self.device_ms()}")
+        elif command == "RESET":
+            self.relay_on = True
+            self.stop_sample = None
+            self.stop_c = None
+            self._write_line(f"ACK RESET {self.device_ms()}")
+        else:
+            self._write_line(f"ERR {command}")
+
+    def start(self):
+        self._start_ns = time.monotonic_ns()
+        for target in (self._emit_samples, self._read_commands):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def running(self):
+        """True while samples are still being sent"""
+        return not self._stopping.is_set() and self._threads[0].is_alive()
+
+    def wait(self):
+        """Block until the simulated run has been sent"""
+        self._threads[0].join()
+
+    def close(self):
+        self._stopping.set()
+        for fd in (self.master_fd, self.slave_fd):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate the color sensor firmware on a pty.")
+    parser.add_argument("--rows", type=int, default=4000, help="Samples per run (default: 4000)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Time compression factor (default: 1)")
+    parser.add_argument("--once", action="store_true", help="Stop after one run instead of looping")
+    parser.add_argument("--protocol", choices=("text", "binary"), default="text",
+                        help="Serial output format (default: text)")
+    args = parser.parse_args()
+
+    simulator = FirmwareSimulator(rows=args.rows, seed=args.seed, speed=args.speed, loop=not args.once,
+                                  protocol=args.protocol)
+    print(f"Simulated firmware on: {simulator.port}")
+    print("Press Ctrl+C to stop")
+    try:
+        with simulator:
+            while simulator.running():
+                time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    for _, command in simulator.commands:
+        print(f"  received: {command}")
+
+
+if __name__ == "__main__":
+    main()
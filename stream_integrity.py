@@ -0,0 +1,351 @@
+"""
+Sample-Loss and Host-Lag Detection for the Serial Stream
+
+The firmware emits one sample roughly every 250 ms (150 ms ADC integration plus
+delay(100)), but read.py can only timestamp lines when it gets around to reading
+them. This module tracks arrival intervals against that expected cadence to find:
+1. Gaps: intervals much longer than expected (lost samples or a stalled host)
+2. Bursts: intervals much shorter than expected (lines buffered and read together)
+3. Backlog drains: several lines waiting in the serial buffer at once
+4. Merged lines: two samples run together because a newline was lost
+
+Binary frames decoded from one read share its arrival time. Only the last of
+them is timed by the read; the others count towards the expected samples of
+the interval before it, so a batch is neither a gap nor a burst by itself.
+
+Suspect samples get a short flag string for the CSV, and an optional jitter-free
+device timeline is reconstructed from the sample count and a fitted cadence.
+The timeline uses the fit over the whole run, so it is added once the run is
+closed (read.py with RECONSTRUCT_DEVICE_TIME, or --write-device-time here).
+
+Usage:
+    python stream_integrity.py <csv_file_or_run_dir> [--interval 0.25] [--write-device-time]
+
+Example:
+    python stream_integrity.py color_data_20250101_120000.csv
+    python stream_integrity.py color_data_20250101_120000.csv --write-device-time
+"""
+
+import argparse
+import csv
+import itertools
+import os
+import sys
+
+from metrics import LatencyHistogram
+
+# Firmware cadence: 150 ms integration time plus delay(100)
+EXPECTED_INTERVAL_S = 0.25
+
+
+class CadenceMonitor:
+    """
+    Track sample arrivals against the expected firmware cadence.
+
+    Args:
+        expected_interval_s: Nominal time between samples
+        gap_factor: Intervals above this multiple of the expected interval are gaps
+        burst_factor: Intervals below this multiple of the expected interval are bursts
+        fields_per_sample: Number of space-separated fields in a well-formed line
+    """
+
+    def __init__(self, expected_interval_s=EXPECTED_INTERVAL_S, gap_factor=1.5,
+                 burst_factor=0.5, fields_per_sample=5):
+        self.expected_ns = int(expected_interval_s * 1e9)
+        self.gap_ns = int(self.expected_ns * gap_factor)
+        self.burst_ns = int(self.expected_ns * burst_factor)
+        self.fields_per_sample = fields_per_sample
+
+        self.intervals = LatencyHistogram()
+        self.first_ns = None
+        self.last_ns = None
+        self.samples = 0
+        self.device_index = -1
+        self.estimated_lost = 0
+        self.gaps = 0
+        self.bursts = 0
+        self.backlog_samples = 0
+        self.merged_lines = 0
+        self.max_gap_ns = 0
+        self.max_backlog_bytes = 0
+        self.flagged = 0
+
+        # Running sums for a least-squares fit of arrival time against device index,
+        # which gives the true device cadence and offset despite host jitter
+        self._fit_count = 0
+        self._sum_n = 0.0
+        self._sum_t = 0.0
+        self._sum_nn = 0.0
+        self._sum_nt = 0.0
+
+    def observe(self, arrival_ns, backlog_bytes=0, field_count=None, batch_remaining=0):
+        """
+        Record one sample arrival.
+
+        Args:
+            arrival_ns: Monotonic arrival time in nanoseconds
+            backlog_bytes: Bytes still waiting in the serial buffer after this line
+            field_count: Number of fields in the raw line, to detect merged lines
+            batch_remaining: Samples from the same read still to be observed after
+                             this one (they share arrival_ns)
+
+        Returns:
+            Flag string for this sample ('' when nothing looks wrong). Multiple
+            flags are separated by '|', e.g. 'gap2|backlog'.
+        """
+        flags = []
+        if self.last_ns is None:
+            self.first_ns = arrival_ns
+            self.device_index = 0
+        elif arrival_ns == self.last_ns:
+            # Decoded from the same read as the previous sample
+            self.device_index += 1
+        else:
+            interval = arrival_ns - self.last_ns
+            self.intervals.record(interval)
+            step = 1
+            # The rest of this read was sent within the same interval
+            span = interval - batch_remaining * self.expected_ns
+            if span > self.gap_ns:
+                missing = max(1, int(round(span / self.expected_ns)) - 1)
+                step += missing
+                self.gaps += 1
+                self.estimated_lost += missing
+                self.max_gap_ns = max(self.max_gap_ns, interval)
+                flags.append(f"gap{missing}")
+            elif span < self.burst_ns:
+                self.bursts += 1
+                flags.append("burst")
+            self.device_index += step
+
+        if backlog_bytes > 0:
+            self.backlog_samples += 1
+            self.max_backlog_bytes = max(self.max_backlog_bytes, backlog_bytes)
+            flags.append("backlog")
+
+        if field_count is not None and field_count > self.fields_per_sample:
+            self.merged_lines += 1
+            flags.append("merged")
+
+        self.last_ns = arrival_ns
+        self.samples += 1
+        if flags:
+            self.flagged += 1
+        if batch_remaining:
+            # Only the last sample of a read arrived at the time of the read
+            return "|".join(flags)
+
+        n = float(self.device_index)
+        t = float(arrival_ns - self.first_ns)
+        self._sum_n += n
+        self._sum_t += t
+        self._sum_nn += n * n
+        self._sum_nt += n * t
+        self._fit_count += 1
+
+        return "|".join(flags)
+
+    def fitted_cadence(self):
+        """Return (offset_ns, interval_ns) of the device timeline fitted so far"""
+        count = self._fit_count
+        denom = count * self._sum_nn - self._sum_n ** 2
+        if count < 2 or denom <= 0:
+            return 0.0, float(self.expected_ns)
+        interval = (count * self._sum_nt - self._sum_n * self._sum_t) / denom
+        offset = (self._sum_t - interval * self._sum_n) / count
+        return offset, interval
+
+    def device_time_ns(self):
+        """Jitter-free device time of the most recent sample, in nanoseconds from the first sample"""
+        offset, interval = self.fitted_cadence()
+        return int(round(offset + interval * self.device_index))
+
+    def summary(self):
+        """Per-run data-integrity summary as a dictionary"""
+        expected = self.device_index + 1 if self.samples else 0
+        _, interval = self.fitted_cadence()
+        return {
+            'samples_received': self.samples,
+            'samples_expected': expected,
+            'estimated_lost': self.estimated_lost,
+            'completeness_pct': 100.0 * self.samples / expected if expected else 100.0,
+            'gaps': self.gaps,
+            'max_gap_s': self.max_gap_ns / 1e9,
+            'bursts': self.bursts,
+            'backlog_samples': self.backlog_samples,
+            'max_backlog_bytes': self.max_backlog_bytes,
+            'merged_lines': self.merged_lines,
+            'flagged_samples': self.flagged,
+            'interval_p50_s': (self.intervals.percentile(50) or 0) / 1e9,
+            'interval_p99_s': (self.intervals.percentile(99) or 0) / 1e9,
+            'fitted_interval_s': interval / 1e9,
+        }
+
+
+def format_summary(summary):
+    """Human readable version of CadenceMonitor.summary()"""
+    lines = ["=" * 60, "Data Integrity Summary", "=" * 60]
+    lines.append(f"Samples received: {summary['samples_received']} of ~{summary['samples_expected']} "
+                 f"expected ({summary['completeness_pct']:.2f}% complete)")
+    lines.append(f"Estimated lost samples: {summary['estimated_lost']} in {summary['gaps']} gap(s), "
+                 f"longest {summary['max_gap_s']:.2f}s")
+    lines.append(f"Bursts (lines read back-to-back): {summary['bursts']}")
+    lines.append(f"Samples read from a backlog: {summary['backlog_samples']} "
+                 f"(max {summary['max_backlog_bytes']} bytes waiting)")
+    lines.append(f"Merged lines: {summary['merged_lines']}")
+    lines.append(f"Flagged samples: {summary['flagged_samples']}")
+    lines.append(f"Arrival interval p50/p99: {summary['interval_p50_s'] * 1000:.1f} / "
+                 f"{summary['interval_p99_s'] * 1000:.1f} ms "
+                 f"(fitted device cadence {summary['fitted_interval_s'] * 1000:.1f} ms)")
+    return "\n".join(lines)
+
+
+def _with_batch_remaining(times_ns):
+    """Pairs of (time, samples after it with the same time): equal times were read together"""
+    for t, group in itertools.groupby(times_ns):
+        count = len(list(group))
+        for remaining in range(count - 1, -1, -1):
+            yield t, remaining
+
+
+def device_timeline(times_ns, expected_interval_s=EXPECTED_INTERVAL_S):
+    """
+    Jitter-free device times for a whole run from its arrival times.
+
+    Every sample is placed on the cadence fitted over the entire run, so early
+    samples get the same treatment as late ones.
+
+    Args:
+        times_ns: Sequence of integer arrival times in nanoseconds
+        expected_interval_s: Nominal time between samples
+
+    Returns:
+        List of device times in nanoseconds, with the same origin as times_ns
+    """
+    monitor = CadenceMonitor(expected_interval_s=expected_interval_s)
+    indices = []
+    for t, remaining in _with_batch_remaining(times_ns):
+        monitor.observe(int(t), batch_remaining=remaining)
+        indices.append(monitor.device_index)
+    if not indices:
+        return []
+    offset, interval = monitor.fitted_cadence()
+    first_ns = int(times_ns[0])
+    return [first_ns + int(round(offset + interval * n)) for n in indices]
+
+
+def _read_rows(path):
+    """Anchor line (or None), header and data rows of one run CSV file"""
+    with open(path, 'r', newline='') as f:
+        first = f.readline()
+        anchor_line = first if first.startswith('#') else None
+        if anchor_line is None:
+            f.seek(0)
+        reader = csv.reader(f)
+        header = next(reader)
+        return anchor_line, header, list(reader)
+
+
+def write_device_time(path, expected_interval_s=EXPECTED_INTERVAL_S):
+    """
+    Add (or replace) the 'Device_ns' column of a recorded run.
+
+    Works on 'Time_ns' files and segmented run directories; each file is
+    rewritten to a temporary file and atomically replaced.
+
+    Returns:
+        Number of rows updated, or None if the run has no 'Time_ns' column
+    """
+    from run_io import segment_paths, manifest_path
+    from run_writer import write_json_atomic
+
+    segments = [_read_rows(segment) for segment in segment_paths(path)]
+    if not segments or any('Time_ns' not in header for _, header, _ in segments):
+        return None
+    times_ns = [int(row[header.index('Time_ns')]) for _, header, rows in segments for row in rows]
+    device_ns = iter(device_timeline(times_ns, expected_interval_s))
+
+    for segment, (anchor_line, header, rows) in zip(segment_paths(path), segments):
+        if 'Device_ns' in header:
+            column = header.index('Device_ns')
+        else:
+            column = len(header)
+            header = header + ['Device_ns']
+        tmp_path = segment + ".tmp"
+        with open(tmp_path, 'w', newline='') as f:
+            if anchor_line is not None:
+                f.write(anchor_line)
+            writer = csv.writer(f)
+            writer.writerow(header)
+            for row in rows:
+                row = row + [''] * (len(header) - len(row))
+                row[column] = next(device_ns)
+                writer.writerow(row)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, segment)
+
+    manifest_file = manifest_path(path)
+    if manifest_file is not None:
+        import json
+        with open(manifest_file, 'r') as f:
+            manifest = json.load(f)
+        if 'Device_ns' not in manifest['columns']:
+            manifest['columns'].append('Device_ns')
+            write_json_atomic(manifest_file, manifest)
+    return len(times_ns)
+
+
+def analyze_run(csv_file, expected_interval_s=EXPECTED_INTERVAL_S):
+    """
+    Run the cadence checks over a recorded CSV file.
+
+    Only arrival timing is available offline, so backlog and merged-line
+    detection rely on the flags written at acquisition time, if any.
+    """
+    from run_io import read_run_csv, relative_seconds
+
+    print(f"Reading: {csv_file}")
+    df = read_run_csv(csv_file)
+    if 'Time_ns' in df.columns:
+        times_ns = df['Time_ns'].astype('int64').values
+    else:
+        rel_seconds = relative_seconds(df)
+        if rel_seconds is None:
+            print("Error: No time column found ('Time_ns', 't' or 'Timestamp') in CSV file!")
+            return None
+        times_ns = (rel_seconds.values * 1e9).astype('int64')
+    monitor = CadenceMonitor(expected_interval_s=expected_interval_s)
+    for t, remaining in _with_batch_remaining(times_ns):
+        monitor.observe(int(t), batch_remaining=remaining)
+
+    summary = monitor.summary()
+    if 'Flags' in df.columns:
+        recorded = df['Flags'].fillna('').astype(str)
+        summary['backlog_samples'] = int(recorded.str.contains('backlog').sum())
+        summary['merged_lines'] = int(recorded.str.contains('merged').sum())
+    print(format_summary(summary))
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check a recorded run for lost samples and host lag.")
+    parser.add_argument("csv_file", help="Path to CSV file or segmented run directory")
+    parser.add_argument("--interval", type=float, default=EXPECTED_INTERVAL_S,
+                        help="Expected sample interval in seconds (default: 0.25)")
+    parser.add_argument("--write-device-time", action="store_true",
+                        help="Add a jitter-free 'Device_ns' column fitted over the whole run")
+    args = parser.parse_args()
+
+    if analyze_run(args.csv_file, args.interval) is None:
+        sys.exit(1)
+    if args.write_device_time:
+        rows = write_device_time(args.csv_file, args.interval)
+        if rows is None:
+            print("Error: --write-device-time needs a 'Time_ns' run recorded by read.py")
+            sys.exit(1)
+        print(f"\nDevice_ns written for {rows} samples")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,439 @@
+"""
+Auto-Tuning of the Event Detector Settings
+
+detect_events.py uses hand-picked settings: the pour-in smoothing window and
+threshold factor, the fraction of the run searched for the pour-in (30%) and
+the fraction of the sigmoid transition taken as the clock stop (0.9). This
+script searches for the settings that best reproduce hand-labeled event times
+and writes them, with a per-run error report, to a profile that
+'detect_events.py --profile' reads.
+
+The search is split so that no work is repeated between combinations:
+1. Pour-in: each (run, window size) pair is one task for the process pool. The
+   smoothed signal, its derivative and the rolling threshold statistics are
+   computed once per task and every threshold factor is evaluated against them
+   in one vectorized pass. The search fraction only decides whether the first
+   significant change lies inside the searched part of the run, so it costs a
+   comparison.
+2. Clock stop: the sigmoid is fitted once per run; the stop time for any stop
+   level follows from the fitted parameters in closed form.
+The two searches are independent because no pour-in setting affects the clock
+stop and vice versa. The current defaults are always evaluated as well and are
+only replaced by settings that lower the error by more than MIN_IMPROVEMENT_S,
+so the tuned profile is never worse on the labeled runs. Of settings scoring
+within MIN_IMPROVEMENT_S of the best, the one changing the fewest defaults wins.
+
+Labels file (CSV; run paths are relative to the labels file, blank times are
+not scored):
+    run,pour_in_s,clock_stop_s
+    color_data_20250101_120000.csv,12.5,131.0
+    run_20250102_090000,9.75,
+
+Dependencies:
+    pandas, numpy, scipy
+
+Usage:
+    python tune_detectors.py <labels.csv> [--random N] [--seed 0] [--workers N]
+                             [--miss-penalty 30] [--output detector_profile.json]
+                             [--windows ...] [--thresholds ...]
+                             [--search-fractions ...] [--stop-levels ...]
+
+Example:
+    python tune_detectors.py labels.csv --workers 4
+    python detect_events.py color_data_20250101_120000.csv --profile detector_profile.json
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+from detect_events import (DETECTOR_DEFAULTS, calculate_relative_time, fill_edges, fit_clock_sigmoid,
+                           rolling_mean_centered, rolling_std_centered, stop_time_from_sigmoid)
+from run_io import read_run_csv
+
+DEFAULT_OUTPUT = "detector_profile.json"
+
+# Grid searched by default
+DEFAULT_GRID = {
+    'window_size': [4, 6, 8, 10, 14, 20],
+    'threshold_factor': [1.5, 2.0, 2.5, 3.0, 4.0, 5.0],
+    'search_fraction': [0.15, 0.2, 0.3, 0.4, 0.5],
+    'stop_level': [0.8, 0.85, 0.9, 0.95],
+}
+# Ranges sampled by --random (window sizes are whole samples)
+RANDOM_RANGES = {
+    'window_size': (3, 30),
+    'threshold_factor': (1.0, 6.0),
+    'search_fraction': (0.1, 0.6),
+    'stop_level': (0.6, 0.98),
+}
+# Upper bound on thresholds x points compared in one vectorized pass
+MAX_BATCH_ELEMENTS = 2_000_000
+# Same minimum as detect_clock_stop
+MIN_FIT_POINTS = 50
+# A tuned setting replaces a default only if it lowers the error by more than this
+MIN_IMPROVEMENT_S = 1e-3
+
+
+def load_labels(path):
+    """
+    Read a labels file.
+
+    Returns:
+        List of dictionaries with 'run' (path), 'pour_in_s' and 'clock_stop_s' (None if blank);
+        rows with neither label are skipped
+    """
+    base_dir = os.path.dirname(os.path.abspath(path))
+    labels = []
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            run = (row.get('run') or '').strip()
+            if not run:
+                continue
+            entry = {'run': os.path.join(base_dir, run)}
+            for key in ('pour_in_s', 'clock_stop_s'):
+                value = (row.get(key) or '').strip()
+                entry[key] = float(value) if value else None
+            if entry['pour_in_s'] is None and entry['clock_stop_s'] is None:
+                # Nothing to score; loading the run would only cost time
+                continue
+            labels.append(entry)
+    if not labels:
+        raise ValueError(f"No labeled runs in {path}")
+    return labels
+
+
+def load_run(path):
+    """Relative times and Clear channel values of a run"""
+    df = calculate_relative_time(read_run_csv(path))
+    return df['Time_s'].values.astype(float), df['C'].values.astype(float)
+
+
+def clock_stop_model(time_s, values):
+    """
+    Fit the clock stop sigmoid once, as detect_clock_stop does.
+
+    Returns:
+        Dictionary with the fitted 'params' (L, k, x0), or with 'fallback_s' (the
+        time of the largest change, which detect_clock_stop reports when the fit
+        fails); None if the run is too short to fit
+    """
+    if len(time_s) < MIN_FIT_POINTS:
+        return None
+    try:
+        return {'params': tuple(float(p) for p in fit_clock_sigmoid(time_s, values))}
+    except Exception:
+        return {'fallback_s': float(time_s[np.argmax(np.abs(np.gradient(values)))])}
+
+
+def clock_stop_times(model, time_s, stop_levels):
+    """Clock stop time for each stop level (NaN where detect_clock_stop reports none)"""
+    stop_levels = np.asarray(stop_levels, dtype=float)
+    if model is None:
+        return np.full(len(stop_levels), np.nan)
+    if 'fallback_s' in model:
+        return np.full(len(stop_levels), model['fallback_s'])
+    L, k, x0 = model['params']
+    return np.clip(stop_time_from_sigmoid(L, k, x0, stop_levels), time_s[0], time_s[-1])
+
+
+# Per-worker copy of the runs' Clear values, set once by the pool initializer
+_SHARED = {}
+
+
+def _init_worker(shared):
+    _SHARED.clear()
+    _SHARED.update(shared)
+
+
+def _first_changes(task):
+    """
+    First significant change of one run for one window size and many threshold factors.
+
+    Returns:
+        (run index, window size, array of sample indices, -1 where there is none)
+    """
+    run_index, window_size, thresholds, search_end = task
+    values = _SHARED['values'][run_index][None, :]
+
+    # Computed once for every threshold factor and search fraction (as in detect_pour_in)
+    smoothed = fill_edges(rolling_mean_centered(values, window_size))
+    derivative = np.gradient(smoothed, axis=1)
+    rolling_mean = rolling_mean_centered(derivative, window_size * 2)[0, :search_end]
+    rolling_std = rolling_std_centered(derivative, window_size * 2)[0, :search_end]
+    change = np.abs(derivative[0, :search_end])
+
+    thresholds = np.asarray(thresholds, dtype=float)
+    first = np.full(len(thresholds), -1)
+    batch = max(1, MAX_BATCH_ELEMENTS // max(search_end, 1))
+    for start in range(0, len(thresholds), batch):
+        factors = thresholds[start:start + batch, None]
+        with np.errstate(invalid='ignore'):
+            significant = change > np.abs(rolling_mean + factors * rolling_std)
+        found = significant.any(axis=1)
+        first[start:start + batch] = np.where(found, np.argmax(significant, axis=1), -1)
+    return run_index, window_size, first
+
+
+def candidate_settings(grid, n_random=None, seed=0):
+    """
+    Pour-in combinations and stop levels to evaluate.
+
+    Returns:
+        Tuple of (list of (window_size, threshold_factor, search_fraction), list of stop levels),
+        both including the DETECTOR_DEFAULTS values
+    """
+    if n_random:
+        rng = np.random.default_rng(seed)
+        low, high = RANDOM_RANGES['window_size']
+        windows = rng.integers(low, high + 1, n_random)
+        thresholds = rng.uniform(*RANDOM_RANGES['threshold_factor'], n_random)
+        fractions = rng.uniform(*RANDOM_RANGES['search_fraction'], n_random)
+        pour_in = [(int(w), round(float(t), 3), round(float(f), 3))
+                   for w, t, f in zip(windows, thresholds, fractions)]
+        stop_levels = [round(float(s), 3) for s in rng.uniform(*RANDOM_RANGES['stop_level'], n_random)]
+    else:
+        pour_in = list(itertools.product([int(w) for w in grid['window_size']],
+                                         grid['threshold_factor'], grid['search_fraction']))
+        stop_levels = list(grid['stop_level'])
+
+    defaults = (DETECTOR_DEFAULTS['window_size'], DETECTOR_DEFAULTS['threshold_factor'],
+                DETECTOR_DEFAULTS['search_fraction'])
+    if defaults not in pour_in:
+        pour_in.append(defaults)
+    if DETECTOR_DEFAULTS['stop_level'] not in stop_levels:
+        stop_levels.append(DETECTOR_DEFAULTS['stop_level'])
+    return pour_in, stop_levels
+
+
+def score_errors(errors, miss_penalty):
+    """Mean absolute error, counting undetected events (NaN) as miss_penalty seconds"""
+    errors = np.abs(np.asarray(errors, dtype=float))
+    if errors.size == 0:
+        return float('nan')
+    return float(np.mean(np.where(np.isfinite(errors), errors, miss_penalty)))
+
+
+def tune_detectors(labels, pour_in_candidates, stop_levels, workers=None, miss_penalty=30.0):
+    """
+    Evaluate every candidate setting against the labeled runs.
+
+    Args:
+        labels: List from load_labels()
+        pour_in_candidates: List of (window_size, threshold_factor, search_fraction)
+        stop_levels: List of clock stop levels
+        workers: Worker processes (1 runs in-process; default: CPU count)
+        miss_penalty: Error in seconds charged for an event that isn't detected
+
+    Returns:
+        Dictionary with the best 'parameters', their 'score', the 'default_score'
+        and the per-run errors ('runs'), plus 'combinations' and 'elapsed_s'
+    """
+    start = time.perf_counter()
+    runs = []
+    for entry in labels:
+        print(f"Reading: {entry['run']}")
+        time_s, values = load_run(entry['run'])
+        runs.append({'time_s': time_s, 'values': values})
+
+    # Clock stop: one fit per run, every stop level in closed form
+    stop_levels = np.asarray(stop_levels, dtype=float)
+    stop_times = np.full((len(runs), len(stop_levels)), np.nan)
+    for i, (run, entry) in enumerate(zip(runs, labels)):
+        if entry['clock_stop_s'] is not None:
+            model = clock_stop_model(run['time_s'], run['values'])
+            stop_times[i] = clock_stop_times(model, run['time_s'], stop_levels)
+
+    # Pour-in: one task per (run, window size), covering all of its threshold factors
+    max_fraction = max(f for _, _, f in pour_in_candidates)
+    thresholds_by_window = {}
+    for window, threshold, _ in pour_in_candidates:
+        thresholds_by_window.setdefault(window, set()).add(threshold)
+    thresholds_by_window = {w: sorted(t) for w, t in thresholds_by_window.items()}
+    tasks = [(i, window, thresholds, int(len(run['values']) * max_fraction))
+             for i, (run, entry) in enumerate(zip(runs, labels)) if entry['pour_in_s'] is not None
+             for window, thresholds in thresholds_by_window.items()]
+
+    shared = {'values': [run['values'] for run in runs]}
+    if workers == 1 or len(tasks) <= 1:
+        _init_worker(shared)
+        results = [_first_changes(task) for task in tasks]
+    else:
+        # Imported here so that startup doesn't pay for the process pool machinery
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker,
+                                 initargs=(shared,)) as executor:
+            results = list(executor.map(_first_changes, tasks))
+    first_changes = {(i, window): dict(zip(thresholds_by_window[window], first))
+                     for i, window, first in results}
+
+    def pour_in_times(window, threshold, fraction):
+        times = np.full(len(runs), np.nan)
+        for i, run in enumerate(runs):
+            if (i, window) not in first_changes:
+                continue
+            index = first_changes[(i, window)][threshold]
+            if 0 <= index < int(len(run['values']) * fraction):
+                times[i] = run['time_s'][index]
+        return times
+
+    pour_in_labels = np.array([np.nan if e['pour_in_s'] is None else e['pour_in_s'] for e in labels])
+    stop_labels = np.array([np.nan if e['clock_stop_s'] is None else e['clock_stop_s'] for e in labels])
+    pour_in_labeled = np.isfinite(pour_in_labels)
+    stop_labeled = np.isfinite(stop_labels)
+
+    pour_in_scores = []
+    for candidate in pour_in_candidates:
+        times = pour_in_times(*candidate)
+        pour_in_scores.append(score_errors((times - pour_in_labels)[pour_in_labeled], miss_penalty))
+    stop_scores = [score_errors((stop_times[:, j] - stop_labels)[stop_labeled], miss_penalty)
+                   for j in range(len(stop_levels))]
+
+    defaults = (DETECTOR_DEFAULTS['window_size'], DETECTOR_DEFAULTS['threshold_factor'],
+                DETECTOR_DEFAULTS['search_fraction'])
+    default_pour_in = pour_in_candidates.index(defaults)
+    default_stop = int(np.flatnonzero(stop_levels == DETECTOR_DEFAULTS['stop_level'])[0])
+
+    def best(scores, changes, default):
+        """Lowest score, preferring fewer changed settings among near ties; the default on a tie with it"""
+        scores = np.asarray(scores)
+        if not np.isfinite(scores).any():
+            return default
+        near = np.flatnonzero(scores <= np.nanmin(scores) + MIN_IMPROVEMENT_S)
+        index = int(min(near, key=lambda i: changes[i]))
+        if np.isfinite(scores[default]) and scores[index] >= scores[default] - MIN_IMPROVEMENT_S:
+            return default
+        return index
+
+    best_pour_in = best(pour_in_scores, [sum(a != b for a, b in zip(c, defaults)) for c in pour_in_candidates],
+                        default_pour_in)
+    best_stop = best(stop_scores, [int(level != DETECTOR_DEFAULTS['stop_level']) for level in stop_levels],
+                     default_stop)
+
+    window, threshold, fraction = pour_in_candidates[best_pour_in]
+    parameters = {'window_size': int(window), 'threshold_factor': float(threshold),
+                  'search_fraction': float(fraction), 'stop_level': float(stop_levels[best_stop])}
+
+    def summarize(pour_in_index, stop_index):
+        pour_in = pour_in_times(*pour_in_candidates[pour_in_index])
+        stop = stop_times[:, stop_index]
+        return pour_in, stop, {
+            'pour_in_mae_s': pour_in_scores[pour_in_index],
+            'pour_in_missed': int(np.sum(pour_in_labeled & ~np.isfinite(pour_in))),
+            'clock_stop_mae_s': stop_scores[stop_index],
+            'clock_stop_missed': int(np.sum(stop_labeled & ~np.isfinite(stop))),
+        }
+
+    _, _, default_score = summarize(default_pour_in, default_stop)
+    pour_in, stop, score = summarize(best_pour_in, best_stop)
+
+    def value(x):
+        return float(x) if np.isfinite(x) else None
+
+    per_run = []
+    for i, entry in enumerate(labels):
+        reaction_label = stop_labels[i] - pour_in_labels[i]
+        reaction = stop[i] - pour_in[i]
+        per_run.append({
+            'run': entry['run'],
+            'pour_in_label_s': entry['pour_in_s'],
+            'pour_in_detected_s': value(pour_in[i]),
+            'pour_in_error_s': value(pour_in[i] - pour_in_labels[i]),
+            'clock_stop_label_s': entry['clock_stop_s'],
+            'clock_stop_detected_s': value(stop[i]),
+            'clock_stop_error_s': value(stop[i] - stop_labels[i]),
+            'reaction_error_s': value(reaction - reaction_label),
+        })
+
+    return {
+        'parameters': parameters,
+        'score': score,
+        'default_score': default_score,
+        'runs': per_run,
+        'combinations': len(pour_in_candidates) * len(stop_levels),
+        'elapsed_s': time.perf_counter() - start,
+    }
+
+
+def save_profile(result, path, labels_path, search, miss_penalty):
+    profile = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'labels': os.path.abspath(labels_path),
+        'search': search,
+        'miss_penalty_s': miss_penalty,
+        **result,
+    }
+    with open(path, 'w') as f:
+        json.dump(profile, f, indent=2)
+
+
+def format_seconds(value):
+    return f"{value:+.2f}" if value is not None else "-"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune the event detector settings against labeled runs.")
+    parser.add_argument("labels", help="CSV with 'run,pour_in_s,clock_stop_s' columns")
+    parser.add_argument("--random", type=int, default=None, metavar="N",
+                        help="Evaluate N random settings instead of the grid")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for --random (default: 0)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--miss-penalty", type=float, default=30.0,
+                        help="Error in seconds charged for an undetected event (default: 30)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help=f"Profile file (default: {DEFAULT_OUTPUT})")
+    parser.add_argument("--windows", type=int, nargs="+", help="Grid of pour-in window sizes")
+    parser.add_argument("--thresholds", type=float, nargs="+", help="Grid of pour-in threshold factors")
+    parser.add_argument("--search-fractions", type=float, nargs="+", help="Grid of pour-in search fractions")
+    parser.add_argument("--stop-levels", type=float, nargs="+", help="Grid of clock stop levels")
+    args = parser.parse_args()
+
+    grid = dict(DEFAULT_GRID)
+    for key, values in (('window_size', args.windows), ('threshold_factor', args.thresholds),
+                        ('search_fraction', args.search_fractions), ('stop_level', args.stop_levels)):
+        if values:
+            grid[key] = values
+
+    try:
+        labels = load_labels(args.labels)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    pour_in_candidates, stop_levels = candidate_settings(grid, args.random, args.seed)
+    result = tune_detectors(labels, pour_in_candidates, stop_levels, workers=args.workers,
+                            miss_penalty=args.miss_penalty)
+    search = f"random ({args.random})" if args.random else "grid"
+
+    print(f"\n{'='*60}")
+    print("Detector Tuning Results")
+    print(f"{'='*60}")
+    print(f"{len(labels)} labeled runs, {result['combinations']} combinations ({search}) "
+          f"in {result['elapsed_s']:.2f} seconds\n")
+    print(f"{'Setting':>18} {'Default':>10} {'Tuned':>10}")
+    for key, value in result['parameters'].items():
+        print(f"{key:>18} {DETECTOR_DEFAULTS[key]:>10g} {value:>10g}")
+    print()
+    print(f"{'Score':>18} {'Default':>10} {'Tuned':>10}")
+    for key, value in result['score'].items():
+        print(f"{key:>18} {result['default_score'][key]:>10.3f} {value:>10.3f}")
+
+    print(f"\n{'Run':<32} {'Pour-in err':>12} {'Stop err':>10} {'Reaction err':>13}")
+    for run in result['runs']:
+        name = os.path.basename(run['run'].rstrip('/\\'))
+        print(f"{name[-32:]:<32} {format_seconds(run['pour_in_error_s']):>12} "
+              f"{format_seconds(run['clock_stop_error_s']):>10} {format_seconds(run['reaction_error_s']):>13}")
+
+    save_profile(result, args.output, args.labels, search, args.miss_penalty)
+    print(f"\nProfile saved to: {args.output}")
+    print(f"Use it with: python detect_events.py <csv_file> --profile {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,680 @@
+"""
+Watch-Folder Daemon for New and Growing Runs
+
+Watches one or more directories for run files written by read.py
+('color_data_*.csv' files and segmented 'color_data_*/' run directories) and
+processes them without anyone having to remember to:
+
+1. While a run grows, only the newly appended bytes are read (complete lines
+   only) and fed to the live analyses: a running summary and, optionally, the
+   clock stop forecaster (forecast.py).
+2. When a run is finalized (the file was closed by its writer, a segmented
+   run's manifest is marked complete, or nothing was appended for the settle
+   time), the configured analyses are queued: event detection, resampling,
+   plotting and/or a pipeline recipe (pipeline.py).
+
+Directory changes are received from inotify (Linux, called through ctypes) and
+fall back to polling file sizes elsewhere or when inotify is unavailable. Files
+named after a run, such as a recipe's '{stem}_clean.csv' output, are not runs.
+
+The work queue and the tail position of every run live in a SQLite database, so
+after a restart finished analyses are not repeated, interrupted ones are
+retried, and growing runs are tailed from where the daemon stopped. A run that
+changes after it was processed is processed again.
+
+Dependencies:
+    pandas, numpy; scipy (detect), matplotlib (plot)
+
+Usage:
+    python watch_runs.py [DIR ...] [--analyses detect,resample,plot] [--recipe FILE]
+                         [--output-dir DIR] [--db FILE] [--settle 30] [--poll]
+                         [--forecast] [--once] [--skip-existing]
+
+Example:
+    python watch_runs.py . --analyses detect,plot --forecast
+"""
+
+import argparse
+import ctypes
+import ctypes.util
+import fnmatch
+import hashlib
+import io
+import json
+import os
+import pickle
+import select
+import signal
+import sqlite3
+import struct
+import time
+
+from run_io import MANIFEST_NAME, segment_paths, run_fingerprint, time_origin, relative_seconds
+
+RUN_PATTERN = "color_data_*"
+# Files written by the conversion tools next to the runs they came from; outputs
+# named after a run that still exists are recognized by extends_run() instead
+DERIVED_SUFFIXES = ('_interpolated.csv', '_converted.csv', '_monotonic.csv', '_resampled.csv')
+DEFAULT_ANALYSES = ('detect', 'resample')
+DB_NAME = ".watch_runs.sqlite"
+SETTLE_S = 30.0           # A run with nothing appended for this long is finalized
+POLL_INTERVAL_S = 2.0     # Directory scan interval when inotify is unavailable
+TAIL_INTERVAL_S = 1.0     # Minimum time between reads of the same growing run
+STATUS_INTERVAL_S = 10.0  # Seconds between status lines (and saved tail positions) per run
+MAX_ATTEMPTS = 3          # Failed analyses are retried this many times in total
+
+
+class InotifyWatcher:
+    """
+    Directory change notifications from the Linux inotify API.
+
+    Args:
+        directories: Directories to watch; run directories created inside
+                     them are watched too
+
+    Raises:
+        OSError: If inotify is not available
+    """
+
+    IN_MODIFY = 0x002
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_ISDIR = 0x40000000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    EVENT_HEADER = struct.Struct('iIII')
+
+    def __init__(self, directories):
+        libc_name = ctypes.util.find_library('c')
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self.libc, 'inotify_init1'):
+            raise OSError("inotify is not available")
+        self.fd = self.libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches = {}
+        for directory in directories:
+            self.add(directory)
+            for entry in os.scandir(directory):
+                if entry.is_dir() and fnmatch.fnmatch(entry.name, RUN_PATTERN):
+                    self.add(entry.path)
+
+    def add(self, directory):
+        mask = self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {directory}")
+        self.watches[wd] = directory
+
+    def wait(self, timeout):
+        """
+        Wait up to timeout seconds for changes.
+
+        Returns:
+            Dictionary of changed path -> True if the path was closed after writing
+        """
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return {}
+        try:
+            data = os.read(self.fd, 65536)
+        except BlockingIOError:
+            return {}
+
+        changes = {}
+        offset = 0
+        while offset + self.EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0').decode(errors='replace')
+            offset += length
+            if wd not in self.watches or not name:
+                continue
+            path = os.path.join(self.watches[wd], name)
+            if mask & self.IN_ISDIR and mask & self.IN_CREATE and fnmatch.fnmatch(name, RUN_PATTERN):
+                self.add(path)
+            changes[path] = changes.get(path, False) or bool(mask & self.IN_CLOSE_WRITE)
+        return changes
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """
+    Directory change detection by comparing file sizes and modification times.
+
+    Args:
+        directories: Directories to scan (and the run directories inside them)
+        interval: Seconds between scans
+    """
+
+    def __init__(self, directories, interval=POLL_INTERVAL_S):
+        self.directories = directories
+        self.interval = interval
+        self.snapshot = self._scan()
+
+    def _scan(self):
+        snapshot = {}
+        for directory in self.directories:
+            for entry in os.scandir(directory):
+                if not fnmatch.fnmatch(entry.name, RUN_PATTERN):
+                    continue
+                entries = os.scandir(entry.path) if entry.is_dir() else [entry]
+                for item in entries:
+                    try:
+                        stat = item.stat()
+                    except FileNotFoundError:
+                        continue
+                    snapshot[item.path] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    def wait(self, timeout):
+        time.sleep(min(self.interval, timeout))
+        snapshot = self._scan()
+        changes = {path: False for path, state in snapshot.items() if self.snapshot.get(path) != state}
+        self.snapshot = snapshot
+        return changes
+
+    def close(self):
+        pass
+
+
+def make_watcher(directories, polling=False):
+    """inotify watcher, or the polling watcher if inotify can't be used"""
+    if not polling:
+        try:
+            return InotifyWatcher(directories)
+        except (OSError, AttributeError) as e:
+            print(f"inotify unavailable ({e}); polling every {POLL_INTERVAL_S:g} s")
+    return PollingWatcher(directories)
+
+
+def extends_run(stem, directories):
+    """
+    True if a file stem is a run's stem plus '_<suffix>' for a run in one of
+    the directories, like the '{stem}_clean.csv' outputs of a recipe.
+    """
+    parts = stem.split('_')
+    for i in range(len(parts) - 1, 0, -1):
+        prefix = '_'.join(parts[:i])
+        if not fnmatch.fnmatch(prefix, RUN_PATTERN):
+            break
+        for directory in directories:
+            run = os.path.join(directory, prefix)
+            if os.path.isdir(run) or os.path.isfile(run + '.csv'):
+                return True
+    return False
+
+
+def run_for_path(path, directories):
+    """
+    The run a changed path belongs to: a run CSV, or the directory of a
+    segmented run. Returns None for unrelated files, including outputs
+    written next to the runs.
+    """
+    parent = os.path.dirname(path)
+    name = os.path.basename(path)
+    if parent in directories:
+        if not fnmatch.fnmatch(name, RUN_PATTERN):
+            return None
+        if os.path.isdir(path):
+            return path
+        if name.endswith('.csv') and not name.endswith(DERIVED_SUFFIXES) and not extends_run(name[:-4], directories):
+            return path
+        return None
+    if os.path.dirname(parent) in directories and fnmatch.fnmatch(os.path.basename(parent), RUN_PATTERN):
+        return parent
+    return None
+
+
+def find_runs(directories):
+    runs = []
+    for directory in directories:
+        for entry in sorted(os.scandir(directory), key=lambda e: e.name):
+            run = run_for_path(entry.path, directories)
+            if run is not None:
+                runs.append(run)
+    return runs
+
+
+def run_complete(run):
+    """True if the run's writer has marked it complete (segmented runs only)"""
+    manifest = os.path.join(run, MANIFEST_NAME)
+    if not os.path.isdir(run) or not os.path.exists(manifest):
+        return False
+    try:
+        with open(manifest) as f:
+            return bool(json.load(f).get('complete'))
+    except (OSError, ValueError):
+        return False
+
+
+class RunTail:
+    """
+    Incremental reader of a growing run.
+
+    Each poll() reads only the bytes appended since the last one, up to the
+    last complete line, and feeds the new rows to the live analyses.
+
+    Args:
+        path: Run CSV file or segmented run directory
+        forecast: Also feed the rows to a ClockStopForecaster
+    """
+
+    def __init__(self, path, forecast=False):
+        self.path = path
+        self.segments = {}  # segment name (without '.part') -> {'offset', 'columns'}
+        self.origin = None
+        self.rows = 0
+        self.duration_s = 0.0
+        self.last_c = None
+        self.min_c = None
+        self.max_c = None
+        self.forecaster = None
+        if forecast:
+            from forecast import ClockStopForecaster
+            self.forecaster = ClockStopForecaster()
+
+    def poll(self):
+        """Read newly appended rows; returns the number of new rows"""
+        new_rows = 0
+        for segment in segment_paths(self.path):
+            key = os.path.basename(segment).removesuffix('.part')
+            state = self.segments.setdefault(key, {'offset': 0, 'columns': None})
+            try:
+                size = os.path.getsize(segment)
+            except FileNotFoundError:
+                # A '.part' segment renamed since segment_paths() looked
+                continue
+            if size < state['offset']:
+                # Truncated or replaced: start this segment over
+                state['offset'], state['columns'] = 0, None
+            if size == state['offset']:
+                continue
+            with open(segment, 'rb') as f:
+                f.seek(state['offset'])
+                data = f.read(size - state['offset'])
+            end = data.rfind(b'\n')
+            if end < 0:
+                continue
+            state['offset'] += end + 1
+            new_rows += self._parse(state, data[:end + 1].decode('utf-8', errors='replace'))
+        return new_rows
+
+    def _parse(self, state, text):
+        import pandas as pd
+
+        lines = text.splitlines()
+        if state['columns'] is None:
+            while lines and lines[0].startswith('#'):
+                lines.pop(0)
+            if not lines:
+                return 0
+            state['columns'] = lines.pop(0).strip().split(',')
+        lines = [line for line in lines if line.strip()]
+        if not lines:
+            return 0
+
+        df = pd.read_csv(io.StringIO('\n'.join(lines)), names=state['columns'], header=None)
+        if self.origin is None:
+            self.origin = time_origin(df)
+        times = relative_seconds(df, self.origin)
+        values = df['C']
+        self.rows += len(df)
+        self.duration_s = float(times.iloc[-1])
+        self.last_c = int(values.iloc[-1])
+        self.min_c = int(values.min()) if self.min_c is None else min(self.min_c, int(values.min()))
+        self.max_c = int(values.max()) if self.max_c is None else max(self.max_c, int(values.max()))
+        if self.forecaster is not None:
+            for time_s, c in zip(times.to_numpy(), values.to_numpy()):
+                self.forecaster.update(float(time_s), float(c))
+        return len(df)
+
+    def status(self):
+        text = f"{self.rows} rows, {self.duration_s:.1f} s, C={self.last_c} (min {self.min_c}, max {self.max_c})"
+        forecast = self.forecaster.forecast if self.forecaster is not None else None
+        if forecast is not None:
+            text += f", clock stop ~{forecast['stop_time_s']:.1f} s ± {forecast['stop_std_s']:.1f}"
+        return text
+
+
+class WorkQueue:
+    """
+    Persistent analysis queue and tail positions in a SQLite database.
+
+    Jobs are unique per (run, analysis, run fingerprint), so a finished job is
+    never queued again unless the run itself changes.
+    """
+
+    def __init__(self, db_path):
+        self.db = sqlite3.connect(db_path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS runs (
+                path TEXT PRIMARY KEY,
+                fingerprint TEXT,
+                finalized INTEGER DEFAULT 0,
+                tail BLOB,
+                updated REAL
+            );
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                path TEXT,
+                analysis TEXT,
+                fingerprint TEXT,
+                state TEXT DEFAULT 'pending',
+                attempts INTEGER DEFAULT 0,
+                output TEXT,
+                error TEXT,
+                created REAL,
+                finished REAL,
+                UNIQUE (path, analysis, fingerprint)
+            );
+        """)
+        # Jobs that were running when the daemon stopped are retried
+        self.db.execute("UPDATE jobs SET state = 'pending' WHERE state = 'running'")
+        self.db.commit()
+
+    def load_run(self, path):
+        """Return (fingerprint, finalized, RunTail or None) of a known run, or None"""
+        row = self.db.execute("SELECT fingerprint, finalized, tail FROM runs WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            return None
+        tail = pickle.loads(row[2]) if row[2] is not None else None
+        return row[0], bool(row[1]), tail
+
+    def save_run(self, path, fingerprint, finalized, tail):
+        self.db.execute(
+            "INSERT OR REPLACE INTO runs (path, fingerprint, finalized, tail, updated) VALUES (?, ?, ?, ?, ?)",
+            (path, fingerprint, int(finalized), pickle.dumps(tail) if tail is not None else None, time.time()))
+        self.db.commit()
+
+    def enqueue(self, path, analysis, fingerprint):
+        """Queue an analysis; returns False if it was already queued or done for this fingerprint"""
+        cursor = self.db.execute(
+            "INSERT OR IGNORE INTO jobs (path, analysis, fingerprint, created) VALUES (?, ?, ?, ?)",
+            (path, analysis, fingerprint, time.time()))
+        self.db.commit()
+        return cursor.rowcount > 0
+
+    def next_job(self):
+        """Claim the oldest pending job; returns (id, path, analysis, fingerprint) or None"""
+        row = self.db.execute(
+            "SELECT id, path, analysis, fingerprint FROM jobs WHERE state = 'pending' ORDER BY id LIMIT 1").fetchone()
+        if row is not None:
+            self.db.execute("UPDATE jobs SET state = 'running', attempts = attempts + 1 WHERE id = ?", (row[0],))
+            self.db.commit()
+        return row
+
+    def finish(self, job_id, state, output=None, error=None):
+        """Record the outcome of a job; failed jobs go back to 'pending' until MAX_ATTEMPTS"""
+        if state == 'failed':
+            attempts = self.db.execute("SELECT attempts FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+            if attempts < MAX_ATTEMPTS:
+                state = 'pending'
+        self.db.execute("UPDATE jobs SET state = ?, output = ?, error = ?, finished = ? WHERE id = ?",
+                        (state, output, error, time.time(), job_id))
+        self.db.commit()
+
+    def counts(self):
+        return dict(self.db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+
+    def close(self):
+        self.db.close()
+
+
+def fingerprint_text(run):
+    return json.dumps(run_fingerprint(run))
+
+
+def output_stem(run, output_dir):
+    name = os.path.basename(run.rstrip(os.sep))
+    return os.path.join(output_dir, name[:-4] if name.endswith('.csv') else name)
+
+
+def analyze_detect(run, output_dir):
+    from detect_events import detect_run_events
+    from pipeline import save_result
+    from run_io import read_run_csv, add_time_columns
+
+    result = detect_run_events(add_time_columns(read_run_csv(run)))
+    output = output_stem(run, output_dir) + "_events.json"
+    save_result(result, output)
+    return output
+
+
+def analyze_resample(run, output_dir):
+    from interpolate_data import interpolate_color_data
+
+    output = output_stem(run, output_dir) + "_interpolated.csv"
+    if not interpolate_color_data(run, output):
+        raise ValueError("resampling failed")
+    return output
+
+
+def analyze_plot(run, output_dir):
+    from plot import save_run_plot
+
+    return save_run_plot(run, output_stem(run, output_dir) + ".png")
+
+
+ANALYSES = {
+    'detect': analyze_detect,
+    'resample': analyze_resample,
+    'plot': analyze_plot,
+}
+
+
+def recipe_analysis(recipe_path):
+    """
+    Analysis that runs a pipeline recipe's stages on the run.
+
+    Returns:
+        Tuple of (analysis name, function); the name includes a hash of the
+        recipe so runs are processed again when the recipe changes
+    """
+    from pipeline import load_recipe, run_pipeline, ResultCache
+
+    with open(recipe_path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:12]
+    stages = load_recipe(recipe_path)['stages']
+
+    def analyze(run, output_dir):
+        run_pipeline(run, stages, ResultCache(None), output_dir=output_dir)
+        return output_dir
+
+    return f"recipe:{digest}", analyze
+
+
+class RunWatcher:
+    """
+    The daemon: tails changed runs, finalizes quiet ones and works through the queue.
+
+    Args:
+        directories: Directories to watch
+        analyses: Dictionary of analysis name -> function(run, output_dir) -> output path
+        output_dir: Where analysis outputs are written (None: next to each run)
+        db_path: SQLite database of the queue and tail positions
+        settle_s: Seconds without growth after which a run is finalized
+        forecast: Run the clock stop forecaster on growing runs
+        polling: Poll instead of using inotify
+    """
+
+    def __init__(self, directories, analyses, output_dir=None, db_path=None, settle_s=SETTLE_S,
+                 forecast=False, polling=False):
+        self.directories = [os.path.abspath(d) for d in directories]
+        self.analyses = analyses
+        self.output_dir = output_dir
+        self.settle_s = settle_s
+        self.forecast = forecast
+        self.queue = WorkQueue(db_path or os.path.join(self.directories[0], DB_NAME))
+        self.watcher = make_watcher(self.directories, polling)
+        self.tails = {}          # run -> RunTail of runs that are not finalized
+        self.last_growth = {}    # run -> time.monotonic() of the last appended rows
+        self.closed = set()      # runs whose writer closed the file
+        self.dirty = set()       # runs with unread changes
+        self.last_read = {}
+        self.last_status = {}
+        self.stopping = False
+
+    def start(self, skip_existing=False):
+        """Pick up the runs already in the watched directories"""
+        for run in find_runs(self.directories):
+            fingerprint = fingerprint_text(run)
+            known = self.queue.load_run(run)
+            if known is not None and known[0] == fingerprint and known[1]:
+                continue
+            if skip_existing and known is None:
+                self.queue.save_run(run, fingerprint, True, None)
+                continue
+            self.track(run)
+            # A run that stopped growing while the daemon was down settles from its mtime
+            age = time.time() - max(os.path.getmtime(p) for p in segment_paths(run))
+            self.last_growth[run] = time.monotonic() - age
+
+    def track(self, run):
+        if run not in self.tails:
+            # Resume from the saved tail position, also when a finalized run grows again
+            known = self.queue.load_run(run)
+            tail = known[2] if known is not None else None
+            self.tails[run] = tail or RunTail(run, forecast=self.forecast)
+            self.last_growth[run] = time.monotonic()
+            print(f"Tracking: {run}")
+        self.dirty.add(run)
+
+    def read_tail(self, run):
+        tail = self.tails[run]
+        try:
+            new_rows = tail.poll()
+        except (OSError, ValueError, KeyError) as e:
+            print(f"  {os.path.basename(run)}: unreadable ({e})")
+            return
+        now = time.monotonic()
+        self.last_read[run] = now
+        self.dirty.discard(run)
+        if new_rows:
+            self.last_growth[run] = now
+            if now - self.last_status.get(run, 0) >= STATUS_INTERVAL_S:
+                self.last_status[run] = now
+                print(f"  {os.path.basename(run)}: {tail.status()}")
+                self.queue.save_run(run, fingerprint_text(run), False, tail)
+
+    def finalize(self, run):
+        self.read_tail(run)
+        tail = self.tails.pop(run)
+        self.closed.discard(run)
+        fingerprint = fingerprint_text(run)
+        self.queue.save_run(run, fingerprint, True, tail)
+        queued = [name for name in self.analyses if self.queue.enqueue(run, name, fingerprint)]
+        print(f"Finalized: {os.path.basename(run)} ({tail.status()})"
+              + (f"; queued {', '.join(queued)}" if queued else ""))
+
+    def handle_changes(self, changes):
+        for path, closed in changes.items():
+            run = run_for_path(path, self.directories)
+            if run is None or not os.path.exists(run):
+                continue
+            self.track(run)
+            if closed and not os.path.isdir(run):
+                self.closed.add(run)
+
+    def step(self, timeout):
+        """Wait for changes once, then read, finalize and process what is due"""
+        self.handle_changes(self.watcher.wait(timeout))
+        now = time.monotonic()
+        for run in list(self.tails):
+            if run in self.dirty and now - self.last_read.get(run, 0) >= TAIL_INTERVAL_S:
+                self.read_tail(run)
+            if run in self.closed or run_complete(run) or now - self.last_growth[run] >= self.settle_s:
+                self.finalize(run)
+        self.process_one()
+
+    def process_one(self):
+        """Run the oldest pending analysis; returns False if the queue is empty"""
+        job = self.queue.next_job()
+        if job is None:
+            return False
+        job_id, run, analysis, fingerprint = job
+        if not os.path.exists(run) or fingerprint_text(run) != fingerprint or analysis not in self.analyses:
+            # The run changed (it will be queued again), was removed, or the analysis is no longer configured
+            self.queue.finish(job_id, 'superseded')
+            return True
+
+        output_dir = self.output_dir or os.path.dirname(run)
+        os.makedirs(output_dir, exist_ok=True)
+        print(f"Running {analysis} on {os.path.basename(run)}")
+        start = time.perf_counter()
+        try:
+            output = self.analyses[analysis](run, output_dir)
+        except Exception as e:
+            print(f"  {analysis} failed: {e}")
+            self.queue.finish(job_id, 'failed', error=str(e))
+            return True
+        print(f"  {analysis} done in {time.perf_counter() - start:.1f}s: {output}")
+        self.queue.finish(job_id, 'done', output=output)
+        return True
+
+    def run(self, once=False):
+        """Watch until stopped; with once=True, settle and process what exists, then return"""
+        signal.signal(signal.SIGTERM, lambda *_: setattr(self, 'stopping', True))
+        try:
+            if once:
+                for run in list(self.tails):
+                    self.finalize(run)
+                while self.process_one():
+                    pass
+                return
+            while not self.stopping:
+                self.step(timeout=0.5 if self.queue_pending() else 1.0)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            for run, tail in self.tails.items():
+                self.queue.save_run(run, fingerprint_text(run), False, tail)
+            self.watcher.close()
+            print(f"Stopped; jobs: {self.queue.counts()}")
+            self.queue.close()
+
+    def queue_pending(self):
+        return self.queue.counts().get('pending', 0) > 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch folders and process new run files automatically.")
+    parser.add_argument("directories", nargs="*", default=["."], help="Directories to watch (default: .)")
+    parser.add_argument("--analyses", default=",".join(DEFAULT_ANALYSES),
+                        help=f"Comma-separated analyses for finalized runs: {', '.join(ANALYSES)} "
+                             f"(default: {','.join(DEFAULT_ANALYSES)})")
+    parser.add_argument("--recipe", help="Also run this pipeline recipe's stages on finalized runs")
+    parser.add_argument("--output-dir", help="Directory for analysis outputs (default: next to each run)")
+    parser.add_argument("--db", help=f"Queue database (default: {DB_NAME} in the first directory)")
+    parser.add_argument("--settle", type=float, default=SETTLE_S,
+                        help=f"Seconds without growth before a run is finalized (default: {SETTLE_S:g})")
+    parser.add_argument("--forecast", action="store_true", help="Forecast the clock stop of growing runs")
+    parser.add_argument("--poll", action="store_true", help="Poll for changes instead of using inotify")
+    parser.add_argument("--once", action="store_true", help="Process the existing runs and exit")
+    parser.add_argument("--skip-existing", action="store_true",
+                        help="Mark runs that are already present as processed")
+    args = parser.parse_args()
+
+    analyses = {}
+    for name in filter(None, args.analyses.split(',')):
+        if name not in ANALYSES:
+            parser.error(f"unknown analysis '{name}' (choose from {', '.join(ANALYSES)})")
+        analyses[name] = ANALYSES[name]
+    if args.recipe:
+        name, function = recipe_analysis(args.recipe)
+        analyses[name] = function
+
+    watcher = RunWatcher(args.directories, analyses, output_dir=args.output_dir, db_path=args.db,
+                         settle_s=args.settle, forecast=args.forecast, polling=args.poll)
+    print(f"Watching: {', '.join(watcher.directories)} ({type(watcher.watcher).__name__})")
+    print(f"Analyses: {', '.join(analyses) or 'none'}")
+    watcher.start(skip_existing=args.skip_existing)
+    watcher.run(once=args.once)
+
+
+if __name__ == "__main__":
+    main()